@@ -1,15 +1,22 @@
 import os
+import shutil
+import sys
 import tempfile
-from pathlib import Path
+from typing import Optional
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException
 from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from fastapi.middleware.cors import CORSMiddleware
 
-from split_pdf import split_pdf_to_zip, parse_page_ranges
+# Share the splitter package with the backend
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from splitter import split_pdf_to_zip, compile_selection
 
 # Configuration
 MAX_FILE_SIZE = 130 * 1024 * 1024  # 130MB
 ALLOWED_CONTENT_TYPES = ["application/pdf"]
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
 
 app = FastAPI()
 
@@ -26,62 +33,66 @@ app.add_middleware(
 @app.post("/api/split")
 async def split_pdf(
     file: UploadFile = File(...),
-    page_ranges: str = Form(...)
+    page_ranges: str = Form(...),
+    optimize: bool = Form(False),
+    image_profile: Optional[str] = Form(None),
+    ordered: bool = Form(False)
 ):
     # Validate content type
     if file.content_type not in ALLOWED_CONTENT_TYPES:
         raise HTTPException(
-            status_code=400, 
+            status_code=400,
             detail="Invalid file type. Only PDF files are allowed."
         )
-    
-    # Validate file size
-    file_content = await file.read()
-    if len(file_content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE // (1024*1024)}MB"
-        )
-    
-    # Reset file position
-    await file.seek(0)
-    
+
     # Validate page ranges
     try:
-        parsed_ranges = parse_page_ranges(page_ranges)
-        if not parsed_ranges:
-            raise ValueError("No valid page ranges provided")
+        compile_selection(page_ranges, ordered=ordered)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    
+
     # Create temporary directory
     with tempfile.TemporaryDirectory() as temp_dir:
-        temp_path = Path(temp_dir)
-        
-        # Save uploaded file
-        input_path = temp_path / file.filename
+        # Stream upload to disk, enforcing the size limit as we go
+        input_path = os.path.join(temp_dir, "input.pdf")
+        written = 0
         with open(input_path, "wb") as f:
-            f.write(file_content)
-        
-        # Split PDF
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                written += len(chunk)
+                if written > MAX_FILE_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File size exceeds maximum allowed size of {MAX_FILE_SIZE // (1024*1024)}MB"
+                    )
+                f.write(chunk)
+
+        # Split PDF into a directory that outlives the request until the
+        # response has been sent
+        output_dir = tempfile.mkdtemp()
         try:
-            output_filename = file.filename.replace('.pdf', '_split.zip')
-            output_path = temp_path / output_filename
-            
-            split_pdf_to_zip(str(input_path), parsed_ranges, str(output_path))
-            
-            # Return zip file
-            return FileResponse(
-                path=str(output_path),
-                media_type="application/zip",
-                filename=output_filename,
-                headers={
-                    "Content-Disposition": f"attachment; filename={output_filename}"
-                }
+            zip_path = split_pdf_to_zip(
+                input_path, page_ranges, file.filename or "document.pdf", optimize=optimize,
+                image_profile=image_profile, ordered=ordered, output_dir=output_dir,
             )
-            
+        except ValueError as e:
+            shutil.rmtree(output_dir, ignore_errors=True)
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
+            shutil.rmtree(output_dir, ignore_errors=True)
             raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
 
+        output_filename = os.path.basename(zip_path)
+
+        # Return zip file, removing it once sent
+        return FileResponse(
+            path=zip_path,
+            media_type="application/zip",
+            filename=output_filename,
+            headers={
+                "Content-Disposition": f"attachment; filename={output_filename}"
+            },
+            background=BackgroundTask(shutil.rmtree, output_dir, ignore_errors=True),
+        )
+
 # Handler for Vercel
-handler = app
\ No newline at end of file
+handler = app
@@ -0,0 +1,41 @@
+"""
+Gunicorn configuration: supervised uvicorn workers.
+
+The arbiter restarts each web worker after a jittered number of requests
+(and ``supervisor.MemoryWatch`` recycles one early if its RSS grows past
+``WEB_WORKER_MAX_RSS_MB``). On SIGTERM workers stop accepting connections
+and get ``GRACEFUL_TIMEOUT`` seconds to finish in-flight uploads and split
+jobs before they are killed.
+
+    gunicorn main:app    # picks up this file from the working directory
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+
+# Recycle web workers after this many requests (+ up to the jitter, so they
+# do not all restart at once)
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("WEB_MAX_REQUESTS_JITTER", 100))
+
+graceful_timeout = int(os.environ.get("GRACEFUL_TIMEOUT", 300))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 180))
+keepalive = 180
+
+raw_env = ["SERVER_SUPERVISED=true"]
+
+
+def worker_exit(server, worker):
+    """Log the memory high-water mark of every worker that exits."""
+    try:
+        import resource
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+    except ImportError:
+        peak_mb = "?"
+    server.log.info("Web worker %s exiting, peak rss=%sMB", worker.pid, peak_mb)
+
+
+def child_exit(server, worker):
+    server.log.info("Web worker %s exited", worker.pid)
@@ -0,0 +1,325 @@
+"""
+Concurrent load generator for the split endpoints.
+
+Drives a weighted mix of generated PDFs and page range patterns through
+``/split`` (or ``/api/split``) at increasing concurrency levels and reports
+throughput, latency percentiles, error rate, event-loop lag and RSS for each
+stage, so the saturation point of a worker configuration can be read off.
+RSS is summed over each sampled process and its descendants, so split jobs
+running in worker children are counted.
+
+In-process (the app runs on the load generator's event loop):
+
+    python loadtest.py --app main:app --concurrency 10,50,200
+
+Against a running server (sample the RSS of a process tree with --pid):
+
+    python loadtest.py --url http://localhost:8000 --pid 1234
+"""
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from io import BytesIO
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from worker import read_rss
+
+# Page counts of the generated documents and their relative weights
+DEFAULT_SIZES = "5:6,100:3,1000:1"
+
+# Range patterns, formatted with the document page count as {n}
+DEFAULT_PATTERNS = "1;1-3,5;1-{n};2-{n}"
+
+# Filler added to every page so file size scales with page count
+PAGE_FILLER_BYTES = 2048
+
+LAG_SAMPLE_INTERVAL = 0.01  # seconds
+RSS_SAMPLE_INTERVAL = 0.5  # seconds
+
+
+@dataclass
+class StageResult:
+    """Measurements for one concurrency level."""
+    concurrency: int
+    duration: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[str, int] = field(default_factory=dict)
+    loop_lag: List[float] = field(default_factory=list)
+    rss_samples: List[Tuple[float, Dict[int, int]]] = field(default_factory=list)
+
+    @property
+    def requests(self) -> int:
+        return sum(self.statuses.values())
+
+    @property
+    def errors(self) -> int:
+        return sum(count for status, count in self.statuses.items() if not status.startswith("2"))
+
+    def summary(self) -> Dict[str, object]:
+        peak_rss = {}
+        for _, sample in self.rss_samples:
+            for pid, rss in sample.items():
+                peak_rss[pid] = max(peak_rss.get(pid, 0), rss)
+        return {
+            "concurrency": self.concurrency,
+            "requests": self.requests,
+            "throughput_rps": self.requests / self.duration if self.duration else 0.0,
+            "latency_ms": {
+                "p50": percentile(self.latencies, 50) * 1000,
+                "p90": percentile(self.latencies, 90) * 1000,
+                "p99": percentile(self.latencies, 99) * 1000,
+                "max": max(self.latencies, default=0.0) * 1000,
+            },
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "statuses": dict(self.statuses),
+            "loop_lag_ms": {
+                "p99": percentile(self.loop_lag, 99) * 1000,
+                "max": max(self.loop_lag, default=0.0) * 1000,
+            },
+            "peak_rss_mb": {pid: rss / (1024 * 1024) for pid, rss in peak_rss.items()},
+            "rss_timeline_mb": [
+                (round(t, 2), {pid: round(rss / (1024 * 1024), 1) for pid, rss in sample.items()})
+                for t, sample in self.rss_samples
+            ],
+        }
+
+
+def child_pids(pid: int) -> List[int]:
+    """Direct children of a process (empty if they cannot be read)."""
+    children = []
+    try:
+        tasks = os.listdir(f"/proc/{pid}/task")
+    except OSError:
+        return children
+    for task in tasks:
+        try:
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                children.extend(int(child) for child in f.read().split())
+        except OSError:
+            pass
+    return children
+
+
+def read_tree_rss(pid: int) -> Optional[int]:
+    """Resident set size of a process plus all its descendants, or None."""
+    own = read_rss(pid)
+    if own is None:
+        return None
+    total = own
+    pending = child_pids(pid)
+    seen = {pid}
+    while pending:
+        child = pending.pop()
+        if child in seen:
+            continue
+        seen.add(child)
+        total += read_rss(child) or 0
+        pending.extend(child_pids(child))
+    return total
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile; 0 for an empty sequence."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def parse_weighted(spec: str) -> List[Tuple[int, int]]:
+    """Parse '5:6,100:3' into [(5, 6), (100, 3)]; weight defaults to 1."""
+    items = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        value, _, weight = part.partition(":")
+        items.append((int(value), int(weight or 1)))
+    if not items:
+        raise ValueError(f"Empty size mix: {spec!r}")
+    return items
+
+
+def create_pdf(num_pages: int) -> bytes:
+    """Create a PDF with ``num_pages`` pages carrying some incompressible filler."""
+    from pypdf import PdfWriter
+    from pypdf.generic import DecodedStreamObject, NameObject
+
+    writer = PdfWriter()
+    for _ in range(num_pages):
+        page = writer.add_blank_page(width=612, height=792)
+        content = DecodedStreamObject()
+        content.set_data(b"% " + os.urandom(PAGE_FILLER_BYTES).hex().encode() + b"\n")
+        page[NameObject("/Contents")] = writer._add_object(content)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class LoadTest:
+    """Closed-loop load generator with stepped concurrency."""
+
+    def __init__(
+        self,
+        client,
+        path: str = "/split",
+        sizes: str = DEFAULT_SIZES,
+        patterns: str = DEFAULT_PATTERNS,
+        pids: Sequence[int] = (),
+        seed: int = 0,
+    ):
+        self.client = client
+        self.path = path
+        self.pids = list(pids) or [os.getpid()]
+        self.random = random.Random(seed)
+        self.patterns = [pattern for pattern in patterns.split(";") if pattern.strip()]
+        mix = parse_weighted(sizes)
+        self.documents = {pages: create_pdf(pages) for pages, _ in mix}
+        self.weights = mix
+
+    def pick_request(self) -> Tuple[int, str]:
+        pages = self.random.choices(
+            [pages for pages, _ in self.weights],
+            weights=[weight for _, weight in self.weights],
+        )[0]
+        pattern = self.random.choice(self.patterns).format(n=pages)
+        return pages, pattern
+
+    async def _one_request(self, result: StageResult) -> None:
+        pages, pattern = self.pick_request()
+        files = {"file": (f"load_{pages}.pdf", self.documents[pages], "application/pdf")}
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(self.path, files=files, data={"page_ranges": pattern})
+            await response.aread()
+            status = str(response.status_code)
+        except Exception as e:
+            status = type(e).__name__
+        result.latencies.append(time.perf_counter() - started)
+        result.statuses[status] = result.statuses.get(status, 0) + 1
+
+    async def _sample_lag(self, result: StageResult, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            expected = time.perf_counter() + LAG_SAMPLE_INTERVAL
+            await asyncio.sleep(LAG_SAMPLE_INTERVAL)
+            result.loop_lag.append(max(0.0, time.perf_counter() - expected))
+
+    async def _sample_rss(self, result: StageResult, stop: asyncio.Event, started: float) -> None:
+        while not stop.is_set():
+            sample = {pid: rss for pid in self.pids if (rss := read_tree_rss(pid)) is not None}
+            result.rss_samples.append((time.perf_counter() - started, sample))
+            try:
+                await asyncio.wait_for(stop.wait(), RSS_SAMPLE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def run_stage(
+        self, concurrency: int, duration: float, max_requests: Optional[int] = None
+    ) -> StageResult:
+        """Keep ``concurrency`` requests in flight for ``duration`` seconds."""
+        result = StageResult(concurrency=concurrency)
+        stop = asyncio.Event()
+        started = time.perf_counter()
+        deadline = started + duration
+        issued = 0
+
+        async def worker():
+            nonlocal issued
+            while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+                issued += 1
+                await self._one_request(result)
+
+        samplers = [
+            asyncio.create_task(self._sample_lag(result, stop)),
+            asyncio.create_task(self._sample_rss(result, stop, started)),
+        ]
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.duration = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*samplers)
+        return result
+
+    async def ramp(
+        self, levels: Sequence[int], duration: float, max_requests: Optional[int] = None
+    ) -> List[StageResult]:
+        results = []
+        for level in levels:
+            print(f"[INFO] Stage: {level} concurrent uploads for {duration:.0f}s", file=sys.stderr)
+            results.append(await self.run_stage(level, duration, max_requests))
+        return results
+
+
+def load_app(spec: str):
+    """Import an ASGI app from 'module:attr' or 'path/to/file.py:attr'."""
+    target, _, attr = spec.partition(":")
+    attr = attr or "app"
+    if target.endswith(".py"):
+        spec_obj = importlib.util.spec_from_file_location("loadtest_target", target)
+        module = importlib.util.module_from_spec(spec_obj)
+        spec_obj.loader.exec_module(module)
+    else:
+        module = importlib.import_module(target)
+    return getattr(module, attr)
+
+
+def make_client(url: Optional[str], app_spec: Optional[str], timeout: float):
+    import httpx
+
+    if url:
+        return httpx.AsyncClient(base_url=url, timeout=timeout)
+    transport = httpx.ASGITransport(app=load_app(app_spec))
+    return httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout)
+
+
+def format_table(summaries: List[Dict[str, object]]) -> str:
+    header = f"{'conc':>5} {'reqs':>6} {'rps':>8} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'err %':>6} {'lag p99':>8} {'rss MB':>8}"
+    lines = [header, "-" * len(header)]
+    for s in summaries:
+        latency = s["latency_ms"]
+        peak = max(s["peak_rss_mb"].values(), default=0.0)
+        lines.append(
+            f"{s['concurrency']:>5} {s['requests']:>6} {s['throughput_rps']:>8.1f} "
+            f"{latency['p50']:>9.1f} {latency['p90']:>9.1f} {latency['p99']:>9.1f} "
+            f"{s['error_rate'] * 100:>6.1f} {s['loop_lag_ms']['p99']:>8.1f} {peak:>8.1f}"
+        )
+    return "\n".join(lines)
+
+
+async def main(argv: Optional[Sequence[str]] = None) -> List[Dict[str, object]]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--url", help="Base URL of a running server")
+    target.add_argument("--app", default="main:app", help="ASGI app to run in-process")
+    parser.add_argument("--path", default="/split", help="Endpoint path (/split or /api/split)")
+    parser.add_argument("--concurrency", default="10,50,200", help="Comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per stage")
+    parser.add_argument("--max-requests", type=int, help="Cap on requests per stage")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="Page counts with weights, e.g. 5:6,1000:1")
+    parser.add_argument("--patterns", default=DEFAULT_PATTERNS, help="';'-separated range patterns, {n} = page count")
+    parser.add_argument("--pid", type=int, action="append", default=[], help="Process whose tree to sample RSS from (repeatable)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Per-request timeout in seconds")
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.concurrency.split(",") if level.strip()]
+    async with make_client(args.url, args.app, args.timeout) as client:
+        load_test = LoadTest(client, args.path, args.sizes, args.patterns, args.pid)
+        results = await load_test.ramp(levels, args.duration, args.max_requests)
+
+    summaries = [result.summary() for result in results]
+    print(format_table(summaries))
+    if args.json:
+        with open(args.json, "w") as report:
+            json.dump(summaries, report, indent=2)
+    return summaries
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
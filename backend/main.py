@@ -1,27 +1,78 @@
+import hashlib
 import os
 import tempfile
 import shutil
+import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import List, Optional
 from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Request
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from starlette.concurrency import run_in_threadpool
 import uvicorn
 
-from split_pdf import split_pdf_to_zip, parse_page_ranges
+from splitter import compile_selection, iter_zip, merge_filename, zip_filename
+from splitter.images import get_profile
+from splitter.limits import JobLimitExceeded
+from splitter.textindex import compile_pattern, load_text_index
 from schemas import SplitResponse, ErrorResponse
+from singleflight import SingleFlight, request_key
+from scheduler import SplitScheduler, estimate_job_cost, estimate_selection_size, get_client_id
+from supervisor import MemoryWatch
+from worker import run_merge_job, run_split_job, run_text_extraction, run_text_selection, worker_pool
 
 
 # Configuration
 MAX_FILE_SIZE = 130 * 1024 * 1024  # 130MB
 ALLOWED_CONTENT_TYPES = ["application/pdf"]
+OPTIMIZE_OUTPUT = os.environ.get("OPTIMIZE_OUTPUT", "false").lower() == "true"
+STREAM_ZIP = os.environ.get("STREAM_ZIP", "false").lower() == "true"
+COALESCE_REQUESTS = os.environ.get("COALESCE_REQUESTS", "true").lower() == "true"
+MAX_MERGE_FILES = min(26, int(os.environ.get("MAX_MERGE_FILES", 10)))  # documents are lettered A-Z
+# The merged document is built in memory, so /merge takes less input than /split
+MAX_MERGE_SIZE = int(os.environ.get("MAX_MERGE_MB", 64)) * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", 300))
+STATS_HEADERS = [
+    "X-Split-Bytes-Before",
+    "X-Split-Bytes-After",
+    "X-Split-Optimize-Ms",
+    "X-Split-Text-Index",
+    "X-Split-Coalesced",
+    "X-Split-Images-Resampled",
+    "X-Split-Images-Skipped",
+    "X-Split-Images-Failed",
+]
+
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # The server has stopped accepting and drained in-flight requests; let
+    # any split job still running finish before the workers are stopped
+    print("[INFO] Shutting down, draining split workers")
+    await run_in_threadpool(worker_pool.shutdown, GRACEFUL_TIMEOUT)
+
 
 app = FastAPI(
     title="PDF Splitter API",
     description="Split PDF files by page ranges and download as ZIP",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Cost-aware job scheduler (fast lane for small splits, bulk lane for large ones)
+scheduler = SplitScheduler()
+
+# Single-flight deduplication of identical concurrent requests
+coalescer = SingleFlight()
+
+# Web worker RSS tracking (recycles the worker when supervised by gunicorn)
+memory_watch = MemoryWatch()
+
 # CORS middleware - Allow all origins for now (can be restricted later)
 app.add_middleware(
     CORSMiddleware,
@@ -29,7 +80,7 @@ app.add_middleware(
     allow_credentials=False,  # Must be False when using wildcard origin
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition"] + STATS_HEADERS,
 )
 
 
@@ -50,6 +101,14 @@ async def limit_upload_size(request: Request, call_next):
     return response
 
 
+# Memory check after every request
+@app.middleware("http")
+async def watch_memory(request: Request, call_next):
+    response = await call_next(request)
+    memory_watch.check()
+    return response
+
+
 @app.get("/")
 async def root():
     return {"message": "PDF Splitter API", "version": "1.0.0"}
@@ -57,10 +116,18 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "pdf-splitter"}
+    return {
+        "status": "draining" if memory_watch.recycling or worker_pool.draining else "healthy",
+        "service": "pdf-splitter",
+        "lanes": scheduler.stats(),
+        "workers": worker_pool.stats(),
+        "coalescing": coalescer.stats(),
+        "server": memory_watch.stats(),
+    }
 
 
 @app.options("/split")
+@app.options("/merge")
 async def split_options():
     """Handle preflight OPTIONS request for CORS"""
     from fastapi.responses import Response
@@ -73,15 +140,27 @@ async def split_options():
 
 @app.post("/split", response_model=SplitResponse)
 async def split_pdf(
+    request: Request,
     file: UploadFile = File(...),
-    page_ranges: str = Form(...)
+    page_ranges: Optional[str] = Form(None),
+    optimize: bool = Form(OPTIMIZE_OUTPUT),
+    text_contains: Optional[str] = Form(None),
+    split_on: Optional[str] = Form(None),
+    image_profile: Optional[str] = Form(None),
+    ordered: bool = Form(False)
 ):
     """
     Split PDF file by page ranges and return as ZIP download.
     
     Args:
         file: PDF file to split (max 130MB)
-        page_ranges: Comma-separated page ranges (e.g., "1-3,5,7-9")
+        page_ranges: Page selection (e.g., "1-3,5,7-9", "5-", "!-1", "odd", "1-100:2");
+            defaults to all pages when a text query is given
+        optimize: Write compact parts (object streams, xref streams, dedup)
+        text_contains: Only keep pages whose text contains this (case-insensitive)
+        split_on: Start a new part at each page whose first line matches this regex
+        image_profile: Downsample page images to "screen", "ebook" or "print" resolution
+        ordered: Keep the terms of page_ranges in order, repeats included, one part each
     
     Returns:
         ZIP file containing split PDF pages
@@ -91,6 +170,293 @@ async def split_pdf(
     print(f"[INFO] Page ranges: {page_ranges}")
     
     # Validate file
+    validate_upload(file)
+    
+    # Validate page ranges format (text queries select from all pages by default)
+    text_mode = bool(text_contains or split_on)
+    if text_mode and ordered:
+        print("[ERROR] Text queries combined with an ordered selection")
+        raise HTTPException(status_code=400, detail="Text queries cannot be combined with ordered selections")
+    if text_mode and not page_ranges:
+        page_ranges = "1-"
+    try:
+        selection = compile_selection(page_ranges, ordered=ordered)
+        print(f"[INFO] Compiled selection: {len(selection.runs)} run(s)")
+    except ValueError as e:
+        print(f"[ERROR] Invalid page ranges: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid page ranges: {str(e)}")
+    
+    if split_on:
+        try:
+            compile_pattern(split_on)
+        except ValueError as e:
+            print(f"[ERROR] Invalid split pattern: {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e))
+    
+    validate_image_profile(image_profile)
+    
+    # Save the upload to its own directory (removed by whichever split uses it)
+    upload_dir = tempfile.mkdtemp()
+    leader = False
+    try:
+        print(f"[INFO] Created temp directory: {upload_dir}")
+        
+        # Save uploaded file, hashing it on the way for request coalescing
+        temp_pdf_path = os.path.join(upload_dir, "input.pdf")
+        digest = await run_in_threadpool(save_upload, file, temp_pdf_path)
+        
+        print(f"[INFO] Saved uploaded file to: {temp_pdf_path}")
+        
+        # Estimate job cost and wait for a slot on the matching lane
+        input_bytes = os.path.getsize(temp_pdf_path)
+        selection_size = await run_in_threadpool(estimate_selection_size, selection, input_bytes)
+        cost = estimate_job_cost(input_bytes, *selection_size)
+        client_id = get_client_id(request.headers, request.client)
+        
+        async def compute():
+            try:
+                # Resolve text queries against the (cached) page text index
+                ranges, split_at, text_index_status = page_ranges, None, None
+                if text_mode:
+                    index, cached = await scheduler.run(
+                        cost, client_id, load_text_index, temp_pdf_path,
+                        extract=run_text_extraction, digest=digest,
+                    )
+                    text_index_status = "hit" if cached else "miss"
+                    print(f"[INFO] Text index {text_index_status} for {index.document_hash[:12]} ({len(index.pages)} pages)")
+                    ranges, split_at = await scheduler.run(
+                        cost, client_id, run_text_selection, index, selection, text_contains, split_on
+                    )
+                    print(f"[INFO] Text selection: {ranges} (new part at {split_at or 'none'})")
+                
+                # Split PDF and create ZIP (or just the parts when streaming the ZIP)
+                output, job_stats = await scheduler.run(
+                    cost, client_id, run_split_job, temp_pdf_path, ranges, file.filename, optimize,
+                    archive=not STREAM_ZIP, split_at=split_at, image_profile=image_profile, ordered=ordered,
+                )
+                return output, job_stats, text_index_status
+            finally:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+        
+        def start():
+            nonlocal leader
+            leader = True
+            return compute()
+        
+        # Identical requests in flight (same bytes, selection and options) share one split
+        key = request_key(
+            digest, selection.normalized(), file.filename, optimize,
+            text_contains, split_on, image_profile, STREAM_ZIP,
+        )
+        if not COALESCE_REQUESTS:
+            key = request_key(key, uuid.uuid4())
+        (output, job_stats, text_index_status), shared, release = await coalescer.do(
+            key, start, cleanup=remove_output
+        )
+        if shared:
+            print(f"[INFO] Coalesced with an identical request in flight ({key[:12]})")
+        
+        try:
+            # Get ZIP filename for response
+            output_zip_filename = zip_filename(file.filename)
+            
+            print(f"[INFO] Created {'ZIP stream' if STREAM_ZIP else 'ZIP file'}: {output_zip_filename}")
+            print(
+                f"[INFO] Output size: {job_stats['bytes_before']} -> {job_stats['bytes_after']} bytes "
+                f"(optimize={optimize}, {job_stats['optimize_cpu_ms']:.1f}ms CPU)"
+            )
+            
+            headers = {
+                "Content-Disposition": f"attachment; filename={output_zip_filename}",
+                "Access-Control-Expose-Headers": ", ".join(["Content-Disposition"] + STATS_HEADERS),
+                "X-Split-Bytes-Before": str(job_stats["bytes_before"]),
+                "X-Split-Bytes-After": str(job_stats["bytes_after"]),
+                "X-Split-Optimize-Ms": f"{job_stats['optimize_cpu_ms']:.1f}",
+                "X-Split-Coalesced": "true" if shared else "false",
+            }
+            if text_index_status:
+                headers["X-Split-Text-Index"] = text_index_status
+            if image_profile:
+                headers.update(image_headers(job_stats))
+                print(
+                    f"[INFO] Image profile {image_profile}: {job_stats['images_resampled']} resampled, "
+                    f"{job_stats['images_reused']} reused, {job_stats['images_skipped']} skipped, "
+                    f"{job_stats['images_failed']} failed, {job_stats['image_bytes_saved']} bytes saved"
+                )
+            
+            if STREAM_ZIP:
+                # Parts are compressed while the archive is being sent
+                return SharedStreamingResponse(
+                    iter_zip(output),
+                    media_type="application/zip",
+                    headers=headers,
+                    release=release,
+                )
+            
+            # Return file response
+            return SharedFileResponse(
+                path=output,
+                filename=output_zip_filename,
+                media_type="application/zip",
+                headers=headers,
+                release=release,
+            )
+        except BaseException:
+            # The response never took over the shared output
+            await release()
+            raise
+        
+    except JobLimitExceeded as e:
+        print(f"[ERROR] Job limit exceeded ({e.kind}): {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ValueError as e:
+        print(f"[ERROR] ValueError: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"[ERROR] Exception: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if not leader:
+            # Joined another request's split (or failed before starting one)
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+@app.post("/merge")
+async def merge_pdf(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    page_ranges: Optional[str] = Form(None),
+    optimize: bool = Form(OPTIMIZE_OUTPUT),
+    image_profile: Optional[str] = Form(None)
+):
+    """
+    Merge ordered page selections from one or more PDFs into a single PDF.
+    
+    Args:
+        files: PDF files to take pages from (referred to as A, B, C, ...)
+        page_ranges: Ordered selection (e.g., "A1-3,B,A10", "10,1-3,10", "-1-1");
+            defaults to every page of each file, in upload order
+        optimize: Write a compact PDF (object streams, xref streams, dedup)
+        image_profile: Downsample page images to "screen", "ebook" or "print" resolution
+    
+    Returns:
+        The merged PDF
+    """
+    
+    print(f"[INFO] Received merge request - Files: {[file.filename for file in files]}")
+    print(f"[INFO] Page ranges: {page_ranges}")
+    
+    if len(files) > MAX_MERGE_FILES:
+        print(f"[ERROR] Too many files: {len(files)}")
+        raise HTTPException(status_code=400, detail=f"At most {MAX_MERGE_FILES} files can be merged")
+    for file in files:
+        validate_upload(file)
+    
+    merge_size = sum(file.size or 0 for file in files)
+    if merge_size > MAX_MERGE_SIZE:
+        print(f"[ERROR] Merge input too large: {merge_size} bytes")
+        raise HTTPException(
+            status_code=413,
+            detail=f"Files to merge exceed {MAX_MERGE_SIZE // (1024*1024)}MB in total",
+        )
+    
+    if not page_ranges:
+        page_ranges = ",".join(chr(ord("A") + number) for number in range(len(files)))
+    try:
+        selection = compile_selection(page_ranges, ordered=True, documents=len(files))
+        print(f"[INFO] Compiled selection: {len(selection.runs)} run(s)")
+    except ValueError as e:
+        print(f"[ERROR] Invalid page ranges: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Invalid page ranges: {str(e)}")
+    
+    validate_image_profile(image_profile)
+    
+    upload_dir = tempfile.mkdtemp()
+    leader = False
+    try:
+        # Save uploaded files, hashing them on the way for request coalescing
+        input_paths = []
+        digests = []
+        for number, file in enumerate(files):
+            input_path = os.path.join(upload_dir, f"input{number}.pdf")
+            digests.append(await run_in_threadpool(save_upload, file, input_path))
+            input_paths.append(input_path)
+        
+        print(f"[INFO] Saved {len(input_paths)} uploaded file(s) to: {upload_dir}")
+        
+        input_bytes = sum(os.path.getsize(path) for path in input_paths)
+        selection_size = await run_in_threadpool(estimate_selection_size, selection, input_bytes)
+        cost = estimate_job_cost(input_bytes, *selection_size)
+        client_id = get_client_id(request.headers, request.client)
+        output_filename = merge_filename(files[0].filename)
+        
+        async def compute():
+            try:
+                return await scheduler.run(
+                    cost, client_id, run_merge_job, input_paths, page_ranges, files[0].filename, optimize,
+                    image_profile=image_profile,
+                )
+            finally:
+                shutil.rmtree(upload_dir, ignore_errors=True)
+        
+        def start():
+            nonlocal leader
+            leader = True
+            return compute()
+        
+        key = request_key(
+            "merge", *digests, selection.normalized(), files[0].filename, optimize, image_profile,
+        )
+        if not COALESCE_REQUESTS:
+            key = request_key(key, uuid.uuid4())
+        (output, job_stats), shared, release = await coalescer.do(key, start, cleanup=remove_output)
+        
+        try:
+            print(f"[INFO] Created merged PDF: {output_filename} ({job_stats['repeated_pages']} repeated page(s) shared)")
+            print(
+                f"[INFO] Output size: {job_stats['bytes_before']} -> {job_stats['bytes_after']} bytes "
+                f"(optimize={optimize}, {job_stats['optimize_cpu_ms']:.1f}ms CPU)"
+            )
+            
+            headers = {
+                "Content-Disposition": f"attachment; filename={output_filename}",
+                "Access-Control-Expose-Headers": ", ".join(["Content-Disposition"] + STATS_HEADERS),
+                "X-Split-Bytes-Before": str(job_stats["bytes_before"]),
+                "X-Split-Bytes-After": str(job_stats["bytes_after"]),
+                "X-Split-Optimize-Ms": f"{job_stats['optimize_cpu_ms']:.1f}",
+                "X-Split-Coalesced": "true" if shared else "false",
+            }
+            if image_profile:
+                headers.update(image_headers(job_stats))
+            
+            return SharedFileResponse(
+                path=output,
+                filename=output_filename,
+                media_type="application/pdf",
+                headers=headers,
+                release=release,
+            )
+        except BaseException:
+            # The response never took over the shared output
+            await release()
+            raise
+        
+    except JobLimitExceeded as e:
+        print(f"[ERROR] Job limit exceeded ({e.kind}): {str(e)}")
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    except ValueError as e:
+        print(f"[ERROR] ValueError: {str(e)}")
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"[ERROR] Exception: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    finally:
+        if not leader:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+
+
+def validate_upload(file: UploadFile) -> None:
+    """Reject uploads that are not PDF files with a usable name."""
     if not file.filename:
         print("[ERROR] No filename provided")
         raise HTTPException(status_code=400, detail="No file provided")
@@ -107,60 +473,76 @@ async def split_pdf(
     if len(file.filename) > 255:
         print(f"[ERROR] Filename too long: {len(file.filename)} characters")
         raise HTTPException(status_code=400, detail="Filename too long")
-    
-    # Validate page ranges format
-    try:
-        page_numbers = parse_page_ranges(page_ranges)
-        print(f"[INFO] Parsed page numbers: {page_numbers}")
-    except ValueError as e:
-        print(f"[ERROR] Invalid page ranges: {str(e)}")
-        raise HTTPException(status_code=400, detail=f"Invalid page ranges: {str(e)}")
-    
-    # Create temporary directory
-    with tempfile.TemporaryDirectory() as temp_dir:
+
+
+def validate_image_profile(image_profile: Optional[str]) -> None:
+    if image_profile:
         try:
-            print(f"[INFO] Created temp directory: {temp_dir}")
-            
-            # Save uploaded file
-            temp_pdf_path = os.path.join(temp_dir, "input.pdf")
-            
-            with open(temp_pdf_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
-            print(f"[INFO] Saved uploaded file to: {temp_pdf_path}")
-            
-            # Split PDF and create ZIP
-            zip_path = split_pdf_to_zip(temp_pdf_path, page_ranges, file.filename)
-            
-            # Get ZIP filename for response
-            zip_filename = os.path.basename(zip_path)
-            
-            print(f"[INFO] Created ZIP file: {zip_filename}")
-            
-            # Return file response
-            return FileResponse(
-                path=zip_path,
-                filename=zip_filename,
-                media_type="application/zip",
-                headers={
-                    "Content-Disposition": f"attachment; filename={zip_filename}",
-                    "Access-Control-Expose-Headers": "Content-Disposition"
-                }
-            )
-            
+            get_profile(image_profile)
         except ValueError as e:
-            print(f"[ERROR] ValueError: {str(e)}")
+            print(f"[ERROR] Invalid image profile: {image_profile}")
             raise HTTPException(status_code=400, detail=str(e))
-        except Exception as e:
-            print(f"[ERROR] Exception: {str(e)}")
-            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+
+
+def image_headers(job_stats: dict) -> dict:
+    """Response headers reporting what an image profile did to a job's images."""
+    return {
+        "X-Split-Images-Resampled": str(job_stats["images_resampled"]),
+        "X-Split-Images-Skipped": str(job_stats["images_skipped"]),
+        "X-Split-Images-Failed": str(job_stats["images_failed"]),
+    }
+
+
+def save_upload(file: UploadFile, path: str) -> str:
+    """Copy an upload to ``path`` in chunks, returning its SHA-256 hex digest."""
+    digest = hashlib.sha256()
+    with open(path, "wb") as buffer:
+        while chunk := file.file.read(UPLOAD_CHUNK_SIZE):
+            digest.update(chunk)
+            buffer.write(chunk)
+    return digest.hexdigest()
+
+
+class ReleaseWhenDone:
+    """
+    Response mixin releasing a coalesced output once the response is over.
+    
+    Unlike a background task, the release also runs when sending fails
+    (for example when the client disconnects mid-download).
+    """
+    
+    def __init__(self, *args, release, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = release
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.release()
+
+
+class SharedFileResponse(ReleaseWhenDone, FileResponse):
+    pass
+
+
+class SharedStreamingResponse(ReleaseWhenDone, StreamingResponse):
+    pass
+
+
+def remove_output(result) -> None:
+    """Delete a split's output once every response sharing it has been sent."""
+    output = result[0]
+    output_dir = os.path.dirname(output if isinstance(output, str) else output[0])
+    shutil.rmtree(output_dir, ignore_errors=True)
 
 
 @app.exception_handler(413)
 async def file_too_large_handler(request: Request, exc):
+    message = exc.detail if isinstance(exc, HTTPException) else "File too large. Maximum size is 130MB."
     return JSONResponse(
         status_code=413,
-        content={"success": False, "message": "File too large. Maximum size is 130MB."}
+        content={"success": False, "message": message}
     )
 
 
@@ -0,0 +1,193 @@
+import asyncio
+import os
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+
+# Cost model weights (arbitrary "cost units")
+COST_PER_MB = float(os.environ.get("COST_PER_MB", 1.0))
+COST_PER_PAGE = float(os.environ.get("COST_PER_PAGE", 0.2))
+COST_PER_GROUP = float(os.environ.get("COST_PER_GROUP", 1.0))
+
+# Assumed average page size for selections that depend on the page count
+COST_BYTES_PER_PAGE = int(os.environ.get("COST_BYTES_PER_PAGE", 100 * 1024))
+
+# Lane configuration
+FAST_LANE_MAX_COST = float(os.environ.get("FAST_LANE_MAX_COST", 20.0))
+FAST_LANE_CONCURRENCY = int(os.environ.get("FAST_LANE_CONCURRENCY", 4))
+BULK_LANE_CONCURRENCY = int(os.environ.get("BULK_LANE_CONCURRENCY", 1))
+
+# Peers whose X-Forwarded-For header is believed ("*" trusts every peer),
+# in the same format as gunicorn's forwarded_allow_ips
+TRUSTED_PROXIES = {
+    proxy.strip() for proxy in os.environ.get("TRUSTED_PROXIES", "").split(",") if proxy.strip()
+}
+
+
+def estimate_job_cost(input_bytes: int, page_count: int, group_count: int) -> float:
+    """
+    Estimate the relative cost of a split job before running it.
+
+    Parsing cost scales with the input size, copying cost with the number of
+    selected pages and writing cost with the number of output parts.
+    """
+    return (
+        (input_bytes / (1024 * 1024)) * COST_PER_MB
+        + page_count * COST_PER_PAGE
+        + group_count * COST_PER_GROUP
+    )
+
+
+def estimate_selection_size(selection, input_bytes: int) -> Tuple[int, int]:
+    """
+    Estimate (selected pages, output groups) without opening the document.
+
+    Absolute selections are counted exactly against their highest page.
+    Relative ones (open ranges, negative indices, odd/even) are counted
+    against a page count guessed from the input size. For ordered
+    selections the groups are their terms and repeated pages count again.
+    Counting never expands the selection page by page.
+    """
+    if selection.is_absolute:
+        total_pages = selection.upper_bound()
+    else:
+        total_pages = max(1, input_bytes // COST_BYTES_PER_PAGE)
+    try:
+        return selection.count(total_pages)
+    except ValueError:
+        return total_pages, len(selection.runs)
+
+
+class Lane:
+    """
+    Concurrency-limited execution lane.
+
+    Waiters are queued per client and served round-robin, so one client
+    submitting many jobs cannot starve the others on the same lane.
+    """
+
+    def __init__(self, name: str, concurrency: int):
+        if concurrency < 1:
+            raise ValueError(f"Lane concurrency must be at least 1: {name}")
+        self.name = name
+        self.concurrency = concurrency
+        self.running = 0
+        self.completed = 0
+        self._waiters: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+
+    @property
+    def queued(self) -> int:
+        return sum(len(waiters) for waiters in self._waiters.values())
+
+    async def acquire(self, client_id: str) -> None:
+        if self.running < self.concurrency and not self._waiters:
+            self.running += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(client_id, deque()).append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was handed over just before cancellation
+                self.release()
+            else:
+                self._discard(client_id, future)
+            raise
+
+    def release(self) -> None:
+        self.running -= 1
+        self.completed += 1
+        while self._waiters and self.running < self.concurrency:
+            client_id, waiters = self._waiters.popitem(last=False)
+            future = waiters.popleft()
+            if waiters:
+                # Client goes to the back of the rotation
+                self._waiters[client_id] = waiters
+            if not future.done():
+                self.running += 1
+                future.set_result(None)
+
+    def _discard(self, client_id: str, future: asyncio.Future) -> None:
+        waiters = self._waiters.get(client_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+        except ValueError:
+            pass
+        if not waiters:
+            del self._waiters[client_id]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": self.queued,
+            "completed": self.completed,
+        }
+
+
+class SplitScheduler:
+    """Route split jobs to a low-latency or a throughput lane by estimated cost."""
+
+    def __init__(
+        self,
+        fast_lane_max_cost: float = FAST_LANE_MAX_COST,
+        fast_concurrency: int = FAST_LANE_CONCURRENCY,
+        bulk_concurrency: int = BULK_LANE_CONCURRENCY,
+    ):
+        self.fast_lane_max_cost = fast_lane_max_cost
+        self.fast = Lane("fast", fast_concurrency)
+        self.bulk = Lane("bulk", bulk_concurrency)
+
+    def lane_for(self, cost: float) -> Lane:
+        return self.fast if cost <= self.fast_lane_max_cost else self.bulk
+
+    @asynccontextmanager
+    async def slot(self, cost: float, client_id: str):
+        lane = self.lane_for(cost)
+        await lane.acquire(client_id)
+        try:
+            yield lane
+        finally:
+            lane.release()
+
+    async def run(self, cost: float, client_id: str, func: Callable, *args, **kwargs) -> Any:
+        """Run a blocking job in the threadpool once its lane has a free slot."""
+        async with self.slot(cost, client_id) as lane:
+            print(f"[INFO] Running job on {lane.name} lane (cost={cost:.1f}, client={client_id})")
+            return await run_in_threadpool(func, *args, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"fast": self.fast.stats(), "bulk": self.bulk.stats()}
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    return "*" in TRUSTED_PROXIES or host in TRUSTED_PROXIES
+
+
+def get_client_id(headers, client: Optional[Any]) -> str:
+    """
+    Identify the requesting client.
+
+    X-Forwarded-For is only read when the socket peer is a trusted proxy.
+    Hops are then walked from the right, skipping trusted proxies, so the
+    result is the address the outermost trusted proxy saw rather than
+    whatever the client wrote at the left of the header.
+    """
+    host = client.host if client is not None and client.host else None
+    if host is None:
+        return "anonymous"
+
+    forwarded = headers.get("x-forwarded-for")
+    if forwarded and _is_trusted_proxy(host):
+        for hop in reversed(forwarded.split(",")):
+            hop = hop.strip()
+            if hop and not _is_trusted_proxy(hop):
+                return hop
+    return host
@@ -0,0 +1,101 @@
+"""
+Single-flight deduplication of identical split requests.
+
+Requests with the same key (input hash, normalized selection and output
+options) that arrive while a computation for that key is running attach to
+it instead of starting their own; every caller gets the same result. Keys
+are only shared while in flight: once a computation finishes, the next
+request computes afresh.
+
+A shared result may need cleanup (temporary files) once the last caller is
+done with it, so callers get a ``release`` coroutine to await when they no
+longer need the result.
+"""
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class Flight:
+    """One in-progress computation and the callers attached to it."""
+
+    def __init__(self, task: "asyncio.Task", cleanup: Optional[Callable[[Any], Any]]):
+        self.task = task
+        self.cleanup = cleanup
+        self.users = 0
+
+    async def release(self) -> None:
+        self.users -= 1
+        if self.users == 0 and self.task.done():
+            await self.run_cleanup()
+
+    async def run_cleanup(self) -> None:
+        if self.cleanup is not None and not self.task.cancelled() and self.task.exception() is None:
+            cleanup, self.cleanup = self.cleanup, None
+            await asyncio.get_running_loop().run_in_executor(None, cleanup, self.task.result())
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with equal keys into one computation."""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        cleanup: Optional[Callable[[Any], Any]] = None,
+    ) -> Tuple[Any, bool, Callable[[], Awaitable[None]]]:
+        """
+        Return ``(result, shared, release)`` for ``key``.
+
+        ``func`` only runs if no call with the same key is in flight;
+        ``shared`` tells whether this caller joined an existing one. The
+        computation runs as its own task, so a caller that disconnects does
+        not cancel it for the others. ``cleanup(result)`` runs once every
+        caller has awaited ``release``.
+        """
+        flight = self._flights.get(key)
+        shared = flight is not None
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(func())
+            flight = Flight(task, cleanup)
+            self._flights[key] = flight
+            task.add_done_callback(lambda _: self._finish(key, flight))
+
+        flight.users += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except BaseException:
+            await flight.release()
+            raise
+        return result, shared, flight.release
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._flights),
+            "waiting": sum(flight.users for flight in self._flights.values()),
+            "leaders": self.leaders,
+            "followers": self.followers,
+        }
+
+    def _finish(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        if not flight.task.cancelled():
+            # Mark the exception retrieved; callers re-raise it themselves
+            flight.task.exception()
+        if flight.users == 0:
+            # Every caller went away before the result was ready
+            asyncio.ensure_future(flight.run_cleanup())
+
+
+def request_key(*parts: Any) -> str:
+    """Stable key for a request from its input hash and normalized options."""
+    return hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
@@ -0,0 +1,24 @@
+"""
+PDF splitting package shared by all entry points.
+
+Heavy dependencies (pypdf) are imported lazily inside the functions
+that need them, so importing this package stays cheap on cold start.
+"""
+from .ranges import parse_page_ranges, validate_page_ranges, group_consecutive_pages
+from .selection import compile_selection
+from .archive import iter_zip, write_zip
+from .core import merge_filename, merge_pdfs, split_pdf_to_parts, split_pdf_to_zip, zip_filename
+
+__all__ = [
+    "parse_page_ranges",
+    "validate_page_ranges",
+    "group_consecutive_pages",
+    "compile_selection",
+    "split_pdf_to_zip",
+    "split_pdf_to_parts",
+    "zip_filename",
+    "merge_pdfs",
+    "merge_filename",
+    "iter_zip",
+    "write_zip",
+]
@@ -0,0 +1,255 @@
+"""
+Parallel ZIP assembly.
+
+Entries are deflated concurrently in a thread pool (zlib releases the GIL
+while compressing), with each entry's CRC-32 computed over the same chunks
+it is compressed from. Compressed data goes to a spooled temporary file, so
+only the CRC and sizes of an entry are held in memory beyond the first
+``SPOOL_MAX_SIZE`` bytes. The archive itself is written strictly in input
+order: each local header and its data are emitted as soon as that entry is
+ready, then the central directory. Entries that deflate does not shrink are
+stored instead, read back from their file. Entries and offsets past 4GiB get
+ZIP64 extra fields.
+
+The same generator backs both modes: ``write_zip`` writes it to a file and
+``iter_zip`` can be handed to a streaming response as-is.
+"""
+import os
+import struct
+import tempfile
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import IO, Deque, Iterator, List, Optional, Sequence, Tuple
+
+# Compression level and number of compression threads
+ZIP_COMPRESSION_LEVEL = int(os.environ.get("ZIP_COMPRESSION_LEVEL", 6))
+ZIP_WORKERS = int(os.environ.get("ZIP_WORKERS", min(8, os.cpu_count() or 1)))
+
+READ_CHUNK_SIZE = 1024 * 1024
+
+# Compressed bytes kept in memory per entry before spilling to disk
+SPOOL_MAX_SIZE = 2 * 1024 * 1024
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+END_RECORD = struct.Struct("<IHHHHIIH")
+ZIP64_END_RECORD = struct.Struct("<IQHHIIQQQQ")
+ZIP64_LOCATOR = struct.Struct("<IIQI")
+EXTRA_HEADER = struct.Struct("<HH")
+ZIP64_EXTRA_ID = 0x0001
+
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+MADE_BY_UNIX = 3 << 8
+FILE_ATTRIBUTES = 0o100644 << 16
+FLAG_UTF8 = 0x800
+
+ZIP32_MAX = 0xFFFFFFFF
+ZIP32_MAX_ENTRIES = 0xFFFF
+
+# Sizes and offsets from this value on are written to ZIP64 fields
+ZIP64_LIMIT = ZIP32_MAX
+
+
+@dataclass
+class ZipEntry:
+    """
+    One compressed archive member, ready to be written.
+
+    Deflated data is held in ``spool``; stored entries are read back from
+    ``source_path``. ``close`` releases the spool.
+    """
+    arcname: str
+    method: int
+    crc: int
+    size: int
+    compressed_size: int
+    source_path: str
+    spool: Optional[IO[bytes]] = None
+
+    def iter_data(self) -> Iterator[bytes]:
+        """Yield the entry's data as written to the archive."""
+        if self.spool is not None:
+            self.spool.seek(0)
+            source = self.spool
+        else:
+            source = open(self.source_path, "rb")
+        try:
+            while chunk := source.read(READ_CHUNK_SIZE):
+                yield chunk
+        finally:
+            if source is not self.spool:
+                source.close()
+
+    def close(self) -> None:
+        if self.spool is not None:
+            self.spool.close()
+
+
+def compress_entry(file_path: str, arcname: str, level: int = ZIP_COMPRESSION_LEVEL) -> ZipEntry:
+    """Deflate one file to a spooled temporary file, computing its CRC over the same chunks."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    crc = 0
+    size = 0
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        with open(file_path, "rb") as source:
+            while chunk := source.read(READ_CHUNK_SIZE):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                spool.write(compressor.compress(chunk))
+        spool.write(compressor.flush())
+        compressed_size = spool.tell()
+    except BaseException:
+        spool.close()
+        raise
+
+    if compressed_size >= size:
+        # Deflate did not help (e.g. already-compressed streams): store
+        spool.close()
+        return ZipEntry(arcname, ZIP_STORED, crc, size, size, file_path)
+    return ZipEntry(arcname, ZIP_DEFLATED, crc, size, compressed_size, file_path, spool)
+
+
+def iter_zip(
+    file_paths: Sequence[str],
+    arcnames: Optional[Sequence[str]] = None,
+    level: int = ZIP_COMPRESSION_LEVEL,
+    workers: int = ZIP_WORKERS,
+    date_time: Optional[Tuple[int, int, int, int, int, int]] = None,
+) -> Iterator[bytes]:
+    """
+    Yield a ZIP archive of ``file_paths`` chunk by chunk.
+
+    Up to ``2 * workers`` entries are compressed ahead of the one being
+    written, each holding at most ``SPOOL_MAX_SIZE`` bytes in memory, which
+    bounds memory regardless of entry or archive size. Entries appear in
+    input order with the same timestamp, so the same inputs always produce
+    the same archive layout.
+    """
+    if arcnames is None:
+        arcnames = [os.path.basename(path) for path in file_paths]
+    dos_time, dos_date = _dos_date_time(date_time or time.localtime()[:6])
+    lookahead = max(1, workers) * 2
+
+    offset = 0
+    central: List[bytes] = []
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="zip")
+    pending: Deque = deque()
+    jobs = iter(zip(file_paths, arcnames))
+    try:
+        while True:
+            for path, arcname in jobs:
+                pending.append(pool.submit(compress_entry, path, arcname, level))
+                if len(pending) >= lookahead:
+                    break
+            if not pending:
+                break
+
+            entry = pending.popleft().result()
+            try:
+                header, record = _entry_headers(entry, offset, dos_time, dos_date)
+                central.append(record)
+                yield header
+                yield from entry.iter_data()
+            finally:
+                entry.close()
+            offset += len(header) + entry.compressed_size
+    finally:
+        for future in pending:
+            future.cancel()
+        pool.shutdown(wait=True)
+        for future in pending:
+            if not future.cancelled() and future.exception() is None:
+                future.result().close()
+
+    directory = b"".join(central)
+    yield directory
+    yield _end_records(len(central), len(directory), offset)
+
+
+def write_zip(zip_path: str, file_paths: Sequence[str], **kwargs) -> int:
+    """Write a ZIP archive of ``file_paths`` to ``zip_path``; return its size."""
+    written = 0
+    with open(zip_path, "wb") as output:
+        for chunk in iter_zip(file_paths, **kwargs):
+            output.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def _entry_headers(entry: ZipEntry, offset: int, dos_time: int, dos_date: int) -> Tuple[bytes, bytes]:
+    """
+    Local header and central directory record of an entry at ``offset``.
+
+    Sizes and offsets that do not fit 32 bits are replaced by 0xFFFFFFFF and
+    given in a ZIP64 extra field: the local one always carries both sizes,
+    the central one only the overflowing fields, in the order they appear.
+    """
+    name = entry.arcname.encode("utf-8")
+    flags = 0 if entry.arcname.isascii() else FLAG_UTF8
+    size, compressed_size, header_offset = entry.size, entry.compressed_size, offset
+
+    local_extra = b""
+    if size >= ZIP64_LIMIT or compressed_size >= ZIP64_LIMIT:
+        local_extra = EXTRA_HEADER.pack(ZIP64_EXTRA_ID, 16) + struct.pack("<QQ", size, compressed_size)
+
+    central_values = []
+    if size >= ZIP64_LIMIT:
+        central_values.append(size)
+        size = ZIP32_MAX
+    if compressed_size >= ZIP64_LIMIT:
+        central_values.append(compressed_size)
+        compressed_size = ZIP32_MAX
+    if header_offset >= ZIP64_LIMIT:
+        central_values.append(header_offset)
+        header_offset = ZIP32_MAX
+    central_extra = b""
+    if central_values:
+        central_extra = EXTRA_HEADER.pack(ZIP64_EXTRA_ID, 8 * len(central_values)) + struct.pack(
+            f"<{len(central_values)}Q", *central_values
+        )
+
+    version = VERSION_ZIP64 if central_values else VERSION_DEFAULT
+    local_sizes = (ZIP32_MAX, ZIP32_MAX) if local_extra else (compressed_size, size)
+    local = LOCAL_HEADER.pack(
+        0x04034B50, version, flags, entry.method, dos_time, dos_date,
+        entry.crc, *local_sizes, len(name), len(local_extra),
+    )
+    record = CENTRAL_HEADER.pack(
+        0x02014B50, MADE_BY_UNIX | version, version, flags, entry.method,
+        dos_time, dos_date, entry.crc, compressed_size, size,
+        len(name), len(central_extra), 0, 0, 0, FILE_ATTRIBUTES, header_offset,
+    )
+    return local + name + local_extra, record + name + central_extra
+
+
+def _end_records(count: int, directory_size: int, directory_offset: int) -> bytes:
+    """End of central directory, with ZIP64 records when the counts overflow."""
+    if count < ZIP32_MAX_ENTRIES and directory_offset < ZIP64_LIMIT and directory_size < ZIP64_LIMIT:
+        return END_RECORD.pack(0x06054B50, 0, 0, count, count, directory_size, directory_offset, 0)
+
+    zip64_offset = directory_offset + directory_size
+    return (
+        ZIP64_END_RECORD.pack(
+            0x06064B50, ZIP64_END_RECORD.size - 12, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+            count, count, directory_size, directory_offset,
+        )
+        + ZIP64_LOCATOR.pack(0x07064B50, 0, zip64_offset, 1)
+        + END_RECORD.pack(
+            0x06054B50, 0, 0, min(count, ZIP32_MAX_ENTRIES), min(count, ZIP32_MAX_ENTRIES),
+            min(directory_size, ZIP32_MAX), min(directory_offset, ZIP32_MAX), 0,
+        )
+    )
+
+
+def _dos_date_time(date_time: Tuple[int, ...]) -> Tuple[int, int]:
+    year, month, day, hour, minute, second = date_time
+    year = max(1980, min(year, 2107))
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
@@ -0,0 +1,307 @@
+"""
+Compact PDF serialization for split parts.
+
+pypdf 4.x only writes classic xref tables with every object in the file body.
+This module serializes a ``PdfWriter`` itself instead: non-stream objects are
+packed into compressed object streams, the cross-reference section is written
+as an xref stream, byte-identical objects are merged and objects that are not
+reachable from the trailer are dropped.
+
+It relies on a few ``PdfWriter`` internals (``_objects``, ``_root``, ``_info``,
+``_ID``), which is why pypdf is pinned in requirements.txt.
+"""
+import hashlib
+import time
+import zlib
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Any, Dict, List
+
+# Non-stream objects packed per object stream
+OBJECTS_PER_STREAM = 100
+
+# Upper bound on dedup passes (each pass can expose new duplicates)
+MAX_DEDUP_PASSES = 8
+
+# Size of one classic xref table entry ("0000000000 00000 n \n")
+CLASSIC_XREF_ENTRY_SIZE = 20
+
+
+@dataclass
+class CompactStats:
+    """Result of a compact write."""
+    objects_in: int = 0
+    objects_out: int = 0
+    orphans_removed: int = 0
+    duplicates_merged: int = 0
+    classic_bytes: int = 0
+    bytes_written: int = 0
+    cpu_seconds: float = 0.0
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.classic_bytes - self.bytes_written
+
+
+def write_compact(writer, stream) -> CompactStats:
+    """
+    Write ``writer`` to ``stream`` using object and xref streams.
+
+    Returns statistics including the size the classic pypdf serialization
+    would have produced, computed from the same object bodies without
+    writing the file twice.
+    """
+    from pypdf.generic import IndirectObject
+
+    started = time.thread_time()
+    stats = CompactStats()
+
+    if getattr(writer, "_encryption", None) is not None:
+        # Encrypted output keeps the classic layout
+        start = stream.tell()
+        writer.write(stream)
+        stats.bytes_written = stats.classic_bytes = stream.tell() - start
+        stats.cpu_seconds = time.thread_time() - started
+        return stats
+
+    # Same preparation pypdf does before writing
+    if not writer._root:
+        writer._root = writer._add_object(writer._root_object)
+    writer._sweep_indirect_references(writer._root)
+
+    objects = {
+        idnum: obj
+        for idnum, obj in enumerate(writer._objects, 1)
+        if obj is not None
+    }
+    stats.objects_in = len(objects)
+
+    trailer_refs = [writer._root, writer._info]
+
+    # Baseline: what PdfWriter.write would have emitted for the same objects
+    bodies = {idnum: _serialize(obj) for idnum, obj in objects.items()}
+    stats.classic_bytes = _classic_size(writer, bodies)
+
+    # Drop objects unreachable from the trailer
+    live = _reachable(objects, [ref.idnum for ref in trailer_refs], writer)
+    stats.orphans_removed = len(objects) - len(live)
+    objects = {idnum: objects[idnum] for idnum in sorted(live)}
+    bodies = {idnum: bodies[idnum] for idnum in objects}
+
+    # Merge byte-identical objects until no new duplicates appear
+    protected = {ref.idnum for ref in trailer_refs}
+    protected.update(idnum for idnum, obj in objects.items() if _is_page_node(obj))
+    for _ in range(MAX_DEDUP_PASSES):
+        mapping = _find_duplicates(bodies, protected)
+        if not mapping:
+            break
+        stats.duplicates_merged += len(mapping)
+        for idnum in mapping:
+            del objects[idnum]
+        _rewrite_references(objects.values(), mapping, writer)
+        bodies = {idnum: _serialize(obj) for idnum, obj in objects.items()}
+
+    # Renumber densely so the xref stream has no holes
+    renumber = {old: new for new, old in enumerate(objects, 1)}
+    _rewrite_references(objects.values(), renumber, writer)
+    root = IndirectObject(renumber[writer._root.idnum], 0, writer)
+    info = IndirectObject(renumber[writer._info.idnum], 0, writer)
+    objects = {renumber[old]: obj for old, obj in objects.items()}
+    stats.objects_out = len(objects)
+
+    start = stream.tell()
+    _write_object_streams(writer, stream, start, objects, root, info)
+    stats.bytes_written = stream.tell() - start
+    stats.cpu_seconds = time.thread_time() - started
+    return stats
+
+
+def _serialize(obj) -> bytes:
+    buffer = BytesIO()
+    obj.write_to_stream(buffer)
+    return buffer.getvalue()
+
+
+def _is_stream(obj) -> bool:
+    from pypdf.generic import StreamObject
+    return isinstance(obj, StreamObject)
+
+
+def _is_page_node(obj) -> bool:
+    from pypdf.generic import DictionaryObject
+    # Identical pages must stay distinct objects in the page tree
+    return isinstance(obj, DictionaryObject) and obj.get("/Type") in ("/Page", "/Pages")
+
+
+def _classic_size(writer, bodies: Dict[int, bytes]) -> int:
+    size = len(writer.pdf_header) + 1 + len(b"%\xE2\xE3\xCF\xD3\n")
+    for idnum, body in bodies.items():
+        size += len(f"{idnum} 0 obj\n") + len(body) + len(b"\nendobj\n")
+    size += len(b"xref\n") + len(f"0 {len(writer._objects) + 1}\n")
+    size += CLASSIC_XREF_ENTRY_SIZE * (len(bodies) + 1)
+    trailer = _trailer_dict(writer, len(writer._objects) + 1, writer._root, writer._info)
+    size += len(b"trailer\n") + len(_serialize(trailer))
+    size += len(f"\nstartxref\n{size}\n%%EOF\n")
+    return size
+
+
+def _trailer_dict(writer, size: int, root, info):
+    from pypdf.generic import DictionaryObject, NameObject, NumberObject
+
+    trailer = DictionaryObject()
+    trailer[NameObject("/Size")] = NumberObject(size)
+    trailer[NameObject("/Root")] = root
+    trailer[NameObject("/Info")] = info
+    if writer._ID:
+        trailer[NameObject("/ID")] = writer._ID
+    return trailer
+
+
+def _children(obj):
+    from pypdf.generic import ArrayObject, DictionaryObject
+
+    if isinstance(obj, DictionaryObject):
+        return obj.values()
+    if isinstance(obj, ArrayObject):
+        return obj
+    return ()
+
+
+def _reachable(objects: Dict[int, Any], roots: List[int], writer) -> set:
+    from pypdf.generic import IndirectObject
+
+    live = set()
+    pending = [idnum for idnum in roots if idnum in objects]
+    while pending:
+        idnum = pending.pop()
+        if idnum in live:
+            continue
+        live.add(idnum)
+        stack = [objects[idnum]]
+        while stack:
+            for child in _children(stack.pop()):
+                if isinstance(child, IndirectObject):
+                    if child.pdf is writer and child.idnum in objects and child.idnum not in live:
+                        pending.append(child.idnum)
+                else:
+                    stack.append(child)
+    return live
+
+
+def _find_duplicates(bodies: Dict[int, bytes], protected: set) -> Dict[int, int]:
+    """Map each duplicate object number to the first object with the same bytes."""
+    canonical: Dict[bytes, int] = {}
+    mapping: Dict[int, int] = {}
+    for idnum, body in bodies.items():
+        if idnum in protected:
+            continue
+        digest = hashlib.sha256(body).digest()
+        first = canonical.setdefault(digest, idnum)
+        if first != idnum:
+            mapping[idnum] = first
+    return mapping
+
+
+def _rewrite_references(objects, mapping: Dict[int, int], writer) -> None:
+    from pypdf.generic import ArrayObject, DictionaryObject, IndirectObject
+
+    stack = list(objects)
+    seen = set()
+    while stack:
+        container = stack.pop()
+        # A container shared between objects must only be rewritten once
+        if id(container) in seen:
+            continue
+        seen.add(id(container))
+        if isinstance(container, DictionaryObject):
+            items = list(container.items())
+        elif isinstance(container, ArrayObject):
+            items = list(enumerate(container))
+        else:
+            continue
+        for key, value in items:
+            if isinstance(value, IndirectObject):
+                if value.pdf is writer and mapping.get(value.idnum, value.idnum) != value.idnum:
+                    new_ref = IndirectObject(mapping[value.idnum], 0, writer)
+                    if isinstance(container, DictionaryObject):
+                        dict.__setitem__(container, key, new_ref)
+                    else:
+                        list.__setitem__(container, key, new_ref)
+            elif isinstance(value, (DictionaryObject, ArrayObject)):
+                stack.append(value)
+
+
+def _stream_object(dictionary, data: bytes) -> bytes:
+    from pypdf.generic import NameObject, NumberObject
+
+    dictionary[NameObject("/Filter")] = NameObject("/FlateDecode")
+    dictionary[NameObject("/Length")] = NumberObject(len(data))
+    return _serialize(dictionary) + b"\nstream\n" + data + b"\nendstream"
+
+
+def _write_object_streams(writer, stream, start: int, objects: Dict[int, Any], root, info) -> None:
+    from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject
+
+    header = writer.pdf_header
+    if header < b"%PDF-1.5":
+        # Object and xref streams need PDF 1.5
+        header = b"%PDF-1.5"
+    stream.write(header + b"\n")
+    stream.write(b"%\xE2\xE3\xCF\xD3\n")
+
+    next_number = len(objects) + 1
+    # xref entries: object number -> (type, field2, field3)
+    entries: Dict[int, tuple] = {0: (0, 0, 65535)}
+
+    packed = [idnum for idnum, obj in objects.items() if not _is_stream(obj)]
+    for idnum, obj in objects.items():
+        if _is_stream(obj):
+            entries[idnum] = (1, stream.tell() - start, 0)
+            stream.write(f"{idnum} 0 obj\n".encode())
+            obj.write_to_stream(stream)
+            stream.write(b"\nendobj\n")
+
+    for chunk_start in range(0, len(packed), OBJECTS_PER_STREAM):
+        chunk = packed[chunk_start:chunk_start + OBJECTS_PER_STREAM]
+        stream_number = next_number
+        next_number += 1
+
+        offsets = []
+        body = BytesIO()
+        for index, idnum in enumerate(chunk):
+            offsets.append(f"{idnum} {body.tell()}")
+            objects[idnum].write_to_stream(body)
+            body.write(b"\n")
+            entries[idnum] = (2, stream_number, index)
+        prefix = (" ".join(offsets) + "\n").encode()
+
+        dictionary = DictionaryObject()
+        dictionary[NameObject("/Type")] = NameObject("/ObjStm")
+        dictionary[NameObject("/N")] = NumberObject(len(chunk))
+        dictionary[NameObject("/First")] = NumberObject(len(prefix))
+        data = zlib.compress(prefix + body.getvalue())
+
+        entries[stream_number] = (1, stream.tell() - start, 0)
+        stream.write(f"{stream_number} 0 obj\n".encode())
+        stream.write(_stream_object(dictionary, data))
+        stream.write(b"\nendobj\n")
+
+    xref_number = next_number
+    xref_offset = stream.tell() - start
+    entries[xref_number] = (1, xref_offset, 0)
+    size = xref_number + 1
+
+    offset_width = max(4, (max(entry[1] for entry in entries.values()).bit_length() + 7) // 8)
+    widths = (1, offset_width, 2)
+    rows = bytearray()
+    for idnum in range(size):
+        entry = entries.get(idnum, (0, 0, 0))
+        for value, width in zip(entry, widths):
+            rows += value.to_bytes(width, "big")
+
+    dictionary = _trailer_dict(writer, size, root, info)
+    dictionary[NameObject("/Type")] = NameObject("/XRef")
+    dictionary[NameObject("/W")] = ArrayObject(NumberObject(width) for width in widths)
+    stream.write(f"{xref_number} 0 obj\n".encode())
+    stream.write(_stream_object(dictionary, zlib.compress(bytes(rows))))
+    stream.write(f"\nendobj\nstartxref\n{xref_offset}\n%%EOF\n".encode())
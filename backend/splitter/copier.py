@@ -0,0 +1,35 @@
+"""
+Shared page copying for ordered selections and merges.
+
+pypdf already maps every source object to a single copy per writer, so a
+page added twice to the same output gets a new page dictionary but shares
+its content streams, fonts and images with the first copy. ``PageCopier``
+also keeps the pruned form of each source page, so a page repeated N times
+has its resources scanned once and its content serialized once.
+"""
+from typing import Dict, Tuple
+
+from .prune import ResourcePruner
+
+
+class PageCopier:
+    """Add pages from one or more readers to one writer."""
+
+    def __init__(self, writer, prune_resources: bool = True):
+        self.writer = writer
+        self.pruner = ResourcePruner(writer) if prune_resources else None
+        self._pages: Dict[Tuple[int, int], object] = {}
+        self.repeated = 0
+
+    def add_page(self, reader, page_number: int) -> None:
+        """Append 0-indexed ``page_number`` of ``reader`` to the writer."""
+        key = (id(reader), page_number)
+        page = self._pages.get(key)
+        if page is None:
+            page = reader.pages[page_number]
+            if self.pruner is not None:
+                page = self.pruner.prune_page(page)
+            self._pages[key] = page
+        else:
+            self.repeated += 1
+        self.writer.add_page(page)
@@ -0,0 +1,274 @@
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+from .archive import write_zip
+from .compact import write_compact
+from .copier import PageCopier
+from .images import ImageResampler, get_profile
+from .limits import JobLimitExceeded
+from .selection import compile_selection, cut_runs
+
+
+# Resource pruning is on unless a deployment opts out
+PRUNE_RESOURCES = os.environ.get("PRUNE_RESOURCES", "true").lower() == "true"
+
+
+def split_pdf_to_zip(
+    pdf_file_path: str,
+    page_ranges: str,
+    original_filename: str,
+    optimize: bool = False,
+    stats: Optional[dict] = None,
+    prune_resources: bool = PRUNE_RESOURCES,
+    split_at: Optional[Sequence[int]] = None,
+    image_profile: Optional[str] = None,
+    ordered: bool = False,
+    output_dir: Optional[str] = None,
+) -> str:
+    """
+    Split PDF according to a page selection and return path to ZIP file.
+    
+    The parts are written by ``split_pdf_to_parts`` and then deflated in
+    parallel into a single archive (see ``splitter.archive``), both in
+    ``output_dir`` (see ``split_pdf_to_parts``).
+    """
+    owned = output_dir is None
+    output_dir = output_dir or tempfile.mkdtemp()
+    try:
+        output_files = split_pdf_to_parts(
+            pdf_file_path, page_ranges, original_filename, optimize, stats, prune_resources, split_at,
+            image_profile, ordered, output_dir,
+        )
+        
+        try:
+            # Create ZIP file next to the parts
+            zip_path = os.path.join(output_dir, zip_filename(original_filename))
+            write_zip(zip_path, output_files)
+            return zip_path
+        except Exception as e:
+            raise ValueError(f"Error creating ZIP file: {str(e)}")
+    except Exception:
+        if owned:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+
+def split_pdf_to_parts(
+    pdf_file_path: str,
+    page_ranges: str,
+    original_filename: str,
+    optimize: bool = False,
+    stats: Optional[dict] = None,
+    prune_resources: bool = PRUNE_RESOURCES,
+    split_at: Optional[Sequence[int]] = None,
+    image_profile: Optional[str] = None,
+    ordered: bool = False,
+    output_dir: Optional[str] = None,
+) -> List[str]:
+    """
+    Split PDF according to a page selection and return the part paths.
+    
+    ``page_ranges`` is a selection expression (see ``splitter.selection``).
+    Parts are written to ``output_dir``, in page order. Without one they go
+    to a fresh temporary directory, which is removed again if the split
+    fails; a caller passing ``output_dir`` owns it and its cleanup.
+    
+    With ``optimize`` the parts are written with object streams, an xref
+    stream, identical objects merged and orphaned objects dropped. If a
+    ``stats`` dict is passed it is filled with the per-job size and CPU cost
+    of the optimization.
+    
+    With ``prune_resources`` each page only carries the resources its content
+    streams actually use, instead of a shared document-wide dictionary.
+    
+    ``split_at`` lists 1-indexed pages that start a new part even when they
+    follow the previous selected page.
+    
+    ``image_profile`` ("screen", "ebook" or "print") downsamples images drawn
+    above the profile resolution (see ``splitter.images``).
+    
+    With ``ordered`` the selection is an ordered one: each term becomes one
+    part, in the order given and repeats included, and the parts are
+    numbered so the archive lists them in that order.
+    """
+    # Imported lazily to keep cold start cheap for endpoints that never split
+    from pypdf import PdfReader, PdfWriter
+    
+    resampler = None
+    owned = output_dir is None
+    output_dir = output_dir or tempfile.mkdtemp()
+    try:
+        # Compile selection (resolved once the page count is known)
+        selection = compile_selection(page_ranges, ordered=ordered)
+        if ordered and split_at:
+            raise ValueError("Ordered selections cannot be split at pages")
+        if image_profile:
+            resampler = ImageResampler(get_profile(image_profile))
+        
+        # Read PDF
+        reader = PdfReader(pdf_file_path)
+        total_pages = len(reader.pages)
+        
+        # Get base filename without extension
+        base_name = Path(original_filename).stem
+        
+        if selection.ordered:
+            # One part per term, numbered so the archive keeps their order
+            segments = selection.resolve_sequence([total_pages])
+            width = max(2, len(str(len(segments))))
+            parts = [
+                (f"{base_name}_{number:0{width}d}_{_pages_label(pages[0], pages[-1])}.pdf", pages)
+                for number, (_, pages) in enumerate(segments, 1)
+            ]
+        else:
+            # Resolve to sorted runs of consecutive pages, one part per run
+            page_runs = selection.resolve(total_pages)
+            if split_at:
+                page_runs = cut_runs(page_runs, [page - 1 for page in split_at])
+            parts = [
+                (f"{base_name}_{_pages_label(first, last)}.pdf", range(first, last + 1))
+                for first, last in page_runs
+            ]
+        
+        output_files = []
+        job_stats = {"parts": 0, "bytes_before": 0, "bytes_after": 0, "optimize_cpu_ms": 0.0, "repeated_pages": 0}
+        
+        for output_filename, pages in parts:
+            writer = PdfWriter()
+            copier = PageCopier(writer, prune_resources)
+            
+            # Add pages to writer
+            for page_num in pages:
+                copier.add_page(reader, page_num)
+            if resampler is not None:
+                resampler.resample_part(writer)
+            job_stats["repeated_pages"] += copier.repeated
+            
+            output_path = os.path.join(output_dir, output_filename)
+            _write_part(writer, output_path, optimize, job_stats)
+            output_files.append(output_path)
+        
+        if not optimize:
+            job_stats["bytes_before"] = job_stats["bytes_after"]
+        if resampler is not None:
+            job_stats.update(resampler.stats)
+        if stats is not None:
+            stats.update(job_stats)
+        
+        return output_files
+        
+    except Exception as e:
+        if owned:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        if isinstance(e, JobLimitExceeded):
+            raise
+        raise ValueError(f"Error processing PDF: {str(e)}")
+    finally:
+        if resampler is not None:
+            resampler.close()
+
+
+def merge_pdfs(
+    pdf_file_paths: Sequence[str],
+    page_ranges: str,
+    original_filename: str,
+    optimize: bool = False,
+    stats: Optional[dict] = None,
+    prune_resources: bool = PRUNE_RESOURCES,
+    image_profile: Optional[str] = None,
+    output_dir: Optional[str] = None,
+) -> str:
+    """
+    Merge an ordered selection over one or more PDFs into one file and return its path.
+    
+    ``page_ranges`` is an ordered selection whose terms pick documents by
+    letter (A for the first path, B for the second, ...). Pages are copied
+    in the order given into a single writer, so a page used more than once,
+    and everything it draws, is written once. The writer holds the whole
+    merged document in memory until it is saved, so callers should bound
+    the total input size. ``optimize``, ``stats``,
+    ``prune_resources``, ``image_profile`` and ``output_dir`` work as for
+    ``split_pdf_to_parts``.
+    """
+    # Imported lazily to keep cold start cheap for endpoints that never merge
+    from pypdf import PdfReader, PdfWriter
+    
+    resampler = None
+    owned = output_dir is None
+    output_dir = output_dir or tempfile.mkdtemp()
+    try:
+        selection = compile_selection(page_ranges, ordered=True, documents=len(pdf_file_paths))
+        if image_profile:
+            resampler = ImageResampler(get_profile(image_profile))
+        
+        # Readers only parse the objects the selected pages use
+        readers = [PdfReader(path) for path in pdf_file_paths]
+        segments = selection.resolve_sequence([len(reader.pages) for reader in readers])
+        
+        writer = PdfWriter()
+        copier = PageCopier(writer, prune_resources)
+        for document, pages in segments:
+            for page_num in pages:
+                copier.add_page(readers[document], page_num)
+        if resampler is not None:
+            resampler.resample_part(writer)
+        
+        job_stats = {
+            "parts": 0, "bytes_before": 0, "bytes_after": 0, "optimize_cpu_ms": 0.0,
+            "repeated_pages": copier.repeated,
+        }
+        output_path = os.path.join(output_dir, merge_filename(original_filename))
+        _write_part(writer, output_path, optimize, job_stats)
+        
+        if not optimize:
+            job_stats["bytes_before"] = job_stats["bytes_after"]
+        if resampler is not None:
+            job_stats.update(resampler.stats)
+        if stats is not None:
+            stats.update(job_stats)
+        
+        return output_path
+        
+    except Exception as e:
+        if owned:
+            shutil.rmtree(output_dir, ignore_errors=True)
+        if isinstance(e, JobLimitExceeded):
+            raise
+        raise ValueError(f"Error processing PDF: {str(e)}")
+    finally:
+        if resampler is not None:
+            resampler.close()
+
+
+def _pages_label(first: int, last: int) -> str:
+    """Filename label of a part running from 0-indexed ``first`` to ``last``."""
+    if first == last:
+        return f"page{first + 1}"
+    return f"pages{first + 1}-{last + 1}"
+
+
+def _write_part(writer, output_path: str, optimize: bool, job_stats: dict) -> None:
+    """Write one output file and add its sizes to ``job_stats``."""
+    with open(output_path, 'wb') as output_file:
+        if optimize:
+            part_stats = write_compact(writer, output_file)
+            job_stats["bytes_before"] += part_stats.classic_bytes
+            job_stats["optimize_cpu_ms"] += part_stats.cpu_seconds * 1000
+        else:
+            writer.write(output_file)
+    
+    job_stats["parts"] += 1
+    job_stats["bytes_after"] += os.path.getsize(output_path)
+
+
+def merge_filename(original_filename: str) -> str:
+    """Name of the merged PDF built for ``original_filename``."""
+    return f"{Path(original_filename).stem}_merged.pdf"
+
+
+def zip_filename(original_filename: str) -> str:
+    """Name of the archive built for ``original_filename``."""
+    return f"{Path(original_filename).stem}_split.zip"
@@ -0,0 +1,329 @@
+"""
+Image downsampling output profiles.
+
+Scanned documents carry one full-resolution raster per page, which makes
+parts large and dominates ZIP time. With an output profile, every image a
+part draws at more than ``RESAMPLE_THRESHOLD`` times the profile resolution
+is resampled to that resolution and re-encoded as JPEG while the part is
+written.
+
+The effective resolution of an image is worked out from the current
+transformation matrix at each ``Do`` in the page content (and in the forms it
+draws); an image drawn more than once is sized for its largest use. Decoding,
+resizing and encoding run on a thread pool (zlib and Pillow release the GIL),
+and results are cached per job by a hash of the encoded image, so an image
+shared by several pages or parts is processed once. Images the profile cannot
+handle safely (masks, decode arrays, CMYK, indexed or non 8-bit colour) are
+left untouched, as is any image the re-encoding would not make smaller.
+"""
+import hashlib
+import math
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict, List, Optional, Set, Tuple
+
+from .limits import JobLimitExceeded, decode_stream
+from .prune import MAX_FORM_DEPTH, _content_data
+
+IMAGE_WORKERS = int(os.environ.get("IMAGE_WORKERS", min(4, os.cpu_count() or 1)))
+
+# Only resample images drawn above this multiple of the profile resolution,
+# so images that are barely over it are not re-encoded for little gain
+RESAMPLE_THRESHOLD = 1.5
+
+# Images with more pixels than this are left alone rather than decoded
+MAX_IMAGE_PIXELS = 200_000_000
+
+IDENTITY = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+@dataclass(frozen=True)
+class ImageProfile:
+    name: str
+    dpi: int
+    quality: int
+
+
+PROFILES = {
+    "screen": ImageProfile("screen", 72, 60),
+    "ebook": ImageProfile("ebook", 150, 75),
+    "print": ImageProfile("print", 300, 90),
+}
+
+# Colour spaces that map directly onto a Pillow mode
+COMPONENT_MODES = {1: "L", 3: "RGB"}
+DEVICE_COMPONENTS = {"/DeviceGray": 1, "/G": 1, "/DeviceRGB": 3, "/RGB": 3}
+SUPPORTED_FILTERS = {(): "raw", ("/FlateDecode",): "raw", ("/Fl",): "raw", ("/DCTDecode",): "jpeg", ("/DCT",): "jpeg"}
+
+
+def get_profile(name: str) -> ImageProfile:
+    """Return the output profile called ``name``, raising ValueError if unknown."""
+    if name not in PROFILES:
+        raise ValueError(
+            f"Unknown image profile: {name} (expected one of {', '.join(PROFILES)})"
+        )
+    return PROFILES[name]
+
+
+class ImageResampler:
+    """
+    Resample oversized images of the parts of one job.
+
+    Use as a context manager around the job so the thread pool is shut down
+    with it; ``stats`` holds the per-job counts and byte savings. Oversized
+    images are counted once per job as resampled, skipped (the profile cannot
+    re-encode them, or re-encoding would not make them smaller) or failed
+    (decoding or encoding raised); a page whose content cannot be scanned
+    counts as one failure.
+    """
+
+    def __init__(self, profile: ImageProfile, workers: int = IMAGE_WORKERS):
+        _require_pillow()
+        self.profile = profile
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="image")
+        self._results: Dict[str, Future] = {}
+        self._counted: Set[str] = set()
+        self.stats = {
+            "images_resampled": 0,
+            "images_reused": 0,
+            "images_skipped": 0,
+            "images_failed": 0,
+            "image_bytes_saved": 0,
+        }
+
+    def __enter__(self) -> "ImageResampler":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+    def resample_part(self, writer) -> None:
+        """Replace the oversized images of the pages added to ``writer``."""
+        usages: Dict[int, Tuple[object, float]] = {}
+        for page in writer.pages:
+            resources = page.get("/Resources")
+            if resources is None:
+                continue
+            try:
+                _collect_images(_content_data(page.get("/Contents")), resources.get_object(), IDENTITY, usages, 0)
+            except JobLimitExceeded:
+                raise
+            except Exception as e:
+                print(f"[WARN] Image resampling skipped for page: {str(e)}")
+                self.stats["images_failed"] += 1
+
+        pending = []
+        for idnum, (image, dpi) in usages.items():
+            if dpi <= self.profile.dpi * RESAMPLE_THRESHOLD:
+                continue
+            size = self._target_size(image, dpi)
+            if size is None:
+                self._count(_cache_key(image, None), "images_skipped")
+                continue
+            key = _cache_key(image, size)
+            future = self._results.get(key)
+            if future is None:
+                future = self._pool.submit(_resample, image, size, self.profile.quality)
+                self._results[key] = future
+            else:
+                self.stats["images_reused"] += 1
+            pending.append((idnum, image, key, future))
+
+        for idnum, image, key, future in pending:
+            try:
+                result = future.result()
+            except (JobLimitExceeded, MemoryError):
+                raise
+            except Exception as e:
+                if self._count(key, "images_failed"):
+                    print(f"[WARN] Image resampling failed: {str(e)}")
+                continue
+            if result is None:
+                self._count(key, "images_skipped")
+                continue
+            if self._count(key, "images_resampled"):
+                self.stats["image_bytes_saved"] += len(image._data) - len(result[0])
+            writer._objects[idnum - 1] = _replacement(image, *result)
+
+    def _count(self, key: str, outcome: str) -> bool:
+        """Count the outcome of an image the first time it is seen in the job."""
+        if key in self._counted:
+            return False
+        self._counted.add(key)
+        self.stats[outcome] += 1
+        return True
+
+    def _target_size(self, image, dpi: float) -> Optional[Tuple[int, int]]:
+        """Pixel size for the profile resolution, or None if the profile cannot handle the image."""
+        if _components(image) is None:
+            return None
+        scale = self.profile.dpi / dpi
+        width, height = int(image["/Width"]), int(image["/Height"])
+        return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _collect_images(data: bytes, resources, ctm, usages: Dict[int, Tuple[object, float]], depth: int) -> None:
+    """Record the lowest effective resolution of each image drawn by ``data``."""
+    from pypdf.generic import ContentStream, DecodedStreamObject, IndirectObject
+
+    xobjects = resources.get("/XObject")
+    if xobjects is None:
+        return
+    xobjects = xobjects.get_object()
+
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    stack: List[tuple] = []
+    for operands, operator in ContentStream(stream, None).operations:
+        if operator == b"q":
+            stack.append(ctm)
+        elif operator == b"Q":
+            ctm = stack.pop() if stack else ctm
+        elif operator == b"cm" and len(operands) == 6:
+            ctm = _multiply(tuple(float(value) for value in operands), ctm)
+        elif operator == b"Do" and operands and operands[0] in xobjects:
+            ref = xobjects.raw_get(operands[0])
+            xobject = ref.get_object()
+            subtype = xobject.get("/Subtype")
+            if subtype == "/Image" and isinstance(ref, IndirectObject):
+                dpi = _effective_dpi(xobject, ctm)
+                if dpi is not None:
+                    previous = usages.get(ref.idnum)
+                    usages[ref.idnum] = (xobject, min(dpi, previous[1]) if previous else dpi)
+            elif subtype == "/Form" and depth < MAX_FORM_DEPTH:
+                matrix = tuple(float(value) for value in xobject.get("/Matrix", IDENTITY))
+                form_resources = xobject.get("/Resources")
+                form_resources = form_resources.get_object() if form_resources is not None else resources
+                _collect_images(decode_stream(xobject), form_resources, _multiply(matrix, ctm), usages, depth + 1)
+
+
+def _multiply(m, n) -> tuple:
+    """Concatenate transformation matrices (``m`` applied first)."""
+    a, b, c, d, e, f = m
+    A, B, C, D, E, F = n
+    return (
+        a * A + b * C,
+        a * B + b * D,
+        c * A + d * C,
+        c * B + d * D,
+        e * A + f * C + E,
+        e * B + f * D + F,
+    )
+
+
+def _effective_dpi(image, ctm) -> Optional[float]:
+    """Lower of the horizontal and vertical resolution the image is drawn at."""
+    # The image occupies the unit square, so its drawn size is the length
+    # of the transformed unit vectors (in points, 72 per inch)
+    width_in = math.hypot(ctm[0], ctm[1]) / 72
+    height_in = math.hypot(ctm[2], ctm[3]) / 72
+    if width_in <= 0 or height_in <= 0:
+        return None
+    return min(int(image.get("/Width", 0)) / width_in, int(image.get("/Height", 0)) / height_in)
+
+
+def _components(image) -> Optional[int]:
+    """Colour components of an image the profile can re-encode, else None."""
+    if (
+        image.get("/ImageMask")
+        or "/Mask" in image
+        or "/Decode" in image
+        or image.get("/BitsPerComponent") != 8
+        or _filter_kind(image) is None
+    ):
+        return None
+    width, height = int(image.get("/Width", 0)), int(image.get("/Height", 0))
+    if width <= 0 or height <= 0 or width * height > MAX_IMAGE_PIXELS:
+        return None
+
+    color_space = image.get("/ColorSpace")
+    if color_space is None:
+        return None
+    color_space = color_space.get_object()
+    if isinstance(color_space, str):
+        return DEVICE_COMPONENTS.get(color_space)
+    if len(color_space) == 2 and color_space[0] == "/ICCBased":
+        components = color_space[1].get_object().get("/N")
+        return components if components in COMPONENT_MODES else None
+    return None
+
+
+def _filter_kind(image) -> Optional[str]:
+    filters = image.get("/Filter")
+    if filters is None:
+        filters = ()
+    elif isinstance(filters, str):
+        filters = (filters,)
+    else:
+        filters = tuple(filters)
+    if "/DecodeParms" in image and filters and SUPPORTED_FILTERS.get(filters) == "jpeg":
+        # DCT parameters (colour transform overrides) are not reproduced
+        return None
+    return SUPPORTED_FILTERS.get(filters)
+
+
+def _cache_key(image, size: Optional[Tuple[int, int]]) -> str:
+    digest = hashlib.sha256(image._data)
+    for name in ("/Filter", "/DecodeParms", "/ColorSpace", "/Width", "/Height"):
+        digest.update(repr(image.get(name)).encode("utf-8"))
+    digest.update(repr(size).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _resample(image, size: Tuple[int, int], quality: int) -> Optional[Tuple[bytes, int, int]]:
+    """
+    Decode, resize and JPEG-encode an image; None if it should be kept as is.
+
+    Errors while decoding or encoding are raised to the caller.
+    """
+    from PIL import Image
+
+    data = decode_stream(image)
+    width, height = int(image["/Width"]), int(image["/Height"])
+    mode = COMPONENT_MODES[_components(image)]
+    if _filter_kind(image) == "jpeg":
+        picture = Image.open(BytesIO(data))
+        # Let the JPEG decoder do most of the downscaling
+        picture.draft(mode, size)
+    else:
+        if len(data) < width * height * len(mode):
+            return None
+        picture = Image.frombytes(mode, (width, height), data)
+    if picture.mode != mode:
+        return None
+
+    output = BytesIO()
+    picture.resize(size, Image.LANCZOS).save(output, "JPEG", quality=quality, optimize=True)
+
+    encoded = output.getvalue()
+    if len(encoded) >= len(image._data):
+        return None
+    return encoded, size[0], size[1]
+
+
+def _replacement(image, data: bytes, width: int, height: int):
+    """Copy of ``image`` holding the resampled JPEG."""
+    from pypdf.generic import EncodedStreamObject, NameObject, NumberObject
+
+    replacement = EncodedStreamObject()
+    for name, value in dict.items(image):
+        if name not in ("/Filter", "/DecodeParms", "/Length"):
+            dict.__setitem__(replacement, name, value)
+    replacement[NameObject("/Filter")] = NameObject("/DCTDecode")
+    replacement[NameObject("/Width")] = NumberObject(width)
+    replacement[NameObject("/Height")] = NumberObject(height)
+    replacement._data = data
+    replacement.indirect_reference = image.indirect_reference
+    return replacement
+
+
+def _require_pillow() -> None:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise ValueError("Image profiles require Pillow to be installed")
@@ -0,0 +1,172 @@
+"""
+Per-job resource limits.
+
+Limits come in deployment tiers (``SPLIT_TIER``) and each one can be
+overridden individually through the environment. The decoded stream limit
+is enforced here: by ``decode_stream`` wherever the splitter decodes a
+stream itself, and, once ``install_decode_limits`` has run (every isolated
+worker does so), inside pypdf's own filters for every stream pypdf decodes.
+RSS and wall-clock limits are enforced by the isolated worker that runs the
+job.
+"""
+import os
+import zlib
+from dataclasses import dataclass
+from typing import Optional
+
+MB = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class JobLimits:
+    max_rss_bytes: int
+    max_wall_seconds: float
+    max_decoded_stream_bytes: int
+
+
+TIERS = {
+    "free": JobLimits(512 * MB, 60, 128 * MB),
+    "standard": JobLimits(1024 * MB, 180, 256 * MB),
+    "pro": JobLimits(2048 * MB, 600, 1024 * MB),
+}
+
+
+class JobLimitExceeded(Exception):
+    """A split job went over one of its resource limits and was aborted."""
+
+    # Oversized documents are a client problem, running out of time is ours
+    STATUS_CODES = {"rss": 400, "decoded_size": 400, "wall_time": 504}
+
+    def __init__(self, kind: str, limit: float, message: str):
+        super().__init__(kind, limit, message)
+        self.kind = kind
+        self.limit = limit
+        self.message = message
+
+    def __str__(self) -> str:
+        return self.message
+
+    @property
+    def status_code(self) -> int:
+        return self.STATUS_CODES.get(self.kind, 500)
+
+
+def get_job_limits(tier: Optional[str] = None) -> JobLimits:
+    """Limits for ``tier`` (default ``SPLIT_TIER``) with environment overrides."""
+    tier = tier or os.environ.get("SPLIT_TIER", "standard")
+    if tier not in TIERS:
+        raise ValueError(f"Unknown deployment tier: {tier}")
+    base = TIERS[tier]
+    return JobLimits(
+        max_rss_bytes=int(float(os.environ.get("JOB_MAX_RSS_MB", base.max_rss_bytes / MB)) * MB),
+        max_wall_seconds=float(os.environ.get("JOB_MAX_WALL_SECONDS", base.max_wall_seconds)),
+        max_decoded_stream_bytes=int(
+            float(os.environ.get("JOB_MAX_DECODED_STREAM_MB", base.max_decoded_stream_bytes / MB)) * MB
+        ),
+    )
+
+
+# Limits applied by decode_stream and pypdf's filters in this process
+_active_limits = get_job_limits()
+
+
+def set_active_limits(limits: JobLimits) -> None:
+    global _active_limits
+    _active_limits = limits
+
+
+def get_active_limits() -> JobLimits:
+    return _active_limits
+
+
+def decode_stream(stream) -> bytes:
+    """
+    Decode a PDF stream, refusing to inflate past the decoded stream limit.
+
+    Flate data is test-inflated with a bounded output size first, so a
+    decompression bomb is rejected before pypdf materializes it.
+    """
+    limit = _active_limits.max_decoded_stream_bytes
+    filters = stream.get("/Filter")
+    if filters is not None and not isinstance(filters, str):
+        filters = filters[0] if len(filters) else None
+    raw = getattr(stream, "_data", None)
+    if filters in ("/FlateDecode", "/Fl") and isinstance(raw, bytes):
+        try:
+            inflated = zlib.decompressobj().decompress(raw, limit + 1)
+        except zlib.error:
+            # Leave damaged streams to pypdf's more forgiving decoder
+            inflated = b""
+        if len(inflated) > limit:
+            raise _decoded_size_exceeded(limit)
+
+    data = stream.get_data()
+    if len(data) > limit:
+        raise _decoded_size_exceeded(limit)
+    return data
+
+
+def install_decode_limits() -> None:
+    """
+    Enforce the decoded stream limit inside pypdf's filters in this process.
+
+    pypdf's Flate decompression is replaced by one that inflates with a
+    bounded output size, so a bomb fails before it is materialized at any
+    position of a filter chain, and the output of every other expanding
+    filter is checked as soon as it is decoded. Safe to call more than once.
+    """
+    from pypdf import filters
+
+    if getattr(filters.decompress, "bounded", False):
+        return
+    filters.decompress = _bounded_decompress
+    for decoder in (filters.FlateDecode, filters.LZWDecode, filters.RunLengthDecode,
+                    filters.ASCIIHexDecode, filters.ASCII85Decode):
+        decoder.decode = staticmethod(_bounded_decoder(decoder.decode))
+
+
+def _bounded_decompress(data: bytes) -> bytes:
+    """pypdf's ``decompress``, refusing to inflate past the decoded stream limit."""
+    limit = _active_limits.max_decoded_stream_bytes
+    try:
+        inflater = zlib.decompressobj()
+        inflated = inflater.decompress(data, limit + 1)
+        if len(inflated) > limit:
+            raise _decoded_size_exceeded(limit)
+        if inflater.eof:
+            return inflated
+    except zlib.error:
+        pass
+
+    # Damaged or truncated data: pypdf recovers what it can byte by byte
+    inflater = zlib.decompressobj(zlib.MAX_WBITS | 32)
+    recovered = bytearray()
+    for offset in range(len(data)):
+        try:
+            recovered += inflater.decompress(data[offset:offset + 1])
+        except zlib.error:
+            pass
+        if len(recovered) > limit:
+            raise _decoded_size_exceeded(limit)
+    return bytes(recovered)
+
+
+_bounded_decompress.bounded = True
+
+
+def _bounded_decoder(decode):
+    def bounded_decode(*args, **kwargs):
+        data = decode(*args, **kwargs)
+        limit = _active_limits.max_decoded_stream_bytes
+        if len(data) > limit:
+            raise _decoded_size_exceeded(limit)
+        return data
+    return bounded_decode
+
+
+def _decoded_size_exceeded(limit: int) -> JobLimitExceeded:
+    return JobLimitExceeded(
+        "decoded_size",
+        limit,
+        f"Document contains a stream larger than the {limit // MB}MB decoded size limit",
+    )
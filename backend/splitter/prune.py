@@ -0,0 +1,183 @@
+"""
+Per-part resource pruning.
+
+Many producers share one /Resources dictionary across every page, so copying
+a single page drags every font, image and form of the document along. The
+pruner scans the content streams of each page for the names it uses and
+rewrites /Resources to contain only those entries. Form XObjects are
+followed: forms that inherit the page resources add their names to the page,
+forms with their own resources get a pruned copy of their own.
+
+Name scanning is token based rather than operator based. A name that appears
+anywhere in a content stream keeps the matching resource, which can only err
+on the side of keeping too much.
+"""
+import re
+from typing import Dict, Optional, Set
+
+from .limits import JobLimitExceeded, decode_stream
+
+# Resource categories that are looked up by name from content streams
+PRUNABLE_CATEGORIES = (
+    "/Font",
+    "/XObject",
+    "/ExtGState",
+    "/ColorSpace",
+    "/Pattern",
+    "/Shading",
+    "/Properties",
+)
+
+# Guard against pathological form nesting
+MAX_FORM_DEPTH = 16
+
+NAME_TOKEN = re.compile(rb"/([^\s/\[\]()<>{}%]*)")
+NAME_ESCAPE = re.compile(rb"#([0-9A-Fa-f]{2})")
+
+
+def scan_names(data: bytes) -> Set[str]:
+    """Return every name token (as ``/Name``) appearing in a content stream."""
+    names = set()
+    for match in NAME_TOKEN.finditer(data):
+        token = match.group(1)
+        if b"#" in token:
+            token = NAME_ESCAPE.sub(lambda m: bytes([int(m.group(1), 16)]), token)
+        names.add("/" + token.decode("latin-1"))
+    return names
+
+
+class ResourcePruner:
+    """
+    Build pruned copies of pages for one output part.
+
+    One pruner is used per ``PdfWriter`` so a form XObject shared by several
+    pages of the same part is pruned and written once.
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self._forms: Dict[int, object] = {}
+
+    def prune_page(self, page):
+        """
+        Return a copy of ``page`` whose /Resources only holds used entries.
+
+        The page is returned unchanged if it has no resources or its content
+        cannot be decoded.
+        """
+        from pypdf import PageObject
+        from pypdf.generic import NameObject
+
+        resources = page.get("/Resources")
+        if resources is None:
+            return page
+        resources = resources.get_object()
+
+        try:
+            used = set()
+            self._collect(_content_data(page.get("/Contents")), resources, used, 0, set())
+            pruned_resources = self._prune_resources(resources, used, 0)
+        except JobLimitExceeded:
+            raise
+        except Exception as e:
+            print(f"[WARN] Resource pruning skipped for page: {str(e)}")
+            return page
+
+        # Shallow copy that keeps the original reference so add_page clones it
+        pruned = PageObject(page.pdf, page.indirect_reference)
+        for key, value in dict.items(page):
+            dict.__setitem__(pruned, key, value)
+        pruned[NameObject("/Resources")] = pruned_resources
+        return pruned
+
+    def _collect(self, data: bytes, resources, used: Set[str], depth: int, visiting: Set[int]) -> None:
+        """Add names used by ``data`` and by forms inheriting ``resources``."""
+        names = scan_names(data)
+        used.update(names)
+
+        xobjects = resources.get("/XObject")
+        if xobjects is None or depth >= MAX_FORM_DEPTH:
+            return
+        xobjects = xobjects.get_object()
+        for name in names:
+            ref = xobjects.raw_get(name) if name in xobjects else None
+            if ref is None:
+                continue
+            form = ref.get_object()
+            if form.get("/Subtype") != "/Form" or "/Resources" in form:
+                continue
+            # Form without resources of its own looks names up in ours
+            key = id(form)
+            if key in visiting:
+                continue
+            visiting.add(key)
+            self._collect(decode_stream(form), resources, used, depth + 1, visiting)
+
+    def _prune_resources(self, resources, used: Set[str], depth: int):
+        from pypdf.generic import DictionaryObject, NameObject
+
+        pruned = DictionaryObject()
+        for key, value in dict.items(resources):
+            if key not in PRUNABLE_CATEGORIES:
+                pruned[key] = value
+                continue
+            category = value.get_object()
+            if not isinstance(category, DictionaryObject):
+                pruned[key] = value
+                continue
+
+            kept = DictionaryObject()
+            for name, entry in dict.items(category):
+                if name not in used:
+                    continue
+                if key == "/XObject":
+                    entry = self._prune_form(entry, depth + 1)
+                kept[name] = entry
+            if kept:
+                pruned[NameObject(key)] = kept
+        return pruned
+
+    def _prune_form(self, ref, depth: int):
+        """Return a reference to a pruned copy of a form XObject with own resources."""
+        from pypdf.generic import IndirectObject, NameObject
+
+        if not isinstance(ref, IndirectObject) or depth >= MAX_FORM_DEPTH:
+            return ref
+        form = ref.get_object()
+        if form.get("/Subtype") != "/Form" or "/Resources" not in form:
+            return ref
+
+        key = id(form)
+        if key in self._forms:
+            return self._forms[key]
+        # Placeholder breaks cycles between forms
+        self._forms[key] = ref
+
+        resources = form["/Resources"].get_object()
+        used = set()
+        self._collect(decode_stream(form), resources, used, depth, set())
+        pruned_resources = self._prune_resources(resources, used, depth)
+
+        copy = form.__class__()
+        for name, value in dict.items(form):
+            if name != "/Resources":
+                dict.__setitem__(copy, name, value)
+        copy._data = form._data
+        copy[NameObject("/Resources")] = pruned_resources
+
+        # Deep-clones the referenced objects into the writer (shared ones once)
+        new_ref = self.writer._add_object(copy.clone(self.writer))
+        self._forms[key] = new_ref
+        return new_ref
+
+
+def _content_data(contents: Optional[object]) -> bytes:
+    """Decoded bytes of a page /Contents entry (stream or array of streams)."""
+    from pypdf.generic import ArrayObject
+
+    if contents is None:
+        return b""
+    contents = contents.get_object()
+    if isinstance(contents, ArrayObject):
+        return b"\n".join(decode_stream(part.get_object()) for part in contents)
+    return decode_stream(contents)
@@ -1,10 +1,4 @@
-import os
-import re
-import tempfile
-import zipfile
-from typing import List, Tuple, Set
-from pypdf import PdfReader, PdfWriter
-from pathlib import Path
+from typing import List
 
 
 def parse_page_ranges(ranges_str: str) -> List[int]:
@@ -65,68 +59,6 @@ def validate_page_ranges(page_numbers: List[int], total_pages: int) -> None:
             raise ValueError(f"Page {page_num + 1} is out of bounds (PDF has {total_pages} pages)")
 
 
-def split_pdf_to_zip(pdf_file_path: str, page_ranges: str, original_filename: str) -> str:
-    """
-    Split PDF according to page ranges and return path to ZIP file.
-    """
-    try:
-        # Parse ranges
-        page_numbers = parse_page_ranges(page_ranges)
-        
-        # Read PDF
-        reader = PdfReader(pdf_file_path)
-        total_pages = len(reader.pages)
-        
-        # Validate ranges
-        validate_page_ranges(page_numbers, total_pages)
-        
-        # Create temporary directory for output files
-        temp_dir = tempfile.mkdtemp()
-        output_files = []
-        
-        # Get base filename without extension
-        base_name = Path(original_filename).stem
-        
-        # Group consecutive pages for efficient splitting
-        page_groups = group_consecutive_pages(page_numbers)
-        
-        for i, group in enumerate(page_groups, 1):
-            writer = PdfWriter()
-            
-            # Add pages to writer
-            for page_num in group:
-                writer.add_page(reader.pages[page_num])
-            
-            # Generate output filename
-            if len(group) == 1:
-                output_filename = f"{base_name}_page{group[0] + 1}.pdf"
-            else:
-                output_filename = f"{base_name}_pages{group[0] + 1}-{group[-1] + 1}.pdf"
-            
-            output_path = os.path.join(temp_dir, output_filename)
-            
-            # Write PDF
-            with open(output_path, 'wb') as output_file:
-                writer.write(output_file)
-            
-            output_files.append(output_path)
-        
-        # Create ZIP file
-        zip_filename = f"{base_name}_split.zip"
-        zip_path = os.path.join(temp_dir, zip_filename)
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_path in output_files:
-                # Use only basename to avoid directory structure in ZIP
-                arcname = os.path.basename(file_path)
-                zipf.write(file_path, arcname)
-        
-        return zip_path
-        
-    except Exception as e:
-        raise ValueError(f"Error processing PDF: {str(e)}")
-
-
 def group_consecutive_pages(page_numbers: List[int]) -> List[List[int]]:
     """Group consecutive page numbers together."""
     if not page_numbers:
@@ -143,4 +75,4 @@ def group_consecutive_pages(page_numbers: List[int]) -> List[List[int]]:
             current_group = [page_numbers[i]]
     
     groups.append(current_group)
-    return groups
\ No newline at end of file
+    return groups
@@ -0,0 +1,483 @@
+"""
+Page selection expressions.
+
+A selection is a comma-separated list of terms:
+
+    5         single page
+    1-3       range
+    5-        page 5 to the last page
+    -1        last page (negative indices count from the end)
+    -3-       third-to-last page to the last page
+    1-100:2   every 2nd page of a range
+    odd, even odd or even pages
+    !10-20    exclude pages (exclusions only: everything but those pages)
+
+Expressions compile to a list of runs without knowing the document. Once the
+page count is known, each run becomes a ``(first, last, step)`` progression.
+``count`` sizes a selection from the progressions arithmetically, at a cost
+that does not grow with the number of pages, so it is safe to call on
+untrusted expressions before the document is opened. ``resolve`` turns them
+into the sorted, disjoint intervals that become output parts; stepped runs
+give one interval per page there, so it is only called against the real page
+count of a document, inside the split worker.
+
+Ordered selections (``compile_selection(expression, ordered=True)``) keep the
+terms in the order given instead, repeats included, and also accept
+descending ranges (``10-1``, ``-1-1`` for the whole document reversed). Their
+terms can name the document they take pages from with a letter, ``A`` being
+the first: ``A1-3,B,A10`` is pages 1-3 of the first document, all of the
+second, then page 10 of the first. A term without a letter uses the document
+of the term before it. Exclusions remove pages from every term.
+"""
+import math
+import re
+from dataclasses import dataclass
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+TERM = re.compile(r"^(?P<start>-?\d+)(?:(?P<dash>-)(?P<end>-?\d+)?)?(?::(?P<step>\d+))?$")
+
+# Document letter of an ordered term ("B5", "B-2", "Bodd", "B"): only a
+# letter followed by a page number, a keyword or nothing, so "Odd" is odd
+# pages rather than document O's "dd"
+DOCUMENT = re.compile(r"^(?P<letter>[A-Z])(?=\s*(?:$|[\d-]|(?i:odd|even)\s*$))")
+
+# Ordered selections can repeat pages, so their length is not bounded by the
+# documents; refuse expressions that would build absurdly long outputs
+MAX_SEQUENCE_PAGES = 50_000
+
+# Every operation on a selection is at least linear in its terms
+MAX_TERMS = 1000
+
+# Page counts assumed at most when sizing absolute selections
+MAX_DOCUMENT_PAGES = 1_000_000
+
+# Longest period of overlapping stepped runs that ``count`` works out
+# exactly; beyond it the count is an upper bound
+MAX_COUNT_PERIOD = 10_000
+
+# 0-indexed pages first, first + step, ... up to last (a member)
+Progression = Tuple[int, int, int]
+
+KEYWORDS = {
+    "odd": (1, None, 2),
+    "even": (2, None, 2),
+}
+
+
+@dataclass(frozen=True)
+class Run:
+    """
+    Pages ``start`` to ``end`` (1-based, inclusive) taking every ``step``-th.
+
+    Negative indices count from the end (-1 is the last page) and an ``end``
+    of None means the last page.
+    """
+    start: int
+    end: Optional[int]
+    step: int = 1
+    exclude: bool = False
+    document: int = 0
+
+    @property
+    def is_absolute(self) -> bool:
+        return self.start > 0 and self.end is not None and self.end > 0
+
+
+@dataclass(frozen=True)
+class Selection:
+    """Compiled page selection; resolved against a page count with ``resolve``."""
+    runs: Tuple[Run, ...]
+    ordered: bool = False
+
+    @property
+    def documents(self) -> int:
+        """Number of documents the selection takes pages from."""
+        return max(run.document for run in self.runs) + 1
+
+    @property
+    def is_absolute(self) -> bool:
+        """True if the selection does not depend on the page count."""
+        return all(run.is_absolute for run in self.runs) and any(not run.exclude for run in self.runs)
+
+    def resolve(self, total_pages: int) -> List[Tuple[int, int]]:
+        """
+        Return sorted, disjoint 0-indexed ``(first, last)`` intervals.
+
+        Consecutive pages end up in the same interval, so each interval is
+        one output part.
+        """
+        if self.ordered:
+            raise ValueError("Ordered selections cannot be resolved to sorted pages")
+        includes, excludes = self._progressions(total_pages)
+        intervals = _subtract(_merge(_expand(includes)), _merge(_expand(excludes)))
+        if not intervals:
+            raise ValueError("No pages selected")
+        return intervals
+
+    def count(self, total_pages: int) -> Tuple[int, int]:
+        """
+        Return the number of selected pages and of output parts.
+
+        Nothing is expanded page by page. Ordered selections count each term
+        as a part and do not subtract exclusions, which makes their page count
+        an upper bound.
+        """
+        if self.ordered:
+            lengths = [
+                len(_run_range(run, total_pages)) for run in self.runs if not run.exclude
+            ] or [total_pages]
+            return sum(lengths), len(lengths)
+        return _count(*self._progressions(total_pages))
+
+    def _progressions(self, total_pages: int) -> Tuple[List[Progression], List[Progression]]:
+        includes: List[Progression] = []
+        excludes: List[Progression] = []
+        for run in self.runs:
+            progression = _run_progression(run, total_pages)
+            if progression is not None:
+                (excludes if run.exclude else includes).append(progression)
+
+        if not any(not run.exclude for run in self.runs):
+            # Only exclusions: start from the whole document
+            includes = [(0, total_pages - 1, 1)] if total_pages else []
+        return includes, excludes
+
+    def resolve_sequence(self, page_counts: Sequence[int]) -> List[Tuple[int, List[int]]]:
+        """
+        Return ``(document, pages)`` segments of an ordered selection.
+
+        ``page_counts`` holds the page count of each document. Each term
+        gives one segment of 0-indexed pages in the requested order; pages
+        removed by exclusions are dropped and emptied segments skipped.
+        """
+        if self.documents > len(page_counts):
+            raise ValueError(
+                f"Unknown document {_letter(self.documents - 1)} ({len(page_counts)} document(s) given)"
+            )
+
+        # Ranges test membership arithmetically, so exclusions stay compact
+        excluded: List[List[range]] = [[] for _ in page_counts]
+        for run in self.runs:
+            if run.exclude:
+                excluded[run.document].append(_run_range(run, page_counts[run.document]))
+
+        segments = []
+        total = 0
+        includes = [run for run in self.runs if not run.exclude]
+        if not includes:
+            # Only exclusions: every page of each document they touch
+            includes = [Run(1, None, document=document) for document in sorted(
+                {run.document for run in self.runs}
+            )]
+        for run in includes:
+            pages = _run_range(run, page_counts[run.document])
+            if total + len(pages) > MAX_SEQUENCE_PAGES:
+                raise ValueError(f"Selection has more than {MAX_SEQUENCE_PAGES} pages")
+            exclusions = excluded[run.document]
+            pages = [page for page in pages if not any(page in excluded_pages for excluded_pages in exclusions)]
+            if not pages:
+                continue
+            total += len(pages)
+            segments.append((run.document, pages))
+
+        if not segments:
+            raise ValueError("No pages selected")
+        return segments
+
+    def normalized(self) -> str:
+        """
+        Canonical form of the selection.
+
+        Absolute selections that pick the same pages (e.g. "5,1-3" and
+        "1,2,3,5") normalize to the same string; relative ones normalize to
+        their sorted, de-duplicated runs. Absolute selections with stepped
+        runs normalize to their merged plain ranges plus their sorted
+        progressions, which is deterministic but does not catch every
+        equivalent spelling. Ordered selections keep their terms in order.
+
+        Absolute forms end with the highest page any term names, including
+        exclusions, since that is what decides whether the selection fits a
+        document: "1-10,!6-10" and "1-5" pick the same pages but only the
+        second is valid for a 7-page PDF, so they must not share a split.
+        """
+        if self.ordered:
+            return "ordered:" + ",".join(
+                f"{'!' if run.exclude else ''}{_letter(run.document)}"
+                f"{run.start}-{'' if run.end is None else run.end}:{run.step}"
+                for run in self.runs
+            )
+        if self.is_absolute:
+            # Built from the merged runs; pages are never expanded
+            includes: List[Progression] = []
+            excludes: List[Progression] = []
+            for run in self.runs:
+                (excludes if run.exclude else includes).append(_progression(run.start - 1, run.end - 1, run.step))
+            if all(step == 1 for _, _, step in includes + excludes):
+                pages = _format_intervals(_subtract(_merge(_expand(includes)), _merge(_expand(excludes))))
+            else:
+                pages = ",".join(
+                    _format_progressions(includes) + [f"!{term}" for term in _format_progressions(excludes)]
+                )
+            return f"{pages};max={max(max(run.start, run.end) for run in self.runs)}"
+        terms = {
+            f"{'!' if run.exclude else ''}{run.start}-{'' if run.end is None else run.end}:{run.step}"
+            for run in self.runs
+        }
+        return ",".join(sorted(terms))
+
+    def upper_bound(self) -> Optional[int]:
+        """
+        Highest page an absolute selection can touch (1-based), else None.
+
+        Clamped to ``MAX_DOCUMENT_PAGES``, so a huge page number in a request
+        cannot make sizing the selection expensive.
+        """
+        if not self.is_absolute:
+            return None
+        return min(max(max(run.start, run.end) for run in self.runs), MAX_DOCUMENT_PAGES)
+
+
+def compile_selection(expression: str, ordered: bool = False, documents: int = 1) -> Selection:
+    """
+    Compile a selection expression, raising ValueError on bad syntax.
+
+    With ``ordered`` the expression is an ordered selection whose document
+    letters must refer to one of ``documents`` documents.
+    """
+    if not expression or not expression.strip():
+        raise ValueError("Page ranges cannot be empty")
+
+    runs = []
+    document = 0
+    for term in expression.split(','):
+        term = term.strip()
+        if not term:
+            continue
+        exclude = term.startswith('!')
+        if exclude:
+            term = term[1:].strip()
+
+        if ordered and term.lower() not in KEYWORDS:
+            match = DOCUMENT.match(term)
+            if match:
+                document = ord(match.group("letter")) - ord("A")
+                if document >= documents:
+                    raise ValueError(f"Unknown document {match.group('letter')} ({documents} document(s) given)")
+                # A bare letter selects the whole document
+                term = term[1:].strip() or "1-"
+        term = term.lower()
+
+        if term in KEYWORDS:
+            start, end, step = KEYWORDS[term]
+            runs.append(Run(start, end, step, exclude, document))
+            continue
+
+        match = TERM.match(term.replace(' ', ''))
+        if not match:
+            raise ValueError(f"Invalid page selection: {term}")
+        start = int(match.group("start"))
+        end = start
+        if match.group("dash"):
+            end = int(match.group("end")) if match.group("end") else None
+        step = int(match.group("step") or 1)
+
+        if start == 0 or end == 0:
+            raise ValueError("Page numbers must not be 0")
+        if step < 1:
+            raise ValueError(f"Invalid step: {term}")
+        if not ordered and start > 0 and end is not None and end > 0 and start > end:
+            raise ValueError(f"Invalid range: {term}")
+        runs.append(Run(start, end, step, exclude, document))
+
+    if len(runs) > MAX_TERMS:
+        raise ValueError(f"Selection has more than {MAX_TERMS} terms")
+    if not runs:
+        raise ValueError("No valid pages specified")
+    return Selection(tuple(runs), ordered)
+
+
+def _index(value: int, total_pages: int) -> int:
+    """Turn a 1-based or negative index into a 0-based page number."""
+    page = value - 1 if value > 0 else total_pages + value
+    if page < 0 or page >= total_pages:
+        raise ValueError(f"Page {value} is out of bounds (PDF has {total_pages} pages)")
+    return page
+
+
+def _run_progression(run: Run, total_pages: int) -> Optional[Progression]:
+    """The run's pages as a progression ending on its last member, or None if empty."""
+    first = _index(run.start, total_pages)
+    last = total_pages - 1 if run.end is None else _index(run.end, total_pages)
+    if first > last:
+        if run.end is None or run.start < 0 or run.end < 0:
+            # Relative range that is empty for this document
+            return None
+        raise ValueError(f"Invalid range: {run.start}-{run.end}")
+    return _progression(first, last, run.step)
+
+
+def _progression(first: int, last: int, step: int) -> Progression:
+    """Progression from ``first`` to ``last``, trimmed to end on a member."""
+    last = first + (last - first) // step * step
+    return (first, last, step if last > first else 1)
+
+
+def _format_progressions(progressions: List[Progression]) -> List[str]:
+    plain = _format_intervals(_merge([(first, last) for first, last, step in progressions if step == 1]))
+    stepped = sorted({progression for progression in progressions if progression[2] > 1})
+    return ([plain] if plain else []) + [f"{first + 1}-{last + 1}:{step}" for first, last, step in stepped]
+
+
+def _expand(progressions: List[Progression]) -> List[Tuple[int, int]]:
+    """Intervals of progressions; stepped ones give one interval per page."""
+    intervals = []
+    for first, last, step in progressions:
+        if step == 1:
+            intervals.append((first, last))
+        else:
+            intervals.extend((page, page) for page in range(first, last + 1, step))
+    return intervals
+
+
+def _count(includes: List[Progression], excludes: List[Progression]) -> Tuple[int, int]:
+    """
+    Count the pages and the runs of consecutive pages of ``includes`` minus ``excludes``.
+
+    The page line is cut at every progression boundary. Within a piece the
+    same progressions apply, so whether a page is selected repeats with the
+    least common multiple of their steps and one period is enough to count
+    the whole piece.
+    """
+    bounds = sorted({page for first, last, _ in includes + excludes for page in (first, last + 1)})
+    includes, excludes = sorted(includes), sorted(excludes)
+    active_includes: List[Progression] = []
+    active_excludes: List[Progression] = []
+    pages = groups = 0
+    previous_selected = False
+    i = j = 0
+
+    for start, stop in zip(bounds, bounds[1:]):
+        while i < len(includes) and includes[i][0] <= start:
+            active_includes.append(includes[i])
+            i += 1
+        while j < len(excludes) and excludes[j][0] <= start:
+            active_excludes.append(excludes[j])
+            j += 1
+        active_includes = [progression for progression in active_includes if progression[1] >= start]
+        active_excludes = [progression for progression in active_excludes if progression[1] >= start]
+        if not active_includes:
+            previous_selected = False
+            continue
+
+        length = stop - start
+        period = 1
+        for _, _, step in active_includes + active_excludes:
+            period = math.lcm(period, step)
+            if period > MAX_COUNT_PERIOD:
+                break
+        if period > MAX_COUNT_PERIOD:
+            # Too irregular to count exactly: every included page, each its own part
+            selected = min(length, sum(_members(progression, start, stop) for progression in active_includes))
+            pages += selected
+            groups += selected
+            previous_selected = _selected(stop - 1, active_includes, active_excludes)
+            continue
+
+        size = min(period, length)
+        pattern = [_selected(start + offset, active_includes, active_excludes) for offset in range(size)]
+        repeats, remainder = divmod(length, size)
+        pages += repeats * sum(pattern) + sum(pattern[:remainder])
+
+        # A part starts at each selected page that follows an unselected one
+        rises = [pattern[k] and not pattern[k - 1] for k in range(size)]
+        groups += repeats * sum(rises) + sum(rises[:remainder]) - rises[0]
+        groups += pattern[0] and not previous_selected
+        previous_selected = pattern[(length - 1) % size]
+
+    return pages, groups
+
+
+def _selected(page: int, includes: List[Progression], excludes: List[Progression]) -> bool:
+    """Membership of a page inside a piece where all given progressions apply."""
+    return (
+        any((page - first) % step == 0 for first, _, step in includes)
+        and not any((page - first) % step == 0 for first, _, step in excludes)
+    )
+
+
+def _members(progression: Progression, start: int, stop: int) -> int:
+    """Number of members of ``progression`` in ``[start, stop)``."""
+    first, _, step = progression
+    return (stop - 1 - first) // step - (start - first + step - 1) // step + 1
+
+
+def _run_range(run: Run, total_pages: int) -> range:
+    """0-indexed pages of a run in order; descending if its start is after its end."""
+    first = _index(run.start, total_pages)
+    last = total_pages - 1 if run.end is None else _index(run.end, total_pages)
+    if first > last:
+        if run.end is None:
+            # Open range starting past the end of this document
+            return range(0)
+        return range(first, last - 1, -run.step)
+    return range(first, last + 1, run.step)
+
+
+def _letter(document: int) -> str:
+    return chr(ord("A") + document)
+
+
+def _merge(intervals: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Sort and merge overlapping or adjacent intervals."""
+    merged: List[Tuple[int, int]] = []
+    for first, last in sorted(intervals):
+        if merged and first <= merged[-1][1] + 1:
+            if last > merged[-1][1]:
+                merged[-1] = (merged[-1][0], last)
+        else:
+            merged.append((first, last))
+    return merged
+
+
+def _subtract(includes: List[Tuple[int, int]], excludes: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Remove merged ``excludes`` from merged ``includes`` in one sweep."""
+    result = []
+    j = 0
+    for first, last in includes:
+        while j < len(excludes) and excludes[j][1] < first:
+            j += 1
+        k = j
+        while first <= last:
+            if k >= len(excludes) or excludes[k][0] > last:
+                result.append((first, last))
+                break
+            ex_first, ex_last = excludes[k]
+            if ex_first > first:
+                result.append((first, ex_first - 1))
+            first = max(first, ex_last + 1)
+            k += 1
+    return result
+
+
+def format_pages(pages: Iterable[int]) -> str:
+    """Format 0-indexed pages as a selection expression, e.g. "1-3,7"."""
+    return _format_intervals(_merge([(page, page) for page in pages]))
+
+
+def _format_intervals(intervals: List[Tuple[int, int]]) -> str:
+    return ",".join(
+        str(first + 1) if first == last else f"{first + 1}-{last + 1}" for first, last in intervals
+    )
+
+
+def cut_runs(runs: List[Tuple[int, int]], starts: Iterable[int]) -> List[Tuple[int, int]]:
+    """Split resolved runs so that each 0-indexed page in ``starts`` begins a new run."""
+    starts = sorted(set(starts))
+    result = []
+    for first, last in runs:
+        for start in starts:
+            if first < start <= last:
+                result.append((first, start - 1))
+                first = start
+        result.append((first, last))
+    return result
@@ -0,0 +1,230 @@
+"""
+Per-document page text index for text-driven selections.
+
+The first query against a document extracts the text of every page through
+an ``extract`` callable (the server runs it as one isolated worker job) and
+stores it as a gzip-compressed JSON file named after the SHA-256 of the
+document. Later queries against the same bytes load
+the index instead of parsing the PDF again. The least recently used indexes
+are deleted once the directory grows past ``TEXT_INDEX_MAX_MB``.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from .limits import MB, JobLimitExceeded, JobLimits, get_job_limits
+from .selection import format_pages
+
+TEXT_INDEX_DIR = os.environ.get(
+    "TEXT_INDEX_DIR", os.path.join(tempfile.gettempdir(), "pdf-splitter-text-index")
+)
+TEXT_INDEX_MAX_MB = int(os.environ.get("TEXT_INDEX_MAX_MB", 512))
+
+MAX_PATTERN_LENGTH = 200
+INDEX_VERSION = 1
+
+WHITESPACE = re.compile(r"\s+")
+
+
+@dataclass
+class TextIndex:
+    """Extracted text of every page of one document."""
+    document_hash: str
+    pages: List[str]
+
+    def pages_containing(self, text: str) -> List[int]:
+        """0-based pages containing ``text``, ignoring case and line breaks."""
+        needle = _normalize(text)
+        if not needle:
+            raise ValueError("Search text cannot be empty")
+        return [number for number, page in enumerate(self.pages) if needle in _normalize(page)]
+
+    def pages_starting_with(self, pattern: str) -> List[int]:
+        """0-based pages whose first non-empty line matches the regex ``pattern``."""
+        regex = compile_pattern(pattern)
+        matches = []
+        for number, page in enumerate(self.pages):
+            first_line = next((line.strip() for line in page.splitlines() if line.strip()), "")
+            if regex.search(first_line):
+                matches.append(number)
+        return matches
+
+
+def compile_pattern(pattern: str) -> "re.Pattern":
+    """Compile a user-supplied first-line pattern, raising ValueError if invalid."""
+    if not pattern:
+        raise ValueError("Pattern cannot be empty")
+    if len(pattern) > MAX_PATTERN_LENGTH:
+        raise ValueError(f"Pattern is longer than {MAX_PATTERN_LENGTH} characters")
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise ValueError(f"Invalid pattern: {str(e)}")
+
+
+def document_hash(pdf_file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(pdf_file_path, "rb") as source:
+        while chunk := source.read(1024 * 1024):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_text_index(
+    pdf_file_path: str,
+    index_dir: str = TEXT_INDEX_DIR,
+    limits: Optional[JobLimits] = None,
+    extract: Optional[Callable] = None,
+    digest: Optional[str] = None,
+) -> Tuple[TextIndex, bool]:
+    """
+    Return the text index of a document and whether it came from the cache.
+
+    ``digest`` is the SHA-256 hex digest of the document, if the caller
+    already has it. A missing or unreadable index is rebuilt and saved.
+    """
+    digest = digest or document_hash(pdf_file_path)
+    index_path = os.path.join(index_dir, f"{digest}.json.gz")
+
+    try:
+        with gzip.open(index_path, "rt", encoding="utf-8") as cached:
+            data = json.load(cached)
+        if data.get("version") == INDEX_VERSION:
+            _touch(index_path)
+            return TextIndex(digest, data["pages"]), True
+    except (OSError, ValueError, KeyError):
+        pass
+
+    index = TextIndex(digest, build_page_texts(pdf_file_path, limits, extract))
+    _save(index, index_dir, index_path)
+    return index, False
+
+
+def build_page_texts(
+    pdf_file_path: str,
+    limits: Optional[JobLimits] = None,
+    extract: Optional[Callable] = None,
+) -> List[str]:
+    """
+    Extract the text of every page.
+
+    ``extract(pdf_file_path, limits)`` does the work. By default it runs
+    ``extract_pages`` in this process, where ``limits`` are not enforced;
+    the server passes one that runs it as a single isolated worker job, so
+    an index costs no more than the one job its scheduler slot allows.
+    """
+    extract = extract or _extract_in_process
+    return extract(pdf_file_path, limits or get_job_limits())
+
+
+def extract_pages(pdf_file_path: str) -> List[str]:
+    """Text of every page of a document, in page order."""
+    from pypdf import PdfReader
+
+    try:
+        reader = PdfReader(pdf_file_path)
+        pages = list(reader.pages)
+    except (JobLimitExceeded, MemoryError):
+        raise
+    except Exception as e:
+        raise ValueError(f"Error processing PDF: {str(e)}")
+
+    texts = []
+    for page in pages:
+        try:
+            texts.append(page.extract_text() or "")
+        except (JobLimitExceeded, MemoryError):
+            raise
+        except Exception:
+            # Unreadable text (broken fonts, odd encodings) just never matches
+            texts.append("")
+    return texts
+
+
+def _extract_in_process(pdf_file_path: str, limits: JobLimits) -> List[str]:
+    return extract_pages(pdf_file_path)
+
+
+def _save(index: TextIndex, index_dir: str, index_path: str) -> None:
+    """Write the index atomically; a failed write only costs a rebuild later."""
+    try:
+        os.makedirs(index_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=index_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", mtime=0) as output:
+            output.write(json.dumps(
+                {"version": INDEX_VERSION, "pages": index.pages}, separators=(",", ":")
+            ).encode("utf-8"))
+        os.replace(temp_path, index_path)
+    except OSError as e:
+        print(f"[WARN] Could not save text index: {str(e)}")
+        return
+    _evict(index_dir, TEXT_INDEX_MAX_MB * MB)
+
+
+def _touch(index_path: str) -> None:
+    """Mark an index as recently used."""
+    try:
+        os.utime(index_path)
+    except OSError:
+        pass
+
+
+def _evict(index_dir: str, max_bytes: int) -> None:
+    """Delete the least recently used indexes until the directory fits ``max_bytes``."""
+    try:
+        with os.scandir(index_dir) as entries:
+            indexes = [
+                (stat.st_mtime, stat.st_size, entry.path)
+                for entry in entries
+                if entry.name.endswith(".json.gz")
+                for stat in (entry.stat(),)
+            ]
+    except OSError:
+        return
+
+    total = sum(size for _, size, _ in indexes)
+    for _, size, path in sorted(indexes):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def _normalize(text: str) -> str:
+    return WHITESPACE.sub(" ", text).strip().casefold()
+
+
+def select_pages(
+    index: TextIndex,
+    selection,
+    contains: Optional[str] = None,
+    first_line: Optional[str] = None,
+) -> Tuple[str, List[int]]:
+    """
+    Apply text queries to a compiled selection.
+
+    Returns the selection expression of the pages that remain (those that
+    also contain ``contains``, if given) and the 1-indexed pages that start a
+    new part (those whose first line matches ``first_line``, if given).
+    """
+    pages = [
+        page
+        for first, last in selection.resolve(len(index.pages))
+        for page in range(first, last + 1)
+    ]
+    if contains:
+        matching = set(index.pages_containing(contains))
+        pages = [page for page in pages if page in matching]
+        if not pages:
+            raise ValueError(f"No selected page contains \"{contains}\"")
+
+    split_at = [page + 1 for page in index.pages_starting_with(first_line)] if first_line else []
+    return format_pages(pages), split_at
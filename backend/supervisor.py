@@ -0,0 +1,63 @@
+"""
+Memory supervision of the web worker process.
+
+Under gunicorn (see ``gunicorn.conf.py``) each web worker is recycled after a
+jittered number of requests. ``MemoryWatch`` adds an RSS bound: once the
+worker's RSS goes over ``WEB_WORKER_MAX_RSS_MB`` after a request, it asks
+itself to shut down gracefully (SIGTERM), which stops it accepting new
+connections, drains in-flight requests and jobs, and lets gunicorn start a
+replacement. Without a supervisor nothing would restart the process, so it
+then only reports its memory.
+"""
+import os
+import signal
+from typing import Any, Dict, Optional
+
+from splitter.limits import MB
+from worker import read_rss
+
+WEB_WORKER_MAX_RSS_MB = int(os.environ.get("WEB_WORKER_MAX_RSS_MB", 1024))
+
+# Set by gunicorn.conf.py for the workers it supervises
+SUPERVISED = os.environ.get("SERVER_SUPERVISED", "false").lower() == "true"
+
+
+class MemoryWatch:
+    """Track the web worker's RSS and recycle it above a threshold."""
+
+    def __init__(self, max_rss_bytes: int = WEB_WORKER_MAX_RSS_MB * MB, supervised: bool = SUPERVISED):
+        self.max_rss_bytes = max_rss_bytes
+        self.supervised = supervised
+        self.high_water = 0
+        self.recycling = False
+
+    def check(self) -> bool:
+        """Sample RSS; return True if a graceful recycle was requested."""
+        rss = read_rss(os.getpid()) or 0
+        self.high_water = max(self.high_water, rss)
+        if self.recycling or not self.supervised or not self.max_rss_bytes or rss <= self.max_rss_bytes:
+            return False
+
+        self.recycling = True
+        print(f"[INFO] Recycling web worker {os.getpid()}: rss={rss // MB}MB > {self.max_rss_bytes // MB}MB")
+        os.kill(os.getpid(), signal.SIGTERM)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pid": os.getpid(),
+            "supervised": self.supervised,
+            "recycling": self.recycling,
+            "rss_bytes": read_rss(os.getpid()),
+            "rss_high_water_bytes": max(self.high_water, _max_rss() or 0),
+            "max_rss_bytes": self.max_rss_bytes,
+        }
+
+
+def _max_rss() -> Optional[int]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
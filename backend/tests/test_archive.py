@@ -0,0 +1,149 @@
+import os
+import zipfile
+import zlib
+import pytest
+from io import BytesIO
+from fastapi.testclient import TestClient
+from splitter.archive import ZIP64_EXTRA_ID, ZIP_DEFLATED, ZIP_STORED, _end_records, compress_entry, iter_zip, write_zip
+from zipbench import format_table, run_benchmark
+import main
+from tests.test_main import create_test_pdf
+
+client = TestClient(main.app)
+
+FIXED_TIME = (2024, 5, 17, 12, 30, 10)
+
+
+@pytest.fixture
+def parts(tmp_path):
+    """Three files: compressible, incompressible and empty."""
+    paths = []
+    for name, data in [
+        ("text.pdf", b"BT /F1 12 Tf (Hello) Tj ET\n" * 2000),
+        ("image.pdf", os.urandom(50_000)),
+        ("empty.pdf", b""),
+    ]:
+        path = tmp_path / name
+        path.write_bytes(data)
+        paths.append(str(path))
+    return paths
+
+
+class TestCompressEntry:
+    """Test per-entry compression."""
+
+    def test_compressible_is_deflated(self, parts):
+        """Test text compresses and carries the CRC of the raw bytes."""
+        entry = compress_entry(parts[0], "text.pdf")
+        assert entry.method == ZIP_DEFLATED
+        assert entry.compressed_size < entry.size
+        with open(parts[0], "rb") as source:
+            assert entry.crc == zlib.crc32(source.read())
+
+    def test_incompressible_is_stored(self, parts):
+        """Test random data is stored rather than deflated."""
+        entry = compress_entry(parts[1], "image.pdf")
+        assert entry.method == ZIP_STORED
+        assert entry.compressed_size == entry.size
+        assert entry.spool is None
+
+    def test_large_entry_spooled_to_disk(self, parts, monkeypatch):
+        """Test compressed data past the spool size is kept on disk, not in memory."""
+        monkeypatch.setattr("splitter.archive.SPOOL_MAX_SIZE", 100)
+        entry = compress_entry(parts[0], "text.pdf")
+        try:
+            assert entry.spool._rolled
+            data = b"".join(entry.iter_data())
+        finally:
+            entry.close()
+        assert len(data) == entry.compressed_size
+        with open(parts[0], "rb") as source:
+            assert zlib.decompress(data, -15) == source.read()
+
+
+class TestIterZip:
+    """Test archive assembly."""
+
+    @pytest.mark.parametrize("workers", [1, 4])
+    def test_archive_is_valid(self, parts, tmp_path, workers):
+        """Test zipfile reads back every entry in input order."""
+        zip_path = str(tmp_path / "out.zip")
+        size = write_zip(zip_path, parts, workers=workers)
+        assert size == os.path.getsize(zip_path)
+        with zipfile.ZipFile(zip_path) as zipf:
+            assert zipf.testzip() is None
+            assert zipf.namelist() == ["text.pdf", "image.pdf", "empty.pdf"]
+            for path in parts:
+                with open(path, "rb") as source:
+                    assert zipf.read(os.path.basename(path)) == source.read()
+
+    def test_deterministic(self, parts):
+        """Test the output does not depend on the thread count."""
+        single = b"".join(iter_zip(parts, workers=1, date_time=FIXED_TIME))
+        parallel = b"".join(iter_zip(parts, workers=8, date_time=FIXED_TIME))
+        assert single == parallel
+
+    def test_many_entries_bounded_lookahead(self, tmp_path):
+        """Test more entries than the lookahead window."""
+        paths = []
+        for index in range(25):
+            path = tmp_path / f"part{index}.pdf"
+            path.write_bytes(b"%d" % index * 100)
+            paths.append(str(path))
+        data = b"".join(iter_zip(paths, workers=2))
+        with zipfile.ZipFile(BytesIO(data)) as zipf:
+            assert len(zipf.namelist()) == 25
+            assert zipf.read("part24.pdf") == b"24" * 100
+
+    def test_unicode_name(self, parts):
+        """Test non-ASCII names are flagged as UTF-8."""
+        data = b"".join(iter_zip(parts[:1], arcnames=["rechnung_ü.pdf"]))
+        with zipfile.ZipFile(BytesIO(data)) as zipf:
+            assert zipf.namelist() == ["rechnung_ü.pdf"]
+
+    def test_zip64_entries(self, parts, monkeypatch):
+        """Test sizes and offsets past the 32-bit limit get ZIP64 extra fields."""
+        monkeypatch.setattr("splitter.archive.ZIP64_LIMIT", 1000)
+        data = b"".join(iter_zip(parts))
+        with zipfile.ZipFile(BytesIO(data)) as zipf:
+            assert zipf.testzip() is None
+            infos = zipf.infolist()
+            for path, info in zip(parts, infos):
+                with open(path, "rb") as source:
+                    assert zipf.read(info) == source.read()
+        # The first entry starts at offset 0 but its sizes overflow; the
+        # last one is empty but starts past the limit
+        assert [info.extract_version for info in infos] == [45, 45, 45]
+        assert all(info.extra[:2] == ZIP64_EXTRA_ID.to_bytes(2, "little") for info in infos)
+        assert infos[2].header_offset > 1000
+
+    def test_zip64_end_records(self):
+        """Test ZIP64 end records are written when the entry count overflows."""
+        records = _end_records(70_000, 100, 200)
+        assert records.startswith(b"PK\x06\x06")
+        assert b"PK\x06\x07" in records
+
+
+class TestStreamingEndpoint:
+    """Test the streaming response mode."""
+
+    def test_streamed_zip(self, monkeypatch):
+        """Test /split streams a valid ZIP when STREAM_ZIP is enabled."""
+        monkeypatch.setattr(main, "STREAM_ZIP", True)
+        files = {"file": ("test.pdf", create_test_pdf(5), "application/pdf")}
+        response = client.post("/split", files=files, data={"page_ranges": "1-2,4"})
+        assert response.status_code == 200
+        assert response.headers["content-disposition"] == "attachment; filename=test_split.zip"
+        with zipfile.ZipFile(BytesIO(response.content)) as zipf:
+            assert zipf.namelist() == ["test_pages1-2.pdf", "test_page4.pdf"]
+
+
+class TestZipBench:
+    """Test a tiny benchmark run."""
+
+    def test_report(self):
+        """Test the benchmark reports a row per entry count."""
+        results = run_benchmark([1, 4], [1, 2], size=4096, repeat=1)
+        assert [row["entries"] for row in results] == [1, 4]
+        assert set(results[1]["parallel"]) == {1, 2}
+        assert "entries" in format_table(results, [1, 2])
@@ -0,0 +1,71 @@
+import json
+import os
+import subprocess
+import sys
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_DIR = os.path.dirname(BACKEND_DIR)
+
+# Import-time budget per entry point, measured in a fresh interpreter (about
+# twice the ~360ms the heaviest entry point takes)
+IMPORT_TIME_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 800))
+
+# Load an entry point by path in a fresh interpreter and report what it cost
+PROBE = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location("entry_point", sys.argv[1])
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({"elapsed_ms": elapsed_ms, "pypdf_loaded": "pypdf" in sys.modules}))
+"""
+
+ENTRY_POINTS = [
+    os.path.join(BACKEND_DIR, "main.py"),
+    os.path.join(BACKEND_DIR, "api", "index.py"),
+    os.path.join(REPO_DIR, "api", "health.py"),
+    os.path.join(REPO_DIR, "api", "split.py"),
+]
+
+
+def probe_import(path: str) -> dict:
+    """Import an entry point in a fresh interpreter and return its cost."""
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE, path],
+        cwd=os.path.dirname(path),
+        env={**os.environ, "PYTHONPATH": BACKEND_DIR},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.mark.slow
+class TestColdStart:
+    """Test cold start cost of the serverless and server entry points."""
+
+    @pytest.mark.parametrize("path", ENTRY_POINTS, ids=os.path.basename)
+    def test_pypdf_loaded_lazily(self, path):
+        """Test that importing an entry point does not load pypdf."""
+        assert probe_import(path)["pypdf_loaded"] is False
+
+    @pytest.mark.parametrize("path", ENTRY_POINTS, ids=os.path.basename)
+    def test_import_time_budget(self, path):
+        """Test that importing an entry point stays within the cold start budget."""
+        # Best of three to ignore scheduler noise
+        elapsed_ms = min(probe_import(path)["elapsed_ms"] for _ in range(3))
+        assert elapsed_ms < IMPORT_TIME_BUDGET_MS
+
+    def test_splitter_import_is_light(self):
+        """Test that the splitter package alone imports without pypdf."""
+        result = subprocess.run(
+            [sys.executable, "-c", "import sys, splitter; print('pypdf' in sys.modules)"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        assert result.stdout.strip() == "False"
@@ -0,0 +1,88 @@
+from io import BytesIO
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject, DictionaryObject, NameObject
+from splitter.compact import write_compact
+
+
+def create_writer(num_pages: int = 3) -> PdfWriter:
+    """Create a writer whose pages carry identical, separately stored content streams."""
+    writer = PdfWriter()
+    for _ in range(num_pages):
+        page = writer.add_blank_page(width=612, height=792)
+        content = DecodedStreamObject()
+        content.set_data(b"0 0 m 100 100 l S")
+        page[NameObject("/Contents")] = writer._add_object(content)
+    return writer
+
+
+def write_classic(writer: PdfWriter) -> bytes:
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def write_compact_bytes(writer: PdfWriter):
+    buffer = BytesIO()
+    stats = write_compact(writer, buffer)
+    return buffer.getvalue(), stats
+
+
+class TestWriteCompact:
+    """Test compact serialization."""
+
+    def test_output_is_readable(self):
+        """Test that compact output parses with the same pages and content."""
+        data, _ = write_compact_bytes(create_writer(3))
+        reader = PdfReader(BytesIO(data), strict=True)
+        assert len(reader.pages) == 3
+        for page in reader.pages:
+            assert page.get_contents().get_data() == b"0 0 m 100 100 l S"
+
+    def test_uses_object_and_xref_streams(self):
+        """Test that object streams and an xref stream are written."""
+        data, _ = write_compact_bytes(create_writer(3))
+        assert data.startswith(b"%PDF-1.5")
+        assert b"/ObjStm" in data
+        assert b"/XRef" in data
+        assert b"\nxref\n" not in data
+        assert b"trailer" not in data
+
+    def test_identical_objects_merged(self):
+        """Test that byte-identical content streams are stored once."""
+        data, stats = write_compact_bytes(create_writer(3))
+        assert stats.duplicates_merged == 2
+        reader = PdfReader(BytesIO(data))
+        refs = {page.raw_get("/Contents").idnum for page in reader.pages}
+        assert len(refs) == 1
+
+    def test_identical_pages_kept_distinct(self):
+        """Test that pages are never merged even if their dictionaries match."""
+        writer = PdfWriter()
+        writer.add_blank_page(width=612, height=792)
+        writer.add_blank_page(width=612, height=792)
+        data, _ = write_compact_bytes(writer)
+        reader = PdfReader(BytesIO(data))
+        assert len({page.indirect_reference.idnum for page in reader.pages}) == 2
+
+    def test_orphans_removed(self):
+        """Test that unreachable objects are dropped."""
+        writer = create_writer(1)
+        writer._add_object(DictionaryObject({NameObject("/Orphan"): NameObject("/Yes")}))
+        data, stats = write_compact_bytes(writer)
+        assert stats.orphans_removed == 1
+        assert b"/Orphan" not in data
+
+    def test_stats_report_classic_size(self):
+        """Test that the reported classic size matches PdfWriter.write."""
+        classic = write_classic(create_writer(3))
+        data, stats = write_compact_bytes(create_writer(3))
+        assert stats.classic_bytes == len(classic)
+        assert stats.bytes_written == len(data)
+        assert stats.bytes_saved > 0
+        assert stats.cpu_seconds >= 0
+
+    def test_smaller_than_classic_for_many_pages(self):
+        """Test size reduction on a larger part."""
+        classic = write_classic(create_writer(50))
+        data, _ = write_compact_bytes(create_writer(50))
+        assert len(data) < len(classic) / 2
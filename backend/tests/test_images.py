@@ -0,0 +1,205 @@
+import random
+import zipfile
+import zlib
+import pytest
+from io import BytesIO
+from fastapi.testclient import TestClient
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, FloatObject, NameObject, NumberObject, StreamObject
+import main
+from splitter import split_pdf_to_parts
+from splitter.images import ImageResampler, _effective_dpi, get_profile
+
+client = TestClient(main.app)
+
+
+def image_stream(width, height):
+    """A Flate-compressed RGB image with noisy (barely compressible) pixels."""
+    pixels = random.Random(width * height).randbytes(width * height * 3)
+    image = StreamObject()
+    image.update({
+        NameObject("/Type"): NameObject("/XObject"),
+        NameObject("/Subtype"): NameObject("/Image"),
+        NameObject("/Width"): NumberObject(width),
+        NameObject("/Height"): NumberObject(height),
+        NameObject("/ColorSpace"): NameObject("/DeviceRGB"),
+        NameObject("/BitsPerComponent"): NumberObject(8),
+        NameObject("/Filter"): NameObject("/FlateDecode"),
+    })
+    image._data = zlib.compress(pixels)
+    return image
+
+
+def create_image_pdf(pages, image_size=(600, 800)) -> bytes:
+    """
+    Create a PDF drawing one shared image per page.
+
+    Each entry of ``pages`` is the drawn width of the image in points (the
+    height keeps the image's aspect ratio); None draws it inside a form
+    XObject scaled by 0.5.
+    """
+    writer = PdfWriter()
+    image_ref = writer._add_object(image_stream(*image_size))
+    width, height = image_size
+    for drawn_width in pages:
+        page = writer.add_blank_page(width=612, height=792)
+        content = StreamObject()
+        if drawn_width is None:
+            form = StreamObject()
+            form.update({
+                NameObject("/Type"): NameObject("/XObject"),
+                NameObject("/Subtype"): NameObject("/Form"),
+                NameObject("/BBox"): ArrayObject([NumberObject(0), NumberObject(0), NumberObject(612), NumberObject(792)]),
+                NameObject("/Matrix"): ArrayObject([FloatObject(0.5), NumberObject(0), NumberObject(0), FloatObject(0.5), NumberObject(0), NumberObject(0)]),
+                NameObject("/Resources"): DictionaryObject({
+                    NameObject("/XObject"): DictionaryObject({NameObject("/Im0"): image_ref}),
+                }),
+            })
+            form._data = f"q {width} 0 0 {height} 0 0 cm /Im0 Do Q".encode()
+            content._data = b"q 1 0 0 1 72 72 cm /Fm0 Do Q"
+            xobjects = {NameObject("/Fm0"): writer._add_object(form)}
+        else:
+            drawn_height = drawn_width * height / width
+            content._data = f"q {drawn_width} 0 0 {drawn_height} 36 36 cm /Im0 Do Q".encode()
+            xobjects = {NameObject("/Im0"): image_ref}
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): DictionaryObject(xobjects)})
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def first_image(path):
+    page = PdfReader(path).pages[0]
+    xobjects = page["/Resources"]["/XObject"]
+    xobject = xobjects[list(xobjects)[0]]
+    if xobject["/Subtype"] == "/Form":
+        xobject = xobject["/Resources"]["/XObject"]["/Im0"]
+    return xobject
+
+
+@pytest.fixture
+def split(tmp_path):
+    def run(pages, ranges, profile="screen", **kwargs):
+        path = tmp_path / "scan.pdf"
+        path.write_bytes(create_image_pdf(pages, **kwargs))
+        stats = {}
+        parts = split_pdf_to_parts(str(path), ranges, "scan.pdf", stats=stats, image_profile=profile)
+        return parts, stats
+    return run
+
+
+class TestProfiles:
+    """Test profile lookup and resolution math."""
+
+    def test_unknown_profile(self):
+        """Test unknown profile names are rejected."""
+        with pytest.raises(ValueError, match="Unknown image profile"):
+            get_profile("poster")
+
+    def test_effective_dpi(self):
+        """Test resolution follows the drawn size, including rotation."""
+        image = {"/Width": 600, "/Height": 300}
+        assert _effective_dpi(image, (144, 0, 0, 72, 0, 0)) == pytest.approx(300)
+        assert _effective_dpi(image, (0, 144, -72, 0, 0, 0)) == pytest.approx(300)
+        assert _effective_dpi(image, (0, 0, 0, 0, 0, 0)) is None
+
+
+class TestResampling:
+    """Test images are resampled while parts are written."""
+
+    def test_oversized_image_resampled(self, split):
+        """Test a 300dpi scan is brought down to the profile resolution."""
+        # 600px drawn 2in wide is 300dpi; "screen" is 72dpi
+        parts, stats = split([144], "1")
+        image = first_image(parts[0])
+        assert (image["/Width"], image["/Height"]) == (144, 192)
+        assert image["/Filter"] == "/DCTDecode"
+        assert stats["images_resampled"] == 1
+        assert stats["image_bytes_saved"] > 0
+
+    def test_below_threshold_untouched(self, split):
+        """Test images close to the profile resolution are left alone."""
+        # 600px drawn 6in wide is 100dpi, under 1.5 x 72dpi
+        parts, stats = split([432], "1")
+        image = first_image(parts[0])
+        assert image["/Width"] == 600
+        assert image["/Filter"] == "/FlateDecode"
+        assert stats["images_resampled"] == 0
+
+    def test_largest_use_wins(self, split):
+        """Test an image drawn twice in a part is sized for its larger use."""
+        parts, stats = split([144, 288], "1-2")
+        image = first_image(parts[0])
+        assert image["/Width"] == 288
+
+    def test_form_matrix(self, split):
+        """Test images drawn through a scaled form use the combined matrix."""
+        # Drawn 600pt wide in the form, halved by its matrix: 144dpi
+        parts, _ = split([None], "1")
+        assert first_image(parts[0])["/Width"] == 300
+
+    def test_shared_image_processed_once(self, split):
+        """Test an image shared across parts is resampled once per job."""
+        parts, stats = split([144, 144, 144], "1,3", profile="ebook")
+        assert len(parts) == 2
+        assert stats["images_resampled"] == 1
+        assert stats["images_reused"] == 1
+        assert [first_image(part)["/Width"] for part in parts] == [300, 300]
+        _, single_stats = split([144], "1", profile="ebook")
+        assert stats["image_bytes_saved"] == single_stats["image_bytes_saved"]
+
+    def test_failed_image_counted(self, split, monkeypatch):
+        """Test images that cannot be re-encoded are counted and left unchanged."""
+        def broken(image, size, quality):
+            raise OSError("broken image data")
+
+        monkeypatch.setattr("splitter.images._resample", broken)
+        parts, stats = split([144, 144, 144], "1,3")
+        assert len(parts) == 2
+        assert (stats["images_resampled"], stats["images_failed"]) == (0, 1)
+        assert [first_image(part)["/Width"] for part in parts] == [600, 600]
+
+    def test_without_profile(self, tmp_path):
+        """Test images are copied unchanged without a profile."""
+        path = tmp_path / "scan.pdf"
+        path.write_bytes(create_image_pdf([144]))
+        parts = split_pdf_to_parts(str(path), "1", "scan.pdf")
+        assert first_image(parts[0])["/Width"] == 600
+
+    def test_unsupported_image_untouched(self, tmp_path):
+        """Test images with a decode array are not re-encoded."""
+        writer = PdfWriter()
+        writer.append(BytesIO(create_image_pdf([144])))
+        original = writer.pages[0]["/Resources"]["/XObject"]["/Im0"].get_object()
+        original[NameObject("/Decode")] = ArrayObject([NumberObject(1), NumberObject(0)] * 3)
+        with ImageResampler(get_profile("screen"), workers=1) as resampler:
+            resampler.resample_part(writer)
+        assert writer.pages[0]["/Resources"]["/XObject"]["/Im0"].get_object() is original
+        assert resampler.stats["images_resampled"] == 0
+        assert resampler.stats["images_skipped"] == 1
+
+
+class TestImageProfileEndpoint:
+    """Test image profiles through /split."""
+
+    def post(self, **data):
+        files = {"file": ("scan.pdf", create_image_pdf([144, 144]), "application/pdf")}
+        return client.post("/split", files=files, data={"page_ranges": "1-2", **data})
+
+    def test_profile(self):
+        """Test parts come back with resampled images."""
+        response = self.post(image_profile="screen")
+        assert response.status_code == 200
+        assert response.headers["x-split-images-resampled"] == "1"
+        assert response.headers["x-split-images-skipped"] == "0"
+        assert response.headers["x-split-images-failed"] == "0"
+        with zipfile.ZipFile(BytesIO(response.content)) as zipf:
+            part = PdfReader(BytesIO(zipf.read("scan_pages1-2.pdf")))
+            assert part.pages[1]["/Resources"]["/XObject"]["/Im0"]["/Width"] == 144
+
+    def test_unknown_profile(self):
+        """Test an unknown profile returns 400."""
+        response = self.post(image_profile="poster")
+        assert response.status_code == 400
+        assert "Unknown image profile" in response.json()["detail"]
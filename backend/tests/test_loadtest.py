@@ -0,0 +1,81 @@
+import asyncio
+import os
+import subprocess
+import sys
+import pytest
+import httpx
+from loadtest import LoadTest, format_table, parse_weighted, percentile, read_tree_rss
+from main import app
+from worker import read_rss
+
+CHILD_ALLOCATION = 64 * 1024 * 1024
+
+
+def run_stage(concurrency: int, max_requests: int, **kwargs):
+    async def scenario():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+            load_test = LoadTest(client, sizes="3", **kwargs)
+            return await load_test.run_stage(concurrency, duration=30, max_requests=max_requests)
+
+    return asyncio.run(scenario())
+
+
+class TestHelpers:
+    """Test report helpers."""
+
+    def test_percentile(self):
+        """Test nearest-rank percentiles."""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 99) == 99
+        assert percentile([], 99) == 0.0
+
+    def test_parse_weighted(self):
+        """Test size mix parsing with default weights."""
+        assert parse_weighted("5:6, 100") == [(5, 6), (100, 1)]
+
+    def test_parse_weighted_empty(self):
+        """Test empty size mix is rejected."""
+        with pytest.raises(ValueError, match="Empty size mix"):
+            parse_weighted(" , ")
+
+
+class TestLoadTest:
+    """Test a short in-process load run."""
+
+    def test_stage_report(self):
+        """Test a stage reports throughput, latency, lag and RSS."""
+        result = run_stage(concurrency=2, max_requests=4, patterns="1;1-{n}")
+        summary = result.summary()
+        assert summary["requests"] == 4
+        assert summary["statuses"] == {"200": 4}
+        assert summary["error_rate"] == 0.0
+        assert summary["throughput_rps"] > 0
+        assert summary["latency_ms"]["p99"] >= summary["latency_ms"]["p50"] > 0
+        assert summary["peak_rss_mb"]
+        assert "conc" in format_table([summary])
+
+    def test_peak_includes_children(self):
+        """Test the RSS of child processes is counted in the peak."""
+        child = subprocess.Popen(
+            [sys.executable, "-c", f"import sys; data = b'x' * {CHILD_ALLOCATION}; print(); sys.stdin.read()"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+        )
+        try:
+            child.stdout.readline()
+            own = read_rss(os.getpid())
+            assert read_tree_rss(os.getpid()) >= own + CHILD_ALLOCATION
+            result = run_stage(concurrency=1, max_requests=1, patterns="1")
+            peak_mb = result.summary()["peak_rss_mb"][os.getpid()]
+            assert peak_mb * 1024 * 1024 >= own + CHILD_ALLOCATION
+        finally:
+            child.stdin.close()
+            child.wait()
+
+    def test_errors_counted(self):
+        """Test failing requests show up in the error rate."""
+        result = run_stage(concurrency=1, max_requests=2, patterns="{n}0")
+        summary = result.summary()
+        assert summary["statuses"] == {"400": 2}
+        assert summary["error_rate"] == 1.0
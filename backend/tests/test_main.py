@@ -168,4 +168,31 @@ class TestSplitEndpoint:
         
         response = client.post("/split", files=files, data=data)
         assert response.status_code == 200
-        assert response.headers["content-type"] == "application/zip"
\ No newline at end of file
+        assert response.headers["content-type"] == "application/zip"
+    
+    def test_optimized_split_reports_sizes(self):
+        """Test that an optimized split reports size and CPU cost."""
+        pdf_content = create_test_pdf(20)
+        
+        files = {"file": ("test.pdf", pdf_content, "application/pdf")}
+        data = {"page_ranges": "1-20", "optimize": "true"}
+        
+        response = client.post("/split", files=files, data=data)
+        assert response.status_code == 200
+        before = int(response.headers["X-Split-Bytes-Before"])
+        after = int(response.headers["X-Split-Bytes-After"])
+        assert after < before
+        assert float(response.headers["X-Split-Optimize-Ms"]) >= 0
+    
+    def test_selection_expression(self):
+        """Test a relative selection expression."""
+        import zipfile
+        pdf_content = create_test_pdf(6)
+        
+        files = {"file": ("test.pdf", pdf_content, "application/pdf")}
+        data = {"page_ranges": "odd,!-2-"}
+        
+        response = client.post("/split", files=files, data=data)
+        assert response.status_code == 200
+        with zipfile.ZipFile(BytesIO(response.content)) as zipf:
+            assert sorted(zipf.namelist()) == ["test_page1.pdf", "test_page3.pdf"]
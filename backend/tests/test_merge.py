@@ -0,0 +1,127 @@
+import os
+import zipfile
+import pytest
+from io import BytesIO
+from fastapi.testclient import TestClient
+from pypdf import PdfReader
+import main
+from splitter import merge_pdfs, split_pdf_to_parts
+from tests.test_images import create_image_pdf
+from tests.test_textindex import create_text_pdf
+
+client = TestClient(main.app)
+
+
+def page_texts(source):
+    return [page.extract_text().strip() for page in PdfReader(source).pages]
+
+
+@pytest.fixture
+def documents(tmp_path):
+    paths = []
+    for name, prefix, count in (("a.pdf", "Alpha", 4), ("b.pdf", "Beta", 2)):
+        path = tmp_path / name
+        path.write_bytes(create_text_pdf([[f"{prefix} {number}"] for number in range(1, count + 1)]))
+        paths.append(str(path))
+    return paths
+
+
+class TestMergePdfs:
+    """Test merging ordered selections into one PDF."""
+
+    def test_order_and_documents(self, documents):
+        """Test pages come out in the requested order across documents."""
+        output = merge_pdfs(documents, "A3,B,A1,A3", "a.pdf")
+        assert os.path.basename(output) == "a_merged.pdf"
+        assert page_texts(output) == ["Alpha 3", "Beta 1", "Beta 2", "Alpha 1", "Alpha 3"]
+
+    def test_repeated_page_written_once(self, tmp_path):
+        """Test a repeated page shares its content and images with the first copy."""
+        path = tmp_path / "scan.pdf"
+        path.write_bytes(create_image_pdf([144]))
+        single_stats, repeated_stats = {}, {}
+        single = merge_pdfs([str(path)], "1", "scan.pdf", stats=single_stats)
+        repeated = merge_pdfs([str(path)], "1,1,1,1", "scan.pdf", stats=repeated_stats)
+        assert len(PdfReader(repeated).pages) == 4
+        assert repeated_stats["repeated_pages"] == 3
+        # Only three small page dictionaries more, not three more images
+        assert os.path.getsize(repeated) - os.path.getsize(single) < 2048
+
+    def test_unknown_document(self, documents):
+        """Test letters beyond the given files are rejected."""
+        with pytest.raises(ValueError, match="Unknown document C"):
+            merge_pdfs(documents, "A1,C1", "a.pdf")
+
+
+class TestOrderedSplit:
+    """Test ordered selections when splitting."""
+
+    def test_one_part_per_term(self, documents):
+        """Test parts follow the terms, numbered so their order is kept."""
+        parts = split_pdf_to_parts(documents[0], "4,1-2,4", "a.pdf", ordered=True)
+        assert [os.path.basename(part) for part in parts] == [
+            "a_01_page4.pdf", "a_02_pages1-2.pdf", "a_03_page4.pdf",
+        ]
+        assert page_texts(parts[1]) == ["Alpha 1", "Alpha 2"]
+
+    def test_reversed_part(self, documents):
+        """Test a descending range gives a part in reverse order."""
+        parts = split_pdf_to_parts(documents[0], "-1-1", "a.pdf", ordered=True)
+        assert page_texts(parts[0]) == ["Alpha 4", "Alpha 3", "Alpha 2", "Alpha 1"]
+
+
+class TestMergeEndpoint:
+    """Test /merge and ordered /split."""
+
+    def files(self, *names):
+        return [
+            ("files", (name, create_text_pdf([[f"{name} {number}"] for number in (1, 2)]), "application/pdf"))
+            for name in names
+        ]
+
+    def test_merge(self):
+        """Test several uploads merged in the requested order."""
+        response = client.post("/merge", files=self.files("one.pdf", "two.pdf"), data={"page_ranges": "B2,A,B2"})
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/pdf"
+        assert "one_merged.pdf" in response.headers["content-disposition"]
+        assert page_texts(BytesIO(response.content)) == ["two.pdf 2", "one.pdf 1", "one.pdf 2", "two.pdf 2"]
+
+    def test_merge_defaults_to_all_pages(self):
+        """Test every page of every upload is merged without page_ranges."""
+        response = client.post("/merge", files=self.files("one.pdf", "two.pdf"))
+        assert response.status_code == 200
+        assert len(PdfReader(BytesIO(response.content)).pages) == 4
+
+    def test_merge_unknown_document(self):
+        """Test a letter without an upload returns 400."""
+        response = client.post("/merge", files=self.files("one.pdf"), data={"page_ranges": "A1,B1"})
+        assert response.status_code == 400
+        assert "Unknown document B" in response.json()["detail"]
+
+    def test_merge_too_many_files(self, monkeypatch):
+        """Test the number of merged files is limited."""
+        monkeypatch.setattr(main, "MAX_MERGE_FILES", 1)
+        response = client.post("/merge", files=self.files("one.pdf", "two.pdf"))
+        assert response.status_code == 400
+
+    def test_merge_too_large(self, monkeypatch):
+        """Test the total size of merged files is limited."""
+        monkeypatch.setattr(main, "MAX_MERGE_SIZE", 1024)
+        response = client.post("/merge", files=self.files("one.pdf", "two.pdf"))
+        assert response.status_code == 413
+        assert "in total" in response.json()["message"]
+
+    def test_ordered_split(self):
+        """Test /split keeps the order of an ordered selection."""
+        files = {"file": ("doc.pdf", create_text_pdf([["x"], ["y"]]), "application/pdf")}
+        response = client.post("/split", files=files, data={"page_ranges": "2,1,2", "ordered": "true"})
+        assert response.status_code == 200
+        with zipfile.ZipFile(BytesIO(response.content)) as zipf:
+            assert zipf.namelist() == ["doc_01_page2.pdf", "doc_02_page1.pdf", "doc_03_page2.pdf"]
+
+    def test_ordered_split_with_text_query(self):
+        """Test ordered selections cannot be combined with text queries."""
+        files = {"file": ("doc.pdf", create_text_pdf([["x"]]), "application/pdf")}
+        response = client.post("/split", files=files, data={"page_ranges": "1", "ordered": "true", "text_contains": "x"})
+        assert response.status_code == 400
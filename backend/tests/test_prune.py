@@ -0,0 +1,181 @@
+import os
+import zipfile
+from io import BytesIO
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject,
+    DecodedStreamObject,
+    DictionaryObject,
+    NameObject,
+    NumberObject,
+)
+from splitter import split_pdf_to_zip
+from splitter.prune import ResourcePruner, scan_names
+
+IMAGE_SIZE = 50000
+
+
+def add_stream(writer: PdfWriter, data: bytes, **entries) -> object:
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    for key, value in entries.items():
+        stream[NameObject(f"/{key}")] = value
+    return writer._add_object(stream)
+
+
+def add_image(writer: PdfWriter) -> object:
+    return add_stream(
+        writer,
+        os.urandom(IMAGE_SIZE),
+        Type=NameObject("/XObject"),
+        Subtype=NameObject("/Image"),
+        Width=NumberObject(100),
+        Height=NumberObject(IMAGE_SIZE // 100),
+        ColorSpace=NameObject("/DeviceGray"),
+        BitsPerComponent=NumberObject(8),
+    )
+
+
+def create_shared_resources_pdf(num_pages: int = 4) -> bytes:
+    """
+    Create a PDF whose pages share one /Resources dictionary.
+
+    Page i draws image /Im{i}; page 1 also draws form /Fm0, which has its
+    own resources (the same shared dictionary) and draws /Im0.
+    """
+    writer = PdfWriter()
+    xobjects = DictionaryObject()
+    resources = writer._add_object(DictionaryObject({NameObject("/XObject"): xobjects}))
+    for i in range(num_pages):
+        xobjects[NameObject(f"/Im{i}")] = add_image(writer)
+    xobjects[NameObject("/Fm0")] = add_stream(
+        writer,
+        b"q 10 0 0 10 0 0 cm /Im0 Do Q",
+        Type=NameObject("/XObject"),
+        Subtype=NameObject("/Form"),
+        BBox=ArrayObject([NumberObject(0), NumberObject(0), NumberObject(100), NumberObject(100)]),
+        Resources=resources,
+    )
+
+    for i in range(num_pages):
+        page = writer.add_blank_page(width=612, height=792)
+        content = f"q 100 0 0 500 0 0 cm /Im{i} Do Q"
+        if i == 1:
+            content += " /Fm0 Do"
+        page[NameObject("/Contents")] = add_stream(writer, content.encode())
+        page[NameObject("/Resources")] = resources
+
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def write_page(reader: PdfReader, index: int, prune: bool) -> bytes:
+    writer = PdfWriter()
+    page = reader.pages[index]
+    if prune:
+        page = ResourcePruner(writer).prune_page(page)
+    writer.add_page(page)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+class TestScanNames:
+    """Test name token scanning."""
+
+    def test_operator_operands(self):
+        """Test names used by resource operators are found."""
+        names = scan_names(b"BT /F1 12 Tf (Hi) Tj ET /GS0 gs /Im0 Do")
+        assert {"/F1", "/GS0", "/Im0"} <= names
+
+    def test_escaped_names(self):
+        """Test #xx escapes in names are decoded."""
+        assert "/F1" in scan_names(b"/F#31 12 Tf")
+
+    def test_delimiters(self):
+        """Test names directly followed by delimiters."""
+        assert {"/Span", "/MC0"} <= scan_names(b"/Span<</MCID 0>>BDC /MC0[1]TJ")
+
+
+class TestResourcePruner:
+    """Test per-page resource pruning."""
+
+    def test_single_page_keeps_only_used_image(self):
+        """Test a page only carries the image it draws."""
+        reader = PdfReader(BytesIO(create_shared_resources_pdf()))
+        data = write_page(reader, 3, prune=True)
+        xobjects = PdfReader(BytesIO(data)).pages[0]["/Resources"]["/XObject"]
+        assert sorted(xobjects.keys()) == ["/Im3"]
+
+    def test_pruned_page_is_smaller(self):
+        """Test byte size before and after pruning."""
+        reader = PdfReader(BytesIO(create_shared_resources_pdf(4)))
+        unpruned = write_page(reader, 0, prune=False)
+        pruned = write_page(reader, 0, prune=True)
+        assert len(unpruned) > 4 * IMAGE_SIZE
+        assert len(pruned) < 1.5 * IMAGE_SIZE
+
+    def test_form_resources_pruned_recursively(self):
+        """Test a form XObject with its own resources is pruned too."""
+        reader = PdfReader(BytesIO(create_shared_resources_pdf()))
+        data = write_page(reader, 1, prune=True)
+        xobjects = PdfReader(BytesIO(data), strict=True).pages[0]["/Resources"]["/XObject"]
+        assert sorted(xobjects.keys()) == ["/Fm0", "/Im1"]
+        assert sorted(xobjects["/Fm0"]["/Resources"]["/XObject"].keys()) == ["/Im0"]
+        assert len(data) < 2.5 * IMAGE_SIZE
+
+    def test_inheriting_form_names_kept_on_page(self):
+        """Test names used by a form without resources stay on the page."""
+        writer = PdfWriter()
+        xobjects = DictionaryObject()
+        xobjects[NameObject("/Im0")] = add_image(writer)
+        xobjects[NameObject("/Im1")] = add_image(writer)
+        xobjects[NameObject("/Fm0")] = add_stream(
+            writer,
+            b"/Im1 Do",
+            Type=NameObject("/XObject"),
+            Subtype=NameObject("/Form"),
+            BBox=ArrayObject([NumberObject(0), NumberObject(0), NumberObject(10), NumberObject(10)]),
+        )
+        page = writer.add_blank_page(width=612, height=792)
+        page[NameObject("/Contents")] = add_stream(writer, b"/Fm0 Do")
+        page[NameObject("/Resources")] = DictionaryObject({NameObject("/XObject"): xobjects})
+        buffer = BytesIO()
+        writer.write(buffer)
+
+        reader = PdfReader(buffer)
+        data = write_page(reader, 0, prune=True)
+        xobjects = PdfReader(BytesIO(data)).pages[0]["/Resources"]["/XObject"]
+        assert sorted(xobjects.keys()) == ["/Fm0", "/Im1"]
+
+    def test_page_without_resources(self):
+        """Test a page without resources is returned unchanged."""
+        writer = PdfWriter()
+        page = writer.add_blank_page(width=612, height=792)
+        del page["/Resources"]
+        buffer = BytesIO()
+        writer.write(buffer)
+        page = PdfReader(buffer).pages[0]
+        assert ResourcePruner(PdfWriter()).prune_page(page) is page
+
+
+class TestSplitWithPruning:
+    """Test pruning through split_pdf_to_zip."""
+
+    def test_split_sizes_with_and_without_pruning(self, tmp_path):
+        """Test single-page parts shrink when pruning is enabled."""
+        pdf_path = tmp_path / "shared.pdf"
+        pdf_path.write_bytes(create_shared_resources_pdf(4))
+
+        sizes = {}
+        for prune in (False, True):
+            stats = {}
+            zip_path = split_pdf_to_zip(
+                str(pdf_path), "1,3", "shared.pdf", stats=stats, prune_resources=prune
+            )
+            with zipfile.ZipFile(zip_path) as zipf:
+                assert len(zipf.namelist()) == 2
+            sizes[prune] = stats["bytes_after"]
+
+        assert sizes[True] < sizes[False] / 3
@@ -0,0 +1,196 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from scheduler import (
+    COST_BYTES_PER_PAGE,
+    Lane,
+    SplitScheduler,
+    estimate_job_cost,
+    estimate_selection_size,
+    get_client_id,
+)
+
+
+class TestEstimateJobCost:
+    """Test job cost estimation."""
+
+    def test_small_job_is_cheap(self):
+        """Test a 2-page extraction from a 1MB file."""
+        cost = estimate_job_cost(1024 * 1024, 2, 1)
+        assert cost < SplitScheduler().fast_lane_max_cost
+
+    def test_large_job_is_expensive(self):
+        """Test a multi-thousand-page extraction from a 130MB file."""
+        cost = estimate_job_cost(130 * 1024 * 1024, 3000, 40)
+        assert cost > SplitScheduler().fast_lane_max_cost
+
+    def test_cost_grows_with_groups(self):
+        """Test that more output parts cost more."""
+        assert estimate_job_cost(1024, 10, 10) > estimate_job_cost(1024, 10, 1)
+
+
+class TestLane:
+    """Test lane concurrency limits and fairness."""
+
+    def test_concurrency_limit(self):
+        """Test that a lane never runs more jobs than its limit."""
+        async def scenario():
+            lane = Lane("test", 2)
+            peak = 0
+
+            async def job():
+                nonlocal peak
+                await lane.acquire("client")
+                peak = max(peak, lane.running)
+                await asyncio.sleep(0.01)
+                lane.release()
+
+            await asyncio.gather(*(job() for _ in range(6)))
+            return lane, peak
+
+        lane, peak = asyncio.run(scenario())
+        assert peak == 2
+        assert lane.running == 0
+        assert lane.completed == 6
+
+    def test_round_robin_between_clients(self):
+        """Test that a client with many queued jobs does not starve others."""
+        async def scenario():
+            lane = Lane("test", 1)
+            order = []
+            await lane.acquire("blocker")
+
+            async def job(client_id, label):
+                await lane.acquire(client_id)
+                order.append(label)
+                lane.release()
+
+            tasks = [asyncio.create_task(job("busy", f"busy{i}")) for i in range(3)]
+            tasks.append(asyncio.create_task(job("quiet", "quiet")))
+            await asyncio.sleep(0)
+            lane.release()
+            await asyncio.gather(*tasks)
+            return order
+
+        order = asyncio.run(scenario())
+        assert order.index("quiet") == 1
+
+    def test_cancelled_waiter_is_removed(self):
+        """Test that cancelling a queued job frees its place in the queue."""
+        async def scenario():
+            lane = Lane("test", 1)
+            await lane.acquire("a")
+            task = asyncio.create_task(lane.acquire("b"))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            queued = lane.queued
+            lane.release()
+            return lane, queued
+
+        lane, queued = asyncio.run(scenario())
+        assert queued == 0
+        assert lane.running == 0
+
+    def test_invalid_concurrency(self):
+        """Test that a lane needs at least one slot."""
+        with pytest.raises(ValueError, match="at least 1"):
+            Lane("test", 0)
+
+
+class TestSplitScheduler:
+    """Test lane routing."""
+
+    def test_lane_routing(self):
+        """Test cheap jobs go to the fast lane and expensive ones to the bulk lane."""
+        scheduler = SplitScheduler(fast_lane_max_cost=10)
+        assert scheduler.lane_for(5).name == "fast"
+        assert scheduler.lane_for(50).name == "bulk"
+
+    def test_small_job_not_blocked_by_bulk_lane(self):
+        """Test that a fast job completes while the bulk lane is saturated."""
+        async def scenario():
+            scheduler = SplitScheduler(fast_lane_max_cost=10, fast_concurrency=1, bulk_concurrency=1)
+            gate = asyncio.Event()
+
+            async def bulk_job():
+                async with scheduler.slot(100, "bulk-client"):
+                    await gate.wait()
+
+            bulk_tasks = [asyncio.create_task(bulk_job()) for _ in range(3)]
+            await asyncio.sleep(0)
+            result = await scheduler.run(1, "fast-client", lambda: "done")
+            stats = scheduler.stats()
+            gate.set()
+            await asyncio.gather(*bulk_tasks)
+            return result, stats
+
+        result, stats = asyncio.run(scenario())
+        assert result == "done"
+        assert stats["bulk"]["running"] == 1
+        assert stats["bulk"]["queued"] == 2
+
+
+class TestGetClientId:
+    """Test client identification."""
+
+    def test_forwarded_header(self, monkeypatch):
+        """Test the hop appended by a trusted proxy is used."""
+        monkeypatch.setattr("scheduler.TRUSTED_PROXIES", {"127.0.0.1"})
+        headers = {"x-forwarded-for": "10.0.0.1, 10.0.0.2"}
+        assert get_client_id(headers, SimpleNamespace(host="127.0.0.1")) == "10.0.0.2"
+
+    def test_forwarded_through_proxy_chain(self, monkeypatch):
+        """Test trusted proxies in the header are skipped."""
+        monkeypatch.setattr("scheduler.TRUSTED_PROXIES", {"127.0.0.1", "10.0.0.2"})
+        headers = {"x-forwarded-for": "spoofed, 10.0.0.1, 10.0.0.2"}
+        assert get_client_id(headers, SimpleNamespace(host="127.0.0.1")) == "10.0.0.1"
+
+    def test_spoofed_header_ignored(self, monkeypatch):
+        """Test X-Forwarded-For from an untrusted peer is ignored."""
+        monkeypatch.setattr("scheduler.TRUSTED_PROXIES", {"127.0.0.1"})
+        headers = {"x-forwarded-for": "10.0.0.1"}
+        assert get_client_id(headers, SimpleNamespace(host="203.0.113.7")) == "203.0.113.7"
+
+    def test_no_trusted_proxies(self, monkeypatch):
+        """Test X-Forwarded-For is ignored when no proxy is configured."""
+        monkeypatch.setattr("scheduler.TRUSTED_PROXIES", set())
+        headers = {"x-forwarded-for": "10.0.0.1"}
+        assert get_client_id(headers, SimpleNamespace(host="127.0.0.1")) == "127.0.0.1"
+
+    def test_client_host(self):
+        """Test fallback to the socket peer address."""
+        assert get_client_id({}, SimpleNamespace(host="127.0.0.1")) == "127.0.0.1"
+
+    def test_no_client(self):
+        """Test fallback when no client information is available."""
+        assert get_client_id({}, None) == "anonymous"
+
+
+class TestEstimateSelectionSize:
+    """Test selection size estimates used for costing."""
+
+    def test_absolute_selection(self):
+        """Test absolute selections are sized exactly."""
+        from splitter import compile_selection
+        assert estimate_selection_size(compile_selection("1-3,5,7-9"), 10**9) == (7, 3)
+
+    def test_relative_selection(self):
+        """Test relative selections are sized from the input bytes."""
+        from splitter import compile_selection
+        pages, groups = estimate_selection_size(compile_selection("2-"), 10 * COST_BYTES_PER_PAGE)
+        assert (pages, groups) == (9, 1)
+
+    def test_ordered_selection(self):
+        """Test repeated pages count again and each term is a group."""
+        from splitter import compile_selection
+        assert estimate_selection_size(compile_selection("10,1-3,10", ordered=True), 10**9) == (5, 3)
+
+    def test_huge_step_selection_is_cheap(self):
+        """Test a stepped selection over millions of pages is sized instantly."""
+        import time
+        from splitter import compile_selection
+        started = time.perf_counter()
+        estimate_selection_size(compile_selection("1-20000000:2"), 1024 * 1024)
+        assert time.perf_counter() - started < 0.1
@@ -0,0 +1,255 @@
+import pytest
+from splitter.selection import MAX_DOCUMENT_PAGES, MAX_TERMS, Run, compile_selection
+
+
+def pages(expression: str, total_pages: int):
+    """Expand a resolved selection to 1-indexed pages for readable asserts."""
+    runs = compile_selection(expression).resolve(total_pages)
+    return [page + 1 for first, last in runs for page in range(first, last + 1)]
+
+
+class TestCompileSelection:
+    """Test expression compilation."""
+
+    def test_classic_syntax(self):
+        """Test plain pages and ranges compile to absolute runs."""
+        selection = compile_selection("1-3,5")
+        assert selection.runs == (Run(1, 3), Run(5, 5))
+        assert selection.is_absolute
+
+    def test_open_range(self):
+        """Test an open-ended range."""
+        assert compile_selection("5-").runs == (Run(5, None),)
+
+    def test_from_end(self):
+        """Test negative indices."""
+        assert compile_selection("-3-").runs == (Run(-3, None),)
+        assert compile_selection("-1").runs == (Run(-1, -1),)
+        assert not compile_selection("-1").is_absolute
+
+    def test_step(self):
+        """Test a stepped range."""
+        assert compile_selection("1-100:2").runs == (Run(1, 100, 2),)
+
+    def test_keywords(self):
+        """Test odd/even keywords, case-insensitively."""
+        assert compile_selection("ODD, even").runs == (Run(1, None, 2), Run(2, None, 2))
+
+    def test_exclusion(self):
+        """Test exclusion terms."""
+        assert compile_selection("!10-20").runs == (Run(10, 20, exclude=True),)
+
+    def test_empty(self):
+        """Test empty expressions are rejected."""
+        with pytest.raises(ValueError, match="cannot be empty"):
+            compile_selection("  ")
+
+    def test_only_separators(self):
+        """Test an expression without terms is rejected."""
+        with pytest.raises(ValueError, match="No valid pages"):
+            compile_selection(",,")
+
+    def test_invalid_syntax(self):
+        """Test malformed terms are rejected."""
+        for expression in ("abc", "1-2-3", "1:2:3", "--1"):
+            with pytest.raises(ValueError, match="Invalid page selection"):
+                compile_selection(expression)
+
+    def test_zero(self):
+        """Test page 0 is rejected."""
+        with pytest.raises(ValueError, match="must not be 0"):
+            compile_selection("0-5")
+
+    def test_reversed_range(self):
+        """Test an absolute range with start > end is rejected."""
+        with pytest.raises(ValueError, match="Invalid range"):
+            compile_selection("5-2")
+
+
+class TestResolveSelection:
+    """Test resolution against a page count."""
+
+    def test_classic(self):
+        """Test classic ranges resolve like parse_page_ranges."""
+        assert pages("9,1-3,5,2", 10) == [1, 2, 3, 5, 9]
+
+    def test_runs_are_merged(self):
+        """Test consecutive and overlapping runs merge into one part."""
+        assert compile_selection("1-3,4,3-6,8").resolve(10) == [(0, 5), (7, 7)]
+
+    def test_all_but_last(self):
+        """Test excluding the last page only."""
+        assert compile_selection("!-1").resolve(10) == [(0, 8)]
+
+    def test_open_range(self):
+        """Test an open range runs to the last page."""
+        assert pages("5-", 7) == [5, 6, 7]
+
+    def test_last_pages(self):
+        """Test the last three pages."""
+        assert pages("-3-", 10) == [8, 9, 10]
+
+    def test_odd_even(self):
+        """Test odd and even pages."""
+        assert pages("odd", 7) == [1, 3, 5, 7]
+        assert pages("even", 7) == [2, 4, 6]
+
+    def test_step(self):
+        """Test every 3rd page."""
+        assert pages("1-10:3", 20) == [1, 4, 7, 10]
+
+    def test_exclusion_splits_range(self):
+        """Test an exclusion inside a range."""
+        assert compile_selection("1-100,!10-20").resolve(100) == [(0, 8), (20, 99)]
+
+    def test_stepped_exclusion(self):
+        """Test excluding every other page of a range."""
+        assert pages("1-6,!2-6:2", 6) == [1, 3, 5]
+
+    def test_out_of_bounds(self):
+        """Test absolute pages beyond the document are rejected."""
+        with pytest.raises(ValueError, match="Page 10 is out of bounds"):
+            compile_selection("1-10").resolve(5)
+
+    def test_negative_out_of_bounds(self):
+        """Test negative indices beyond the document are rejected."""
+        with pytest.raises(ValueError, match="out of bounds"):
+            compile_selection("-6").resolve(5)
+
+    def test_nothing_left(self):
+        """Test a selection excluding everything is rejected."""
+        with pytest.raises(ValueError, match="No pages selected"):
+            compile_selection("1-5,!1-5").resolve(5)
+
+    def test_cost_is_per_run(self):
+        """Test a huge range resolves to a single interval."""
+        assert compile_selection("1-").resolve(1_000_000) == [(0, 999_999)]
+
+
+def sequence(expression: str, *page_counts: int):
+    """Expand an ordered selection to (document letter, 1-indexed page) pairs."""
+    segments = compile_selection(expression, ordered=True, documents=len(page_counts)).resolve_sequence(page_counts)
+    return [(chr(ord("A") + document), page + 1) for document, pages in segments for page in pages]
+
+
+class TestOrderedSelection:
+    """Test ordered selections with repeats and several documents."""
+
+    def test_keeps_order_and_repeats(self):
+        """Test terms stay in the order given, repeats included."""
+        assert [page for _, page in sequence("10,1-3,10", 12)] == [10, 1, 2, 3, 10]
+
+    def test_one_segment_per_term(self):
+        """Test each term is its own segment."""
+        segments = compile_selection("3,1-2", ordered=True).resolve_sequence([5])
+        assert segments == [(0, [2]), (0, [0, 1])]
+
+    def test_descending_range(self):
+        """Test reversed ranges, including the whole document."""
+        assert [page for _, page in sequence("4-2", 5)] == [4, 3, 2]
+        assert [page for _, page in sequence("-1-1", 3)] == [3, 2, 1]
+        assert [page for _, page in sequence("9-1:4", 9)] == [9, 5, 1]
+
+    def test_descending_rejected_when_sorted(self):
+        """Test descending ranges are still invalid in sorted selections."""
+        with pytest.raises(ValueError, match="Invalid range"):
+            compile_selection("4-2")
+
+    def test_document_letters(self):
+        """Test letters pick documents and carry over to the next terms."""
+        assert sequence("A2,B,1,Aodd", 3, 2) == [
+            ("A", 2), ("B", 1), ("B", 2), ("B", 1), ("A", 1), ("A", 3),
+        ]
+
+    def test_keyword_not_a_letter(self):
+        """Test upper-case keywords are not read as document letters."""
+        assert sequence("ODD", 3) == [("A", 1), ("A", 3)]
+
+    @pytest.mark.parametrize("keyword", ["Odd", "oDD", "Even", "EVEN", "eVeN"])
+    def test_mixed_case_keyword(self, keyword):
+        """Test keywords in any case select pages of the current document."""
+        pages = [1, 3] if keyword.lower() == "odd" else [2, 4]
+        assert sequence(keyword, 4, 4) == [("A", page) for page in pages]
+        assert sequence(f"B1,{keyword}", 4, 4) == [("B", 1)] + [("B", page) for page in pages]
+
+    def test_letter_before_mixed_case_keyword(self):
+        """Test a document letter followed by a keyword in any case."""
+        assert sequence("BOdd,AEven", 4, 3) == [("B", 1), ("B", 3), ("A", 2), ("A", 4)]
+
+    def test_letter_needs_page_or_keyword(self):
+        """Test a letter followed by anything else is not a document."""
+        with pytest.raises(ValueError, match="Invalid page selection"):
+            compile_selection("Oddly", ordered=True, documents=26)
+
+    def test_unknown_document(self):
+        """Test letters beyond the given documents are rejected."""
+        with pytest.raises(ValueError, match="Unknown document B"):
+            compile_selection("A1,B1", ordered=True)
+
+    def test_exclusions(self):
+        """Test exclusions remove pages from every term."""
+        assert [page for _, page in sequence("1-4,4-1,!2", 4)] == [1, 3, 4, 4, 3, 1]
+        assert [page for _, page in sequence("!2", 3)] == [1, 3]
+
+    def test_normalized(self):
+        """Test ordered selections normalize in order, apart from sorted ones."""
+        assert compile_selection("3,1", ordered=True).normalized() == "ordered:A3-3:1,A1-1:1"
+        assert compile_selection("3,1", ordered=True).normalized() != compile_selection("1,3").normalized()
+
+    def test_sorted_resolve_refused(self):
+        """Test an ordered selection is not silently sorted."""
+        with pytest.raises(ValueError, match="cannot be resolved"):
+            compile_selection("3,1", ordered=True).resolve(5)
+
+    def test_length_limit(self, monkeypatch):
+        """Test very long sequences are refused."""
+        monkeypatch.setattr("splitter.selection.MAX_SEQUENCE_PAGES", 10)
+        with pytest.raises(ValueError, match="more than 10 pages"):
+            compile_selection("1-,1-", ordered=True).resolve_sequence([6])
+
+
+class TestCountSelection:
+    """Test sizing selections without expanding them."""
+
+    def test_matches_resolve(self):
+        """Test counts agree with the resolved intervals."""
+        for expression in ("1-20:3,2-9,!5-15:2", "odd,!1-30:3", "!2-6", "1-10:2,2-10:2"):
+            intervals = compile_selection(expression).resolve(30)
+            expected = (sum(last - first + 1 for first, last in intervals), len(intervals))
+            assert compile_selection(expression).count(30) == expected
+
+    def test_huge_step_run(self):
+        """Test a stepped run over a million pages is counted without expansion."""
+        assert compile_selection("1-1000000:2").count(1_000_000) == (500_000, 500_000)
+
+    def test_irregular_overlap_is_bounded(self):
+        """Test overlaps with a huge common period fall back to an upper bound."""
+        pages, groups = compile_selection("1-999999:9973,1-999999:9967").count(999_999)
+        assert pages == groups == 202
+
+    def test_upper_bound_clamped(self):
+        """Test absolute selections do not size against arbitrary page numbers."""
+        assert compile_selection("1-20000000:2").upper_bound() == MAX_DOCUMENT_PAGES
+
+    def test_term_limit(self):
+        """Test expressions with too many terms are rejected."""
+        with pytest.raises(ValueError, match="more than"):
+            compile_selection(",".join(["1"] * (MAX_TERMS + 1)))
+
+
+class TestNormalizedSelection:
+    """Test canonical forms used as coalescing keys."""
+
+    def test_equivalent_absolute(self):
+        """Test absolute selections of the same pages normalize alike."""
+        assert compile_selection("5,1-3").normalized() == compile_selection("1,2,3,5").normalized() == "1-3,5;max=5"
+        assert compile_selection("1-5,!2").normalized() == "1,3-5;max=5"
+
+    def test_bound_kept(self):
+        """Test selections of the same pages that need longer documents differ."""
+        assert compile_selection("1-10,!6-10").normalized() != compile_selection("1-5").normalized()
+
+    def test_stepped_not_expanded(self):
+        """Test a huge stepped run normalizes without expanding its pages."""
+        assert compile_selection("1-20000000:2").normalized() == "1-19999999:2;max=20000000"
+        assert compile_selection("1-9:2,!3,2-4").normalized() == "2-4,1-9:2,!3;max=9"
@@ -0,0 +1,241 @@
+import asyncio
+import os
+import threading
+import time
+import zipfile
+import httpx
+import pytest
+from io import BytesIO
+import main
+from singleflight import SingleFlight, request_key
+from tests.test_main import create_test_pdf
+
+
+class TestSingleFlight:
+    """Test coalescing of concurrent calls."""
+
+    def test_concurrent_calls_share_one_computation(self):
+        """Test callers with the same key get one shared result."""
+        async def scenario():
+            flight = SingleFlight()
+            calls = []
+
+            async def compute():
+                calls.append(1)
+                await asyncio.sleep(0.05)
+                return "result"
+
+            results = await asyncio.gather(*(flight.do("key", compute) for _ in range(5)))
+            return calls, results, flight
+
+        calls, results, flight = asyncio.run(scenario())
+        assert len(calls) == 1
+        assert [result for result, _, _ in results] == ["result"] * 5
+        assert [shared for _, shared, _ in results].count(False) == 1
+        assert (flight.leaders, flight.followers) == (1, 4)
+        assert flight.stats()["in_flight"] == 0
+
+    def test_different_keys_do_not_share(self):
+        """Test different keys compute separately."""
+        async def scenario():
+            flight = SingleFlight()
+
+            async def compute(value):
+                await asyncio.sleep(0.01)
+                return value
+
+            return await asyncio.gather(
+                flight.do("a", lambda: compute("a")), flight.do("b", lambda: compute("b"))
+            )
+
+        (a, shared_a, _), (b, shared_b, _) = asyncio.run(scenario())
+        assert (a, b) == ("a", "b")
+        assert not shared_a and not shared_b
+
+    def test_not_cached_after_completion(self):
+        """Test a finished computation is not reused by later calls."""
+        async def scenario():
+            flight = SingleFlight()
+            calls = []
+
+            async def compute():
+                calls.append(1)
+                return len(calls)
+
+            first = await flight.do("key", compute)
+            second = await flight.do("key", compute)
+            return first[0], second[0]
+
+        assert asyncio.run(scenario()) == (1, 2)
+
+    def test_error_reaches_every_caller(self):
+        """Test all attached callers see the computation's exception."""
+        async def scenario():
+            flight = SingleFlight()
+
+            async def compute():
+                await asyncio.sleep(0.01)
+                raise ValueError("Broken PDF")
+
+            return await asyncio.gather(
+                *(flight.do("key", compute) for _ in range(3)), return_exceptions=True
+            )
+
+        results = asyncio.run(scenario())
+        assert all(isinstance(result, ValueError) for result in results)
+
+    def test_cleanup_after_last_release(self):
+        """Test the shared result is cleaned up once every caller released it."""
+        async def scenario():
+            flight = SingleFlight()
+            cleaned = []
+
+            async def compute():
+                await asyncio.sleep(0.01)
+                return "output"
+
+            results = await asyncio.gather(
+                *(flight.do("key", compute, cleanup=cleaned.append) for _ in range(3))
+            )
+            await results[0][2]()
+            await results[1][2]()
+            before_last = list(cleaned)
+            await results[2][2]()
+            return before_last, cleaned
+
+        before_last, cleaned = asyncio.run(scenario())
+        assert before_last == []
+        assert cleaned == ["output"]
+
+    def test_leader_cancellation_does_not_cancel_followers(self):
+        """Test a caller going away does not abort the shared computation."""
+        async def scenario():
+            flight = SingleFlight()
+
+            async def compute():
+                await asyncio.sleep(0.05)
+                return "done"
+
+            leader = asyncio.ensure_future(flight.do("key", compute))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flight.do("key", compute))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            return await follower
+
+        result, shared, _ = asyncio.run(scenario())
+        assert (result, shared) == ("done", True)
+
+    def test_request_key(self):
+        """Test keys are stable and distinguish their parts."""
+        assert request_key("abc", "1-3", False) == request_key("abc", "1-3", False)
+        assert request_key("abc", "1-3", False) != request_key("abc", "1-3", True)
+
+
+class TestCoalescedEndpoint:
+    """Test identical concurrent /split requests share one job."""
+
+    def post_concurrently(self, count, page_ranges, monkeypatch, delay=0.3):
+        jobs = []
+        lock = threading.Lock()
+        original = main.run_split_job
+
+        def counting_job(*args, **kwargs):
+            with lock:
+                jobs.append(args[1])
+            time.sleep(delay)
+            return original(*args, **kwargs)
+
+        monkeypatch.setattr(main, "run_split_job", counting_job)
+        pdf = create_test_pdf(6).getvalue()
+
+        async def scenario():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=60) as client:
+                return await asyncio.gather(*(
+                    client.post(
+                        "/split",
+                        files={"file": ("viral.pdf", pdf, "application/pdf")},
+                        data={"page_ranges": ranges},
+                    )
+                    for ranges in page_ranges[:count]
+                ))
+
+        return jobs, asyncio.run(scenario())
+
+    def test_identical_requests_run_once(self, monkeypatch):
+        """Test equivalent selections on the same bytes run a single split."""
+        ranges = ["1-3,5", "5,1-3", "1,2,3,5", "1-3,5"]
+        jobs, responses = self.post_concurrently(4, ranges, monkeypatch)
+        assert len(jobs) == 1
+        assert [response.status_code for response in responses] == [200] * 4
+        assert sorted(response.headers["x-split-coalesced"] for response in responses) == ["false"] + ["true"] * 3
+        bodies = {response.content for response in responses}
+        assert len(bodies) == 1
+        with zipfile.ZipFile(BytesIO(bodies.pop())) as zipf:
+            assert zipf.namelist() == ["viral_pages1-3.pdf", "viral_page5.pdf"]
+
+    def test_different_selections_run_separately(self, monkeypatch):
+        """Test different selections are not coalesced."""
+        jobs, responses = self.post_concurrently(2, ["1", "2"], monkeypatch)
+        assert len(jobs) == 2
+        assert all(response.headers["x-split-coalesced"] == "false" for response in responses)
+
+    def test_same_pages_different_bounds_run_separately(self, monkeypatch):
+        """Test a valid selection does not share the failure of an out-of-bounds one."""
+        jobs, responses = self.post_concurrently(2, ["1-10,!6-10", "1-5"], monkeypatch)
+        assert len(jobs) == 2
+        assert [response.status_code for response in responses] == [400, 200]
+        assert "out of bounds" in responses[0].json()["detail"]
+
+    def test_disabled(self, monkeypatch):
+        """Test coalescing can be switched off."""
+        monkeypatch.setattr(main, "COALESCE_REQUESTS", False)
+        jobs, _ = self.post_concurrently(2, ["1", "1"], monkeypatch)
+        assert len(jobs) == 2
+
+    def test_output_removed_after_responses(self, monkeypatch):
+        """Test the shared output is deleted once all responses are sent."""
+        outputs = []
+        original = main.remove_output
+        monkeypatch.setattr(main, "remove_output", lambda result: (outputs.append(result[0]), original(result)))
+        self.post_concurrently(3, ["2-3"] * 3, monkeypatch)
+        assert len(outputs) == 1
+        assert not os.path.exists(outputs[0])
+
+    def test_output_removed_when_response_fails(self, monkeypatch):
+        """Test the shared output is deleted when the response cannot be built."""
+        outputs = []
+        original = main.remove_output
+        monkeypatch.setattr(main, "remove_output", lambda result: (outputs.append(result[0]), original(result)))
+
+        def broken(filename):
+            raise RuntimeError("boom")
+
+        monkeypatch.setattr(main, "zip_filename", broken)
+        _, responses = self.post_concurrently(1, ["2-3"], monkeypatch, delay=0)
+        assert responses[0].status_code == 500
+        time.sleep(0.2)
+        assert len(outputs) == 1
+        assert not os.path.exists(outputs[0])
+        assert main.coalescer.stats()["in_flight"] == 0
+
+    def test_output_removed_when_send_fails(self, tmp_path):
+        """Test a shared response releases its output even if sending fails."""
+        released = []
+
+        async def release():
+            released.append(1)
+
+        async def send(message):
+            raise OSError("client went away")
+
+        async def receive():
+            return {"type": "http.request"}
+
+        output = tmp_path / "out.zip"
+        output.write_bytes(b"zip")
+        response = main.SharedFileResponse(path=str(output), release=release)
+        with pytest.raises(OSError):
+            asyncio.run(response({"type": "http", "method": "GET", "headers": []}, receive, send))
+        assert released == [1]
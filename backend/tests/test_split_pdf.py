@@ -2,7 +2,7 @@ import pytest
 import tempfile
 import os
 from pypdf import PdfWriter
-from split_pdf import parse_page_ranges, validate_page_ranges, group_consecutive_pages
+from splitter import parse_page_ranges, validate_page_ranges, group_consecutive_pages
 
 
 class TestParsePageRanges:
@@ -0,0 +1,62 @@
+import os
+import runpy
+import signal
+from fastapi.testclient import TestClient
+import main
+from supervisor import MemoryWatch
+
+client = TestClient(main.app)
+
+
+def refuse_kill(*args):
+    raise AssertionError("os.kill must not be called")
+
+
+class TestMemoryWatch:
+    """Test web worker RSS supervision."""
+
+    def test_tracks_high_water(self):
+        """Test RSS samples raise the high-water mark."""
+        watch = MemoryWatch(max_rss_bytes=0, supervised=True)
+        assert not watch.check()
+        assert watch.stats()["rss_high_water_bytes"] >= watch.high_water > 0
+
+    def test_unsupervised_never_recycles(self, monkeypatch):
+        """Test a worker without a supervisor does not stop itself."""
+        monkeypatch.setattr(os, "kill", refuse_kill)
+        assert not MemoryWatch(max_rss_bytes=1, supervised=False).check()
+
+    def test_supervised_recycles_once(self, monkeypatch):
+        """Test an oversized supervised worker asks itself to shut down once."""
+        signals = []
+        monkeypatch.setattr(os, "kill", lambda pid, sig: signals.append((pid, sig)))
+        watch = MemoryWatch(max_rss_bytes=1, supervised=True)
+        assert watch.check()
+        assert not watch.check()
+        assert signals == [(os.getpid(), signal.SIGTERM)]
+        assert watch.stats()["recycling"]
+
+
+class TestHealth:
+    """Test supervision stats on /health."""
+
+    def test_health_reports_workers(self):
+        """Test worker pool and server memory stats are reported."""
+        data = client.get("/health").json()
+        assert data["status"] == "healthy"
+        assert "recycled" in data["workers"]
+        assert data["server"]["rss_high_water_bytes"] > 0
+
+
+class TestGunicornConfig:
+    """Test the gunicorn configuration file."""
+
+    def test_config(self, monkeypatch):
+        """Test workers are recycled and drained gracefully."""
+        monkeypatch.setenv("PORT", "9000")
+        config = runpy.run_path(os.path.join(os.path.dirname(__file__), "..", "gunicorn.conf.py"))
+        assert config["bind"] == "0.0.0.0:9000"
+        assert config["worker_class"] == "uvicorn.workers.UvicornWorker"
+        assert config["max_requests"] > 0 and config["max_requests_jitter"] > 0
+        assert config["graceful_timeout"] > 0
+        assert "SERVER_SUPERVISED=true" in config["raw_env"]
@@ -0,0 +1,250 @@
+import os
+import zipfile
+import pytest
+from io import BytesIO
+from fastapi.testclient import TestClient
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DictionaryObject, NameObject, StreamObject
+import main
+from splitter import compile_selection
+from splitter.selection import cut_runs, format_pages
+from splitter.textindex import TextIndex, build_page_texts, load_text_index, select_pages
+from worker import run_text_extraction
+
+client = TestClient(main.app)
+
+INVOICES = [
+    ["Invoice 1001", "Acme Corp", "Total 10.00"],
+    ["Terms and conditions"],
+    ["Invoice 1002", "Globex", "Total 20.00"],
+    ["Invoice 1003", "Acme Corp", "Total 30.00"],
+    ["Appendix", "See invoice 1003"],
+]
+
+
+def create_text_pdf(pages) -> bytes:
+    """Create a PDF with one line of Helvetica text per entry of each page."""
+    writer = PdfWriter()
+    font = DictionaryObject({
+        NameObject("/Type"): NameObject("/Font"),
+        NameObject("/Subtype"): NameObject("/Type1"),
+        NameObject("/BaseFont"): NameObject("/Helvetica"),
+    })
+    font_ref = writer._add_object(font)
+    for lines in pages:
+        page = writer.add_blank_page(width=612, height=792)
+        content = StreamObject()
+        operators = "".join(f"({line}) Tj 0 -14 Td " for line in lines)
+        content._data = f"BT /F1 12 Tf 72 720 Td {operators}ET".encode()
+        page[NameObject("/Contents")] = writer._add_object(content)
+        page[NameObject("/Resources")] = DictionaryObject({
+            NameObject("/Font"): DictionaryObject({NameObject("/F1"): font_ref}),
+        })
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def invoice_pdf(tmp_path):
+    path = tmp_path / "invoices.pdf"
+    path.write_bytes(create_text_pdf(INVOICES))
+    return str(path)
+
+
+class TestSelectionHelpers:
+    """Test helpers used to turn text matches into parts."""
+
+    def test_format_pages(self):
+        """Test pages are formatted as a compact expression."""
+        assert format_pages([0, 1, 2, 6, 9, 8]) == "1-3,7,9-10"
+
+    def test_cut_runs(self):
+        """Test runs are split at part starts."""
+        assert cut_runs([(0, 9), (12, 14)], [0, 3, 7, 13]) == [(0, 2), (3, 6), (7, 9), (12, 12), (13, 14)]
+
+
+class TestTextIndex:
+    """Test page text queries."""
+
+    def test_pages_containing(self):
+        """Test case-insensitive search across line breaks."""
+        index = TextIndex("x", ["Invoice\nNumber 42", "nothing", "INVOICE number 42"])
+        assert index.pages_containing("invoice number 42") == [0, 2]
+
+    def test_empty_search(self):
+        """Test empty search text is rejected."""
+        with pytest.raises(ValueError, match="cannot be empty"):
+            TextIndex("x", ["a"]).pages_containing("  ")
+
+    def test_pages_starting_with(self):
+        """Test only the first non-empty line is matched."""
+        index = TextIndex("x", ["\n  Invoice 1\nx", "Terms\nInvoice 2", ""])
+        assert index.pages_starting_with(r"^Invoice \d+") == [0]
+
+    def test_invalid_pattern(self):
+        """Test invalid regexes are rejected."""
+        with pytest.raises(ValueError, match="Invalid pattern"):
+            TextIndex("x", ["a"]).pages_starting_with("(")
+
+    def test_select_pages(self):
+        """Test text queries narrow and cut the page selection."""
+        index = TextIndex("x", ["Invoice 1 acme", "more", "Invoice 2", "Invoice 3 acme"])
+        expression, split_at = select_pages(index, compile_selection("1-"), "acme", "^Invoice")
+        assert expression == "1,4"
+        assert split_at == [1, 3, 4]
+
+    def test_select_no_match(self):
+        """Test a search without results is reported."""
+        index = TextIndex("x", ["a", "b"])
+        with pytest.raises(ValueError, match="No selected page contains"):
+            select_pages(index, compile_selection("1-"), "zzz")
+
+
+class TestBuildIndex:
+    """Test extraction and caching."""
+
+    def test_extraction(self, invoice_pdf):
+        """Test every page's text is extracted in page order."""
+        texts = build_page_texts(invoice_pdf)
+        assert len(texts) == 5
+        assert "Globex" in texts[2]
+
+    def test_isolated_extraction(self, invoice_pdf):
+        """Test extraction run as a worker job gives the same text as in-process extraction."""
+        isolated = build_page_texts(invoice_pdf, extract=run_text_extraction)
+        assert isolated == build_page_texts(invoice_pdf)
+
+    def test_unreadable_document(self, tmp_path):
+        """Test a file pypdf cannot open is reported as a ValueError."""
+        path = tmp_path / "broken.pdf"
+        path.write_bytes(b"not a pdf")
+        with pytest.raises(ValueError, match="Error processing PDF"):
+            build_page_texts(str(path), extract=run_text_extraction)
+
+    def test_cached_by_content(self, invoice_pdf, tmp_path):
+        """Test the second load of the same bytes comes from the cache."""
+        index_dir = str(tmp_path / "index")
+        first, first_cached = load_text_index(invoice_pdf, index_dir)
+        copy = tmp_path / "renamed.pdf"
+        with open(invoice_pdf, "rb") as source:
+            copy.write_bytes(source.read())
+        second, second_cached = load_text_index(str(copy), index_dir)
+        assert (first_cached, second_cached) == (False, True)
+        assert second.pages == first.pages
+        assert os.listdir(index_dir) == [f"{first.document_hash}.json.gz"]
+
+    def test_corrupt_cache_is_rebuilt(self, invoice_pdf, tmp_path):
+        """Test an unreadable index file is replaced."""
+        index_dir = tmp_path / "index"
+        index, _ = load_text_index(invoice_pdf, str(index_dir))
+        (index_dir / f"{index.document_hash}.json.gz").write_bytes(b"garbage")
+        rebuilt, cached = load_text_index(invoice_pdf, str(index_dir))
+        assert not cached
+        assert rebuilt.pages == index.pages
+
+    def test_known_digest_not_rehashed(self, invoice_pdf, tmp_path, monkeypatch):
+        """Test a digest passed in is used instead of hashing the file again."""
+        index_dir = str(tmp_path / "index")
+        first, _ = load_text_index(invoice_pdf, index_dir)
+
+        def rehash(path):
+            raise AssertionError("document hashed again")
+
+        monkeypatch.setattr("splitter.textindex.document_hash", rehash)
+        second, cached = load_text_index(invoice_pdf, index_dir, digest=first.document_hash)
+        assert cached
+        assert second.document_hash == first.document_hash
+
+    def test_least_recently_used_evicted(self, tmp_path, monkeypatch):
+        """Test the oldest indexes are deleted once the cache is over its size."""
+        index_dir = tmp_path / "index"
+        hashes = []
+        for number in range(3):
+            path = tmp_path / f"doc{number}.pdf"
+            path.write_bytes(create_text_pdf([[f"Document {number}"]]))
+            index, _ = load_text_index(str(path), str(index_dir))
+            hashes.append(index.document_hash)
+            os.utime(index_dir / f"{index.document_hash}.json.gz", (number, number))
+        # Using the first index makes the second the least recently used
+        load_text_index(str(tmp_path / "doc0.pdf"), str(index_dir))
+        size = os.path.getsize(index_dir / f"{hashes[0]}.json.gz")
+        monkeypatch.setattr("splitter.textindex.TEXT_INDEX_MAX_MB", 3 * size / (1024 * 1024))
+        path = tmp_path / "doc3.pdf"
+        path.write_bytes(create_text_pdf([["Document 3"]]))
+        newest, _ = load_text_index(str(path), str(index_dir))
+        assert sorted(os.listdir(index_dir)) == sorted(
+            f"{digest}.json.gz" for digest in (hashes[0], hashes[2], newest.document_hash)
+        )
+
+
+class TestTextSplitEndpoint:
+    """Test text-driven selections through /split."""
+
+    @pytest.fixture(autouse=True)
+    def index_dir(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(
+            main, "load_text_index", lambda path, **kwargs: load_text_index(path, str(tmp_path), **kwargs)
+        )
+
+    def post(self, **data):
+        files = {"file": ("invoices.pdf", create_text_pdf(INVOICES), "application/pdf")}
+        return client.post("/split", files=files, data=data)
+
+    def test_text_contains(self):
+        """Test pages mentioning an invoice number are extracted."""
+        response = self.post(text_contains="invoice 1003")
+        assert response.status_code == 200
+        assert response.headers["x-split-text-index"] == "miss"
+        with zipfile.ZipFile(BytesIO(response.content)) as zipf:
+            assert zipf.namelist() == ["invoices_pages4-5.pdf"]
+
+    def test_index_reused(self):
+        """Test a second query against the same document hits the index."""
+        self.post(text_contains="Acme")
+        response = self.post(text_contains="Globex")
+        assert response.status_code == 200
+        assert response.headers["x-split-text-index"] == "hit"
+
+    def test_upload_digest_reused(self, monkeypatch):
+        """Test the index is keyed by the digest taken while saving the upload."""
+        def rehash(path):
+            raise AssertionError("upload hashed again")
+
+        monkeypatch.setattr("splitter.textindex.document_hash", rehash)
+        response = self.post(text_contains="Acme")
+        assert response.status_code == 200
+
+    def test_split_on_first_line(self):
+        """Test a new part starts at each page whose first line matches."""
+        response = self.post(split_on=r"^Invoice \d+")
+        assert response.status_code == 200
+        with zipfile.ZipFile(BytesIO(response.content)) as zipf:
+            assert zipf.namelist() == ["invoices_pages1-2.pdf", "invoices_page3.pdf", "invoices_pages4-5.pdf"]
+            part = PdfReader(BytesIO(zipf.read("invoices_pages1-2.pdf")))
+            assert "Terms" in part.pages[1].extract_text()
+
+    def test_combined_with_page_ranges(self):
+        """Test text queries only look at the selected pages."""
+        response = self.post(page_ranges="1-3", text_contains="acme corp")
+        with zipfile.ZipFile(BytesIO(response.content)) as zipf:
+            assert zipf.namelist() == ["invoices_page1.pdf"]
+
+    def test_no_match(self):
+        """Test a search without results returns 400."""
+        response = self.post(text_contains="Initech")
+        assert response.status_code == 400
+        assert "No selected page contains" in response.json()["detail"]
+
+    def test_invalid_pattern(self):
+        """Test an invalid regex is rejected before the upload is processed."""
+        response = self.post(split_on="(")
+        assert response.status_code == 400
+        assert "Invalid pattern" in response.json()["detail"]
+
+    def test_catastrophic_pattern_times_out(self, monkeypatch):
+        """Test a backtracking pattern is stopped by the wall-clock limit."""
+        monkeypatch.setenv("JOB_MAX_WALL_SECONDS", "1")
+        files = {"file": ("slow.pdf", create_text_pdf([["a" * 40 + "!"]]), "application/pdf")}
+        response = client.post("/split", files=files, data={"split_on": r"^(a+)+$"})
+        assert response.status_code == 504
@@ -0,0 +1,267 @@
+import binascii
+import os
+import tempfile
+import threading
+import time
+import zlib
+import pytest
+from io import BytesIO
+from fastapi.testclient import TestClient
+from pypdf import PdfWriter
+from pypdf.generic import NameObject, StreamObject
+from main import app
+from splitter import split_pdf_to_parts
+from splitter.limits import MB, JobLimits, JobLimitExceeded, get_active_limits, get_job_limits, set_active_limits
+from worker import WorkerPool, run_isolated, run_split_job, run_text_extraction
+
+client = TestClient(app)
+
+TIGHT_LIMITS = JobLimits(max_rss_bytes=256 * MB, max_wall_seconds=2, max_decoded_stream_bytes=4 * MB)
+
+
+def add_numbers(a, b):
+    return a + b
+
+
+def fail():
+    raise ValueError("Boom")
+
+
+def sleep_forever():
+    time.sleep(60)
+
+
+def allocate(size):
+    return len(bytearray(size))
+
+
+def create_bomb_pdf(decoded_size: int = 64 * MB) -> bytes:
+    """Create a one-page PDF whose content stream inflates to ``decoded_size`` bytes."""
+    writer = PdfWriter()
+    page = writer.add_blank_page(width=612, height=792)
+    content = StreamObject()
+    content._data = zlib.compress(b" " * decoded_size, 9)
+    content[NameObject("/Filter")] = NameObject("/FlateDecode")
+    page[NameObject("/Contents")] = writer._add_object(content)
+    buffer = BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def create_object_stream_bomb_pdf(decoded_size: int = 64 * MB) -> bytes:
+    """
+    Create a PDF whose only page sits in an object stream that inflates to
+    ``decoded_size`` bytes, behind an ASCIIHex then Flate filter chain.
+    """
+    page = b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"
+    objects = b"3 0 " + page
+    encoded = binascii.hexlify(zlib.compress(objects.ljust(decoded_size), 9)) + b">"
+
+    output = bytearray(b"%PDF-1.5\n")
+    offsets = {}
+
+    def add(number, body, stream=None):
+        offsets[number] = len(output)
+        output.extend(b"%d 0 obj\n" % number + body)
+        if stream is not None:
+            output.extend(b"\nstream\n" + stream + b"\nendstream")
+        output.extend(b"\nendobj\n")
+
+    add(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+    add(2, b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>")
+    add(4, b"<< /Type /ObjStm /N 1 /First 4 /Filter [/ASCIIHexDecode /FlateDecode] /Length %d >>" % len(encoded), encoded)
+    offsets[5] = len(output)
+    entries = [(0, 0, 65535), (1, offsets[1], 0), (1, offsets[2], 0), (2, 4, 0), (1, offsets[4], 0), (1, offsets[5], 0)]
+    xref = b"".join(bytes([kind]) + field.to_bytes(4, "big") + index.to_bytes(2, "big") for kind, field, index in entries)
+    add(5, b"<< /Type /XRef /Size 6 /W [1 4 2] /Root 1 0 R /Length %d >>" % len(xref), xref)
+    output.extend(b"startxref\n%d\n%%%%EOF\n" % offsets[5])
+    return bytes(output)
+
+
+def split_unpruned(pdf_file_path):
+    return split_pdf_to_parts(pdf_file_path, "1", "bomb.pdf", prune_resources=False)
+
+
+class TestJobLimits:
+    """Test tier configuration."""
+
+    def test_default_tier(self, monkeypatch):
+        """Test the standard tier is used by default."""
+        monkeypatch.delenv("SPLIT_TIER", raising=False)
+        assert get_job_limits().max_rss_bytes == 1024 * MB
+
+    def test_env_override(self, monkeypatch):
+        """Test individual limits can be overridden per deployment."""
+        monkeypatch.setenv("JOB_MAX_WALL_SECONDS", "5")
+        limits = get_job_limits("free")
+        assert limits.max_wall_seconds == 5
+        assert limits.max_rss_bytes == 512 * MB
+
+    def test_unknown_tier(self):
+        """Test an unknown tier is rejected."""
+        with pytest.raises(ValueError, match="Unknown deployment tier"):
+            get_job_limits("platinum")
+
+    def test_status_codes(self):
+        """Test limit kinds map to client and server errors."""
+        assert JobLimitExceeded("decoded_size", 1, "x").status_code == 400
+        assert JobLimitExceeded("rss", 1, "x").status_code == 400
+        assert JobLimitExceeded("wall_time", 1, "x").status_code == 504
+
+
+class TestRunIsolated:
+    """Test the isolated worker and its watchdog."""
+
+    def test_result_and_peak_rss(self):
+        """Test a job returns its result and the observed peak RSS."""
+        result, peak_rss = run_isolated(add_numbers, 2, 3, limits=TIGHT_LIMITS)
+        assert result == 5
+        assert peak_rss >= 0
+
+    def test_exception_propagates(self):
+        """Test an exception raised by the job is re-raised."""
+        with pytest.raises(ValueError, match="Boom"):
+            run_isolated(fail, limits=TIGHT_LIMITS)
+
+    def test_wall_time_limit(self):
+        """Test a job running past its time limit is killed."""
+        limits = JobLimits(256 * MB, 0.5, 4 * MB)
+        started = time.monotonic()
+        with pytest.raises(JobLimitExceeded) as exc_info:
+            run_isolated(sleep_forever, limits=limits)
+        assert exc_info.value.kind == "wall_time"
+        assert time.monotonic() - started < 10
+
+    def test_memory_limit(self):
+        """Test a job allocating past its memory limit is aborted."""
+        with pytest.raises(JobLimitExceeded) as exc_info:
+            run_isolated(allocate, 1024 * MB, limits=TIGHT_LIMITS)
+        assert exc_info.value.kind == "rss"
+
+
+class TestDecompressionBomb:
+    """Test decoded stream size enforcement."""
+
+    def test_bomb_rejected_by_split_job(self, tmp_path):
+        """Test a content stream inflating past the limit aborts the job."""
+        pdf_path = tmp_path / "bomb.pdf"
+        pdf_path.write_bytes(create_bomb_pdf())
+        with pytest.raises(JobLimitExceeded) as exc_info:
+            run_split_job(str(pdf_path), "1", "bomb.pdf", limits=TIGHT_LIMITS)
+        assert exc_info.value.kind == "decoded_size"
+
+    def test_aborted_job_leaves_no_output(self, tmp_path, monkeypatch):
+        """Test the output directory of a job aborted by a limit is removed."""
+        pdf_path = tmp_path / "bomb.pdf"
+        pdf_path.write_bytes(create_bomb_pdf())
+        created = []
+        mkdtemp = tempfile.mkdtemp
+        monkeypatch.setattr(tempfile, "mkdtemp", lambda: created.append(mkdtemp()) or created[-1])
+        with pytest.raises(JobLimitExceeded):
+            run_split_job(str(pdf_path), "1", "bomb.pdf", limits=TIGHT_LIMITS)
+        # Killed by the watchdog rather than failing inside the worker
+        with pytest.raises(JobLimitExceeded):
+            run_split_job(str(pdf_path), "1", "bomb.pdf", limits=JobLimits(256 * MB, 0.01, 4 * MB))
+        assert len(created) == 2
+        assert not any(os.path.exists(path) for path in created)
+
+    def test_in_process_split_leaves_no_output(self, tmp_path, monkeypatch):
+        """Test a split aborted in-process removes the directory it created."""
+        pdf_path = tmp_path / "bomb.pdf"
+        pdf_path.write_bytes(create_bomb_pdf())
+        scratch = tmp_path / "scratch"
+        scratch.mkdir()
+        monkeypatch.setattr(tempfile, "tempdir", str(scratch))
+        previous = get_active_limits()
+        set_active_limits(TIGHT_LIMITS)
+        try:
+            with pytest.raises(JobLimitExceeded):
+                split_pdf_to_parts(str(pdf_path), "1", "bomb.pdf")
+        finally:
+            set_active_limits(previous)
+        assert os.listdir(scratch) == []
+
+    def test_object_stream_bomb_without_pruning(self, tmp_path):
+        """Test streams pypdf decodes itself are bounded, whatever the filter chain."""
+        pdf_path = tmp_path / "bomb.pdf"
+        pdf_path.write_bytes(create_object_stream_bomb_pdf())
+        with pytest.raises(JobLimitExceeded) as exc_info:
+            run_isolated(split_unpruned, str(pdf_path), limits=TIGHT_LIMITS)
+        assert exc_info.value.kind == "decoded_size"
+
+    def test_object_stream_within_limit(self, tmp_path):
+        """Test the same document splits when its object stream fits the limit."""
+        pdf_path = tmp_path / "small.pdf"
+        pdf_path.write_bytes(create_object_stream_bomb_pdf(decoded_size=MB))
+        parts, _ = run_isolated(split_unpruned, str(pdf_path), limits=TIGHT_LIMITS)
+        assert len(parts) == 1
+
+    def test_bomb_rejected_by_text_extraction(self, tmp_path):
+        """Test extracting text from a bomb aborts the job."""
+        pdf_path = tmp_path / "bomb.pdf"
+        pdf_path.write_bytes(create_bomb_pdf())
+        with pytest.raises(JobLimitExceeded) as exc_info:
+            run_text_extraction(str(pdf_path), limits=TIGHT_LIMITS)
+        assert exc_info.value.kind == "decoded_size"
+
+    def test_bomb_rejected_by_endpoint(self, monkeypatch):
+        """Test the endpoint answers a bomb with a clear 400."""
+        monkeypatch.setattr("worker.get_job_limits", lambda: TIGHT_LIMITS)
+        files = {"file": ("bomb.pdf", BytesIO(create_bomb_pdf()), "application/pdf")}
+        response = client.post("/split", files=files, data={"page_ranges": "1"})
+        assert response.status_code == 400
+        assert "decoded size limit" in response.json()["detail"]
+
+
+class TestWorkerPool:
+    """Test worker reuse, recycling and draining."""
+
+    def test_worker_is_reused(self):
+        """Test consecutive jobs run in the same warm worker."""
+        pool = WorkerPool(max_jobs=10)
+        first, _ = pool.run(os.getpid, (), TIGHT_LIMITS)
+        second, _ = pool.run(os.getpid, (), TIGHT_LIMITS)
+        pool.shutdown()
+        assert first == second != os.getpid()
+
+    def test_recycle_after_max_jobs(self):
+        """Test a worker is replaced after its job budget."""
+        pool = WorkerPool(max_jobs=2)
+        pids = [pool.run(os.getpid, (), TIGHT_LIMITS)[0] for _ in range(3)]
+        pool.shutdown()
+        assert pids[0] == pids[1] != pids[2]
+        assert pool.recycled["max_jobs"] == 1
+        assert pool.events[0]["jobs"] == 2
+
+    def test_recycle_above_rss(self):
+        """Test a worker above the RSS threshold is replaced after its job."""
+        pool = WorkerPool(max_rss_bytes=1)
+        first, _ = pool.run(os.getpid, (), TIGHT_LIMITS)
+        second, _ = pool.run(os.getpid, (), TIGHT_LIMITS)
+        pool.shutdown()
+        assert first != second
+        assert pool.recycled["rss"] == 2
+        assert pool.stats()["worker_rss_high_water_bytes"] > 0
+
+    def test_killed_worker_is_replaced(self):
+        """Test a worker killed for a limit is not handed out again."""
+        pool = WorkerPool()
+        with pytest.raises(JobLimitExceeded):
+            pool.run(sleep_forever, (), JobLimits(256 * MB, 0.3, 4 * MB))
+        assert pool.run(add_numbers, (1, 2), TIGHT_LIMITS)[0] == 3
+        pool.shutdown()
+        assert pool.recycled["limit:wall_time"] == 1
+
+    def test_shutdown_drains_running_jobs(self):
+        """Test shutdown waits for a running job and then refuses new ones."""
+        pool = WorkerPool()
+        results = []
+        job = threading.Thread(target=lambda: results.append(pool.run(time.sleep, (0.5,), TIGHT_LIMITS)))
+        job.start()
+        time.sleep(0.2)
+        assert pool.shutdown(timeout=10)
+        job.join()
+        assert len(results) == 1
+        assert pool.stats()["idle"] == 0
+        with pytest.raises(RuntimeError, match="shutting down"):
+            pool.run(os.getpid, (), TIGHT_LIMITS)
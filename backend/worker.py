@@ -0,0 +1,472 @@
+"""
+Isolated execution of split jobs.
+
+Jobs run in child processes started from a forkserver (so children are
+forked from a clean, single-threaded parent with pypdf preloaded). A watchdog
+in the calling thread polls the child's RSS and the wall clock and kills the
+child as soon as either goes over the job limits. RLIMIT_AS is set in the
+child as a backstop for allocations that happen faster than the poll
+interval.
+
+Children are kept in a pool and reused, and recycled (replaced by a fresh
+process) after ``WORKER_MAX_JOBS`` jobs or once their RSS stays above
+``WORKER_MAX_RSS_MB`` after a job, so pypdf object graphs and allocator
+fragmentation cannot accumulate over days of uptime.
+"""
+import gc
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from splitter import merge_pdfs, split_pdf_to_parts, split_pdf_to_zip
+from splitter.limits import (
+    MB, JobLimits, JobLimitExceeded, get_job_limits, install_decode_limits, set_active_limits,
+)
+from splitter.textindex import TextIndex, extract_pages, select_pages
+
+# "process" runs each job in an isolated child, "none" runs it in-process
+JOB_ISOLATION = os.environ.get("JOB_ISOLATION", "process")
+
+# Watchdog poll interval in seconds
+POLL_INTERVAL = 0.05
+
+# Address space allowed on top of the RSS limit before allocations fail
+ADDRESS_SPACE_HEADROOM = 512 * MB
+
+# Worker recycling
+WORKER_MAX_JOBS = int(os.environ.get("WORKER_MAX_JOBS", 200))
+WORKER_MAX_RSS_MB = int(os.environ.get("WORKER_MAX_RSS_MB", 384))
+WORKER_MAX_IDLE = int(os.environ.get("WORKER_MAX_IDLE", 4))
+
+# Recycle events kept for /health
+RECENT_EVENTS = 20
+
+_context = None
+
+
+def read_rss(pid: int) -> Optional[int]:
+    """Resident set size of a process in bytes, or None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def split_job(
+    pdf_file_path: str,
+    page_ranges: str,
+    original_filename: str,
+    optimize: bool = False,
+    archive: bool = True,
+    split_at: Optional[List[int]] = None,
+    image_profile: Optional[str] = None,
+    ordered: bool = False,
+    output_dir: Optional[str] = None,
+) -> Tuple[Any, dict]:
+    """
+    Run a split and return its output with the job statistics.
+
+    The output is the ZIP path, or the list of part paths if ``archive`` is
+    False (for callers that stream the archive themselves), in ``output_dir``.
+    """
+    stats = {}
+    split = split_pdf_to_zip if archive else split_pdf_to_parts
+    output = split(
+        pdf_file_path, page_ranges, original_filename, optimize=optimize, stats=stats, split_at=split_at,
+        image_profile=image_profile, ordered=ordered, output_dir=output_dir,
+    )
+    return output, stats
+
+
+def merge_job(
+    pdf_file_paths: List[str],
+    page_ranges: str,
+    original_filename: str,
+    optimize: bool = False,
+    image_profile: Optional[str] = None,
+    output_dir: Optional[str] = None,
+) -> Tuple[str, dict]:
+    """Run a merge and return the merged PDF path (in ``output_dir``) with the job statistics."""
+    stats = {}
+    output = merge_pdfs(
+        pdf_file_paths, page_ranges, original_filename, optimize=optimize, stats=stats,
+        image_profile=image_profile, output_dir=output_dir,
+    )
+    return output, stats
+
+
+def run_split_job(
+    pdf_file_path: str,
+    page_ranges: str,
+    original_filename: str,
+    optimize: bool = False,
+    archive: bool = True,
+    split_at: Optional[List[int]] = None,
+    image_profile: Optional[str] = None,
+    ordered: bool = False,
+    limits: Optional[JobLimits] = None,
+) -> Tuple[Any, dict]:
+    """Run a split job under the configured isolation and limits."""
+    return _run_job(
+        split_job, pdf_file_path, page_ranges, original_filename, optimize, archive, split_at, image_profile,
+        ordered, limits=limits,
+    )
+
+
+def run_merge_job(
+    pdf_file_paths: List[str],
+    page_ranges: str,
+    original_filename: str,
+    optimize: bool = False,
+    image_profile: Optional[str] = None,
+    limits: Optional[JobLimits] = None,
+) -> Tuple[str, dict]:
+    """Run a merge job under the configured isolation and limits."""
+    return _run_job(
+        merge_job, pdf_file_paths, page_ranges, original_filename, optimize, image_profile, limits=limits,
+    )
+
+
+def _run_job(func: Callable, *args, limits: Optional[JobLimits] = None) -> Tuple[Any, dict]:
+    """
+    Run a split or merge job writing to an output directory owned by this
+    process, which is removed if the job fails, goes over a limit or its
+    worker is killed.
+    """
+    output_dir = tempfile.mkdtemp()
+    try:
+        if JOB_ISOLATION == "none":
+            return func(*args, output_dir)
+
+        (output, stats), peak_rss = run_isolated(func, *args, output_dir, limits=limits)
+        stats["peak_rss_bytes"] = peak_rss
+        return output, stats
+    except BaseException:
+        shutil.rmtree(output_dir, ignore_errors=True)
+        raise
+
+
+def run_text_extraction(pdf_file_path: str, limits: Optional[JobLimits] = None) -> List[str]:
+    """Extract the text of every page under the configured isolation and limits."""
+    if JOB_ISOLATION == "none":
+        return extract_pages(pdf_file_path)
+
+    result, _ = run_isolated(extract_pages, pdf_file_path, limits=limits)
+    return result
+
+
+def run_text_selection(
+    index: TextIndex,
+    selection,
+    contains: Optional[str] = None,
+    first_line: Optional[str] = None,
+    limits: Optional[JobLimits] = None,
+) -> Tuple[str, List[int]]:
+    """
+    Apply text queries under the configured isolation and limits.
+
+    First-line patterns come from the client, so a pattern that backtracks
+    catastrophically is stopped by the wall-clock limit like any other job.
+    """
+    args = (index, selection, contains, first_line)
+    if JOB_ISOLATION == "none":
+        return select_pages(*args)
+
+    result, _ = run_isolated(select_pages, *args, limits=limits)
+    return result
+
+
+def run_isolated(func: Callable, *args, limits: Optional[JobLimits] = None) -> Tuple[Any, int]:
+    """
+    Run ``func(*args)`` in a pooled child process under ``limits``.
+
+    Returns the function result and the peak RSS observed for the child.
+    Raises JobLimitExceeded if the child goes over a limit, or re-raises the
+    exception the function raised.
+    """
+    return worker_pool.run(func, args, limits or get_job_limits())
+
+
+class SplitWorker:
+    """One child process and the parent's end of its pipe."""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.peak_rss = 0
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    def stop(self, timeout: float = 5) -> None:
+        """Ask the child to exit, killing it if it does not."""
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=timeout)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class WorkerPool:
+    """
+    Pool of reusable, supervised split workers.
+
+    Workers are started on demand, so the pool grows to the number of jobs
+    the scheduler lets run at once and keeps up to ``max_idle`` of them
+    warm. Every worker that is killed or recycled is replaced lazily by the
+    next job.
+    """
+
+    def __init__(
+        self,
+        max_jobs: int = WORKER_MAX_JOBS,
+        max_rss_bytes: int = WORKER_MAX_RSS_MB * MB,
+        max_idle: int = WORKER_MAX_IDLE,
+    ):
+        self.max_jobs = max_jobs
+        self.max_rss_bytes = max_rss_bytes
+        self.max_idle = max_idle
+        self.draining = False
+        self.completed = 0
+        self.recycled: Counter = Counter()
+        self.events: deque = deque(maxlen=RECENT_EVENTS)
+        self.worker_rss_high_water = 0
+        self._idle: List[SplitWorker] = []
+        self._busy = 0
+        self._lock = threading.Condition()
+
+    def run(self, func: Callable, args: tuple, limits: JobLimits) -> Tuple[Any, int]:
+        worker = self._checkout()
+        try:
+            worker.conn.send((limits, func, args))
+        except (OSError, ValueError):
+            self._retire(worker, "crashed")
+            raise RuntimeError("Split worker exited unexpectedly")
+
+        deadline = time.monotonic() + limits.max_wall_seconds
+        peak_rss = 0
+        try:
+            while True:
+                if worker.conn.poll(POLL_INTERVAL):
+                    try:
+                        status, payload = worker.conn.recv()
+                    except EOFError:
+                        raise _child_died(worker.process, limits)
+                    break
+
+                if not worker.process.is_alive():
+                    raise _child_died(worker.process, limits)
+
+                rss = read_rss(worker.pid) or 0
+                peak_rss = max(peak_rss, rss)
+                if rss > limits.max_rss_bytes:
+                    raise _rss_exceeded(limits)
+                if time.monotonic() > deadline:
+                    raise JobLimitExceeded(
+                        "wall_time",
+                        limits.max_wall_seconds,
+                        f"Processing took longer than the {limits.max_wall_seconds:.0f}s time limit",
+                    )
+        except BaseException as e:
+            # The child is mid-job or gone: never hand it out again
+            self._retire(worker, f"limit:{e.kind}" if isinstance(e, JobLimitExceeded) else "crashed")
+            raise
+
+        worker.jobs += 1
+        worker.peak_rss = max(worker.peak_rss, peak_rss)
+        if status == "error" and isinstance(payload, JobLimitExceeded):
+            # Hit a limit inside the child (e.g. MemoryError): start fresh
+            self._retire(worker, f"limit:{payload.kind}")
+            raise payload
+        self._checkin(worker, read_rss(worker.pid) or 0)
+
+        if status == "error":
+            raise payload
+        return payload, peak_rss
+
+    def shutdown(self, timeout: float = 30) -> bool:
+        """
+        Stop accepting jobs, wait up to ``timeout`` seconds for running jobs
+        and stop all workers. Returns False if jobs were still running.
+        """
+        with self._lock:
+            self.draining = True
+            drained = self._lock.wait_for(lambda: self._busy == 0, timeout=timeout)
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.stop()
+        print(f"[INFO] Split workers stopped (drained={drained}, {self.completed} jobs completed)")
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            idle = list(self._idle)
+            busy = self._busy
+        return {
+            "busy": busy,
+            "idle": len(idle),
+            "draining": self.draining,
+            "jobs_completed": self.completed,
+            "recycled": dict(self.recycled),
+            "recent_recycles": list(self.events),
+            "worker_rss_bytes": {worker.pid: read_rss(worker.pid) for worker in idle},
+            "worker_rss_high_water_bytes": max(
+                [self.worker_rss_high_water] + [worker.peak_rss for worker in idle]
+            ),
+        }
+
+    def _checkout(self) -> SplitWorker:
+        with self._lock:
+            if self.draining:
+                raise RuntimeError("Server is shutting down")
+            self._busy += 1
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.process.is_alive():
+                    return worker
+                self._record(worker, "crashed", 0)
+        try:
+            return SplitWorker(_get_context())
+        except BaseException:
+            with self._lock:
+                self._busy -= 1
+                self._lock.notify_all()
+            raise
+
+    def _checkin(self, worker: SplitWorker, rss: int) -> None:
+        reason = None
+        if worker.jobs >= self.max_jobs:
+            reason = "max_jobs"
+        elif rss > self.max_rss_bytes:
+            reason = "rss"
+
+        with self._lock:
+            self._busy -= 1
+            self.completed += 1
+            if reason is None and not self.draining and len(self._idle) < self.max_idle:
+                self._idle.append(worker)
+                worker = None
+            self._lock.notify_all()
+
+        if worker is not None:
+            if reason is not None:
+                self._record(worker, reason, rss)
+            worker.stop()
+
+    def _retire(self, worker: SplitWorker, reason: str) -> None:
+        rss = read_rss(worker.pid) or 0
+        worker.kill()
+        with self._lock:
+            self._busy -= 1
+            self._lock.notify_all()
+        self._record(worker, reason, rss)
+
+    def _record(self, worker: SplitWorker, reason: str, rss: int) -> None:
+        self.recycled[reason] += 1
+        self.worker_rss_high_water = max(self.worker_rss_high_water, worker.peak_rss, rss)
+        self.events.append({
+            "pid": worker.pid,
+            "reason": reason,
+            "jobs": worker.jobs,
+            "rss_bytes": rss,
+            "peak_rss_bytes": worker.peak_rss,
+            "at": time.time(),
+        })
+        print(
+            f"[INFO] Recycling split worker {worker.pid} ({reason}) after {worker.jobs} jobs, "
+            f"rss={rss // MB}MB, peak={worker.peak_rss // MB}MB"
+        )
+
+
+worker_pool = WorkerPool()
+
+
+def _get_context():
+    global _context
+    if _context is None:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            _context = multiprocessing.get_context("forkserver")
+            _context.set_forkserver_preload(["worker", "pypdf"])
+        else:
+            _context = multiprocessing.get_context("spawn")
+    return _context
+
+
+def _worker_main(conn) -> None:
+    install_decode_limits()
+    try:
+        import resource
+        _, hard_limit = resource.getrlimit(resource.RLIMIT_AS)
+    except (ImportError, ValueError, OSError):
+        resource = None
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            break
+        if message is None:
+            break
+        limits, func, args = message
+
+        set_active_limits(limits)
+        if resource is not None:
+            try:
+                address_space = limits.max_rss_bytes + ADDRESS_SPACE_HEADROOM
+                if hard_limit != resource.RLIM_INFINITY:
+                    address_space = min(address_space, hard_limit)
+                resource.setrlimit(resource.RLIMIT_AS, (address_space, hard_limit))
+            except (ValueError, OSError):
+                pass
+
+        try:
+            result = ("ok", func(*args))
+        except MemoryError:
+            result = ("error", _rss_exceeded(limits))
+        except Exception as e:
+            result = ("error", e)
+
+        try:
+            conn.send(result)
+        except Exception:
+            # Exception that cannot be pickled
+            conn.send(("error", ValueError(str(result[1]))))
+        del result
+        gc.collect()
+    conn.close()
+
+
+def _child_died(process, limits: JobLimits) -> Exception:
+    process.join(timeout=1)
+    if process.exitcode is not None and process.exitcode < 0:
+        # Killed by a signal, most likely the kernel OOM killer
+        return _rss_exceeded(limits)
+    return RuntimeError(f"Split worker exited unexpectedly (exit code {process.exitcode})")
+
+
+def _rss_exceeded(limits: JobLimits) -> JobLimitExceeded:
+    return JobLimitExceeded(
+        "rss",
+        limits.max_rss_bytes,
+        f"Document needs more than the {limits.max_rss_bytes // MB}MB memory limit",
+    )
@@ -0,0 +1,131 @@
+"""
+Benchmark for ZIP assembly.
+
+Builds archives of generated split parts with the sequential ``zipfile``
+writer and with the parallel assembler at several thread counts, for an
+increasing number of entries, and reports wall time, throughput and speedup
+over ``zipfile``:
+
+    python zipbench.py --entries 1,8,32,128 --workers 1,2,4,8 --size-kb 512
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import zipfile
+from typing import Dict, List, Optional, Sequence
+
+from splitter.archive import write_zip
+
+# Share of each generated part that is incompressible (embedded images, fonts)
+DEFAULT_BINARY_RATIO = 0.5
+
+WORDS = b"BT /F1 12 Tf 72 712 Td (Invoice) Tj ET q 1 0 0 1 0 0 cm Q re f S".split()
+
+
+def create_part(path: str, size: int, binary_ratio: float, rng: random.Random) -> None:
+    """Write a file that compresses roughly like a PDF part."""
+    binary = int(size * binary_ratio)
+    text = bytearray()
+    while len(text) < size - binary:
+        text += rng.choice(WORDS) + b" "
+    with open(path, "wb") as part:
+        part.write(bytes(text[: size - binary]))
+        part.write(rng.randbytes(binary))
+
+
+def time_zipfile(zip_path: str, file_paths: Sequence[str]) -> float:
+    started = time.perf_counter()
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for file_path in file_paths:
+            zipf.write(file_path, os.path.basename(file_path))
+    return time.perf_counter() - started
+
+
+def time_parallel(zip_path: str, file_paths: Sequence[str], workers: int) -> float:
+    started = time.perf_counter()
+    write_zip(zip_path, file_paths, workers=workers)
+    return time.perf_counter() - started
+
+
+def run_benchmark(
+    entry_counts: Sequence[int],
+    worker_counts: Sequence[int],
+    size: int,
+    binary_ratio: float = DEFAULT_BINARY_RATIO,
+    repeat: int = 3,
+    seed: int = 0,
+) -> List[Dict[str, object]]:
+    """Return one result row per entry count, best of ``repeat`` runs each."""
+    rng = random.Random(seed)
+    results = []
+    with tempfile.TemporaryDirectory() as temp_dir:
+        for entries in entry_counts:
+            file_paths = []
+            for index in range(entries):
+                path = os.path.join(temp_dir, f"part{index + 1}.pdf")
+                create_part(path, size, binary_ratio, rng)
+                file_paths.append(path)
+            zip_path = os.path.join(temp_dir, "bench.zip")
+            total_mb = entries * size / (1024 * 1024)
+
+            baseline = min(time_zipfile(zip_path, file_paths) for _ in range(repeat))
+            row = {
+                "entries": entries,
+                "input_mb": round(total_mb, 2),
+                "zipfile_s": round(baseline, 4),
+                "parallel": {},
+            }
+            for workers in worker_counts:
+                elapsed = min(time_parallel(zip_path, file_paths, workers) for _ in range(repeat))
+                row["parallel"][workers] = {
+                    "seconds": round(elapsed, 4),
+                    "mb_per_s": round(total_mb / elapsed, 1) if elapsed else 0.0,
+                    "speedup": round(baseline / elapsed, 2) if elapsed else 0.0,
+                }
+            results.append(row)
+
+            for path in file_paths:
+                os.remove(path)
+    return results
+
+
+def format_table(results: List[Dict[str, object]], worker_counts: Sequence[int]) -> str:
+    header = f"{'entries':>8} {'MB':>8} {'zipfile s':>10}" + "".join(
+        f" {f'{workers} thr s':>10} {'x':>5}" for workers in worker_counts
+    )
+    lines = [header, "-" * len(header)]
+    for row in results:
+        line = f"{row['entries']:>8} {row['input_mb']:>8.1f} {row['zipfile_s']:>10.3f}"
+        for workers in worker_counts:
+            cell = row["parallel"][workers]
+            line += f" {cell['seconds']:>10.3f} {cell['speedup']:>5.2f}"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> List[Dict[str, object]]:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--entries", default="1,8,32,128", help="Comma-separated entry counts")
+    parser.add_argument("--workers", default="1,2,4,8", help="Comma-separated thread counts")
+    parser.add_argument("--size-kb", type=int, default=512, help="Size of each entry in KB")
+    parser.add_argument("--binary-ratio", type=float, default=DEFAULT_BINARY_RATIO, help="Incompressible share of each entry")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measurement (best is kept)")
+    parser.add_argument("--json", help="Write the full report to this file")
+    args = parser.parse_args(argv)
+
+    entry_counts = [int(count) for count in args.entries.split(",") if count.strip()]
+    worker_counts = [int(count) for count in args.workers.split(",") if count.strip()]
+    results = run_benchmark(entry_counts, worker_counts, args.size_kb * 1024, args.binary_ratio, args.repeat)
+
+    print(format_table(results, worker_counts))
+    if args.json:
+        with open(args.json, "w") as report:
+            json.dump(results, report, indent=2)
+    return results
+
+
+if __name__ == "__main__":
+    main()